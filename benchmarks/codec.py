@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+'''
+Benchmark the serialization codecs on `tasks_inspect`-like payloads:
+
+    benchmarks/codec.py [n_tasks ...]
+
+For each payload size and available codec, this reports the encoded size and
+the encode and decode times (best of 5 runs).
+'''
+
+import gc
+import sys
+import time
+
+from radical.pi import codec as rpc
+
+
+# ------------------------------------------------------------------------------
+#
+def task_dict(idx):
+
+    return {'uid'        : 'task.%06d' % idx,
+            'state'      : 'DONE',
+            'pilot'      : 'pilot.0000',
+            'exit_code'  : 0,
+            'stdout'     : 'hello world %d\n' % idx,
+            'stderr'     : '',
+            'sandbox'    : 'file://localhost/tmp/rp.session/pilot.0000/'
+                           'task.%06d/' % idx,
+            'description': {'executable'    : '/bin/echo',
+                            'arguments'     : ['hello', 'world', str(idx)],
+                            'ranks'         : 1,
+                            'cores_per_rank': 1,
+                            'gpus_per_rank' : 0.0,
+                            'environment'   : {'FOO': 'bar'},
+                            'tags'          : {},
+                            'priority'      : 0,
+                            'input_staging' : [],
+                            'output_staging': [{'source': 'task:///stdout',
+                                                'target': 'client:///',
+                                                'action': 'Transfer',
+                                                'flags' : []}]}}
+
+
+# ------------------------------------------------------------------------------
+#
+def timeit(func, arg, repeat=5):
+
+    # like `timeit`, exclude garbage collection from the measurement
+    best = None
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(arg)
+            duration = time.perf_counter() - start
+            if best is None or duration < best:
+                best = duration
+    finally:
+        gc.enable()
+
+    return best
+
+
+# ------------------------------------------------------------------------------
+#
+def main(sizes):
+
+    codecs = [('json', rpc.JsonCodec)]
+
+    if rpc.orjson : codecs.append(('orjson',  rpc.OrjsonCodec))
+    if rpc.msgpack: codecs.append(('msgpack', rpc.MsgpackCodec))
+
+    print('%8s  %-8s %12s %10s %10s %8s'
+          % ('tasks', 'codec', 'bytes', 'enc [s]', 'dec [s]', 'speedup'))
+
+    for size in sizes:
+
+        payload = {'success': True,
+                   'result' : [task_dict(i) for i in range(size)]}
+        base    = None
+
+        for name, codec in codecs:
+
+            data  = codec.encode(payload)
+            t_enc = timeit(codec.encode, payload)
+            t_dec = timeit(codec.decode, data)
+            total = t_enc + t_dec
+
+            if base is None:
+                base = total
+
+            print('%8d  %-8s %12d %10.4f %10.4f %7.1fx'
+                  % (size, name, len(data), t_enc, t_dec, base / total))
+
+        print()
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    main(sizes)
+
+
+# ------------------------------------------------------------------------------
@@ -3,7 +3,14 @@
 __copyright__ = 'Copyright 2017-2022, The RADICAL-Cybertools Team'
 __license__   = 'MIT'
 
-import radical.pi as rpi
+import os
+
+# the `gevent` server mode requires monkey patching before anything else
+if os.environ.get('RADICAL_PI_SERVER') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import radical.pi as rpi                                                 # noqa
 
 
 # ------------------------------------------------------------------------------
@@ -12,7 +19,11 @@ if __name__ == '__main__':
 
     server = None
     try:
-        server = rpi.PIServer()
+        # shard sessions over several worker processes if requested
+        if int(os.environ.get('RADICAL_PI_WORKERS', 0)):
+            server = rpi.PIRouter()
+        else:
+            server = rpi.PIServer()
         server.start()
 
     finally:
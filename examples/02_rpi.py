@@ -24,24 +24,35 @@ if __name__ == '__main__':
     for p in info:
         print('%s: %s' % (p['uid'], p['state']))
 
-    print('submit tasks')
-    tasks = []
-    for _ in range(unum):
-        tasks.append({'executable'       : '/bin/date',
-                      'cpu_processes'    : 1,
-                      'cpu_threads'      : usize})
-    tids = pi.tasks_submit(sid, tasks)
-    print('tasks: ', tids)
-
-    print('inspect tasks')
-    info = pi.tasks_inspect(sid)
-    for t in info:
-        print('%s: %s [%s]' % (t['uid'], t['state'], t['stdout']))
-    print('ok')
-
-    print('wait for task completion')
-    pi.tasks_wait(sid, states=rp.FINAL)
-    print('ok')
+    # the task manager stays open across generations, so that each generation
+    # only pays the scheduling latency
+    print('open task manager')
+    pi.task_manager_open(sid)
+
+    for gen in range(ugen):
+
+        print('submit tasks [generation %d]' % gen)
+        tasks = []
+        for _ in range(unum):
+            tasks.append({'executable'       : '/bin/date',
+                          'cpu_processes'    : 1,
+                          'cpu_threads'      : usize})
+        tids = pi.tasks_submit(sid, tasks)
+        print('tasks: ', tids)
+
+        print('inspect tasks')
+        info = pi.tasks_inspect(sid, tids)
+        for t in info:
+            print('%s: %s [%s]' % (t['uid'], t['state'], t['stdout']))
+        print('ok')
+
+        print('wait for the first task to complete')
+        pi.tasks_wait(sid, tids, states=rp.FINAL, count=1)
+        print('ok')
+
+        print('wait for task completion')
+        pi.tasks_wait(sid, tids, states=rp.FINAL)
+        print('ok')
 
     print('inspect tasks')
     info = pi.tasks_inspect(sid)
@@ -58,6 +69,9 @@ if __name__ == '__main__':
     except Exception as e:
         print(e)
 
+    print('close task manager')
+    pi.task_manager_close(sid)
+
 
 # ------------------------------------------------------------------------------
 
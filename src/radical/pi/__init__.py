@@ -5,7 +5,11 @@ __license__   = 'MIT'
 # ------------------------------------------------------------------------------
 #
 from .client import PI
+from .aio    import AsyncPI
+
+from .submitter import TaskSubmitter
 from .server import PIServer
+from .router import PIRouter
 
 # ------------------------------------------------------------------------------
 #
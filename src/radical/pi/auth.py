@@ -0,0 +1,80 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import time
+import secrets
+
+import threading as mt
+
+from collections import OrderedDict
+
+
+# ------------------------------------------------------------------------------
+#
+class TokenCache:
+    '''
+    Bounded cache of bearer tokens issued on login.  Validating a token is
+    a dict lookup - tokens expire `ttl` seconds after they have been issued,
+    and if more than `size` tokens are alive, the oldest ones are dropped.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, ttl=86400, size=10000):
+
+        self._ttl    = ttl
+        self._size   = size
+        self._lock   = mt.Lock()
+        self._tokens = OrderedDict()   # token: (username, expiry), by age
+
+    # --------------------------------------------------------------------------
+    #
+    def issue(self, username):
+        '''
+        create a new token for the given user
+        '''
+
+        token = secrets.token_urlsafe(32)
+
+        with self._lock:
+
+            self._tokens[token] = (username, time.time() + self._ttl)
+
+            while len(self._tokens) > self._size:
+                self._tokens.popitem(last=False)
+
+        return token
+
+    # --------------------------------------------------------------------------
+    #
+    def check(self, token):
+        '''
+        return the username for a valid token, `None` otherwise
+        '''
+
+        entry = self._tokens.get(token)
+        if not entry:
+            return None
+
+        username, expiry = entry
+        if expiry < time.time():
+            with self._lock:
+                self._tokens.pop(token, None)
+            return None
+
+        return username
+
+    # --------------------------------------------------------------------------
+    #
+    def revoke(self, username):
+        '''
+        invalidate all tokens of the given user
+        '''
+
+        with self._lock:
+            for token in [t for t, (u, _) in self._tokens.items()
+                                          if u == username]:
+                del self._tokens[token]
+
+
+# ------------------------------------------------------------------------------
@@ -2,23 +2,301 @@
 __copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
 __license__   = 'MIT'
 
-import json
+import gzip
+import time
+import logging
 import requests
 
+import threading as mt
+
+from collections       import OrderedDict, deque
+from requests.adapters import HTTPAdapter
+from urllib3.util      import Retry
+from urllib3           import exceptions as u3e
+
 import radical.utils as ru
 
 from .constants import PACKAGE_NS
+from .codec     import JSON, get_codec, for_content_type
+from .submitter import TaskSubmitter
+from .timing    import parse_server_timing
+
+
+# chunk size for reading streamed responses
+_CHUNK = 64 * 1024
 
 
 # ------------------------------------------------------------------------------
 #
-class PI:
-    """PI client class - RESTful API for `PilotClient`.
+def _iter_body(r, chunk_size=_CHUNK, live=True):
+    '''
+    iterate over the (decoded) body of a streamed response.  `live` responses
+    (events, followed task output) are yielded as soon as data arrive:
+    `requests.Response.iter_content` reads `chunk_size` bytes before it
+    yields, which would stall them until that much has been sent.  Other
+    responses are read in chunks of `chunk_size`.
+    '''
+
+    try:
+        if not live:
+            yield from r.iter_content(chunk_size=chunk_size)
+            return
+
+        if not hasattr(r.raw, 'read1'):
+            # urllib3 < 2.3 - byte wise reads return as soon as data arrive
+            yield from r.iter_content(chunk_size=1)
+            return
+
+        while True:
+            data = r.raw.read1(chunk_size, decode_content=True)
+            if not data:
+                break
+            yield data
+
+    except u3e.ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e) from e
+
+    except (u3e.ReadTimeoutError, u3e.SSLError) as e:
+        raise requests.exceptions.ConnectionError(e) from e
+
+
+def _iter_lines(r):
+    '''
+    iterate over the lines of a streamed response as soon as they arrive (see
+    `_iter_body`)
+    '''
+
+    buf = b''
+    for data in _iter_body(r):
+        buf  += data
+        lines = buf.split(b'\n')
+        buf   = lines.pop()
+        yield from lines
+
+    if buf:
+        yield buf
+
+
+# ------------------------------------------------------------------------------
+#
+class WaitHandle:
+    """Future-like handle for a wait ticket as returned by `pilots_wait_async`
+    and `tasks_wait_async`.  The ticket is resolved on the server side - no
+    connection is held open while waiting, unless `result()` is called.
     """
 
+    # server side cap for a single long-poll
+    POLL_MAX = 60
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, pi, sid, wid):
+
+        self._pi     = pi
+        self._sid    = sid
+        self._wid    = wid
+        self._done   = False
+        self._result = None
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def wid(self):
+        return self._wid
+
+    @property
+    def sid(self):
+        return self._sid
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def _poll_time(cls, start, timeout):
+        '''
+        return the duration of the next long-poll for a wait which started at
+        `start` (capped at `POLL_MAX`), or `None` once `timeout` expired
+        '''
+
+        if timeout is None:
+            return cls.POLL_MAX
+
+        poll = min(cls.POLL_MAX, timeout - (time.time() - start))
+        if poll <= 0:
+            return None
+
+        return poll
+
+    # --------------------------------------------------------------------------
+    #
+    def _update(self, info):
+
+        if info['done']:
+            self._done   = True
+            self._result = info['result']
+
+        return self._done
+
+    # --------------------------------------------------------------------------
+    #
+    def done(self):
+        """
+        check (without blocking) if the ticket is resolved
+        """
+        if not self._done:
+            self._update(self._pi.waits_check(self._sid, self._wid)[0])
+
+        return self._done
+
+    # --------------------------------------------------------------------------
+    #
+    def result(self, timeout=None):
+        """
+        return the list of pilot or task states once the ticket is resolved.
+        This long-polls the service for up to `timeout` seconds (forever on
+        `None`), and raises a `TimeoutError` if the ticket did not resolve in
+        time.
+        """
+        start = time.time()
+        while not self._done:
+
+            poll = self._poll_time(start, timeout)
+            if poll is None:
+                raise TimeoutError('wait %s not resolved' % self._wid)
+
+            info = self._pi.waits_check(self._sid, self._wid, timeout=poll)[0]
+            self._update(info)
+
+        return self._result
+
+    # --------------------------------------------------------------------------
+    #
+    def release(self):
+        """
+        release the ticket on the service side
+        """
+        self._pi.waits_release(self._sid, self._wid)
+
+
+# ------------------------------------------------------------------------------
+#
+class _ValidatorCache:
+    '''
+    Cache of tagged GET response bodies, used to send conditional requests
+    (`If-None-Match`) and to reuse the cached body on `304 Not Modified`.
+    The least recently stored of more than `size` responses are evicted.
+    '''
+
+    def __init__(self, size):
+
+        self._size  = size
+        self._lock  = mt.Lock()
+        self._cache = OrderedDict()    # (route, params): (etag, type, body)
+
+    def lookup(self, mode, route, params, headers):
+        '''
+        return the cache key and the cached response `(etag, type, body)` (or
+        `None`) for a request, and add the `If-None-Match` header if a
+        response is cached
+        '''
+
+        if mode != 'get' or not self._size:
+            return None, None
+
+        key = (route, tuple(sorted((params or {}).items())))
+
+        with self._lock:
+            cached = self._cache.get(key)
+
+        if cached:
+            headers['If-None-Match'] = cached[0]
+
+        return key, cached
+
+    def store(self, key, etag, ctype, content):
+
+        with self._lock:
+
+            self._cache.pop(key, None)
+
+            if etag:
+                self._cache[key] = (etag, ctype, content)
+                while len(self._cache) > self._size:
+                    self._cache.popitem(last=False)
+
+
+# ------------------------------------------------------------------------------
+#
+class _TimingLog:
+    '''
+    Client side record of the latency breakdown of the last `size` requests:
+    the total request time as seen by the client, the service side phases
+    reported in the response's `Server-Timing` header (see
+    `radical.pi.timing`), and the remainder (`network`: transfer, queuing and
+    client side overhead).
+    '''
+
+    def __init__(self, size, prof):
+
+        self._prof    = prof
+        self._entries = deque(maxlen=size) if size else None
+
+    def record(self, mode, route, start, header):
+
+        if self._entries is None:
+            return
+
+        duration = time.time() - start
+        server   = parse_server_timing(header)
+        entry    = {'method' : mode.upper(),
+                    'route'  : route,
+                    'time'   : start,
+                    'total'  : duration,
+                    'server' : server,
+                    'network': max(0.0, duration - (server.get('total') or 0))}
+
+        self._entries.append(entry)
+
+        if header and self._prof.enabled:
+            self._prof.prof('query_timing', msg='%s %s: %s'
+                            % (entry['method'], route, header))
+
+    def entries(self, route=None):
+
+        if self._entries is None:
+            return []
+
+        return [e for e in list(self._entries)
+                  if route is None or route in e['route']]
+
+
+
+
+# ------------------------------------------------------------------------------
+#
+class _ClientBase:
+    '''
+    Transport independent part of the `PI` and `AsyncPI` clients: request
+    building, reply handling and the API calls.  The subclasses implement the
+    I/O:
+
+      - `_query(mode, route, data, params)`: send a request prepared by
+        `_prepare` and return the result of `_reply` (as a coroutine in
+        `AsyncPI`);
+      - `_run(plan)`: execute an API call which needs more than a request -
+        `plan` is a generator which yields queries `(mode, route, data,
+        params)`, is sent their results, and returns the result of the call;
+      - `_collect(stream)`, `_clear_credentials()` and the streaming calls
+        (`_iter_pages`, `_output_stream`, `tasks_submit_stream`,
+        `as_completed`, `events`).
+    '''
+
+    # class of the handles returned by `*_wait_async`
+    _wait_handle = WaitHandle
+
     # --------------------------------------------------------------------------
     #
-    def __init__(self, url, log=None, prof=None, rep=None):
+    def __init__(self, url, log, prof, rep, compress_min, codec,
+                       connect_timeout, read_timeout, etag_cache, timings):
 
         if log : self._log  = log
         else   : self._log  = ru.Logger(PACKAGE_NS)
@@ -26,99 +304,224 @@ class PI:
         if prof: self._prof = prof
         else   : self._prof = ru.Profiler(PACKAGE_NS)
 
-        if rep : self._rep  = log
+        if rep : self._rep  = rep
         else   : self._rep  = ru.Reporter(PACKAGE_NS)
 
-        self._cookies       = []
+        self._headers       = {}
+        self._mirrors       = {}   # (sid, route): {'seq': int, 'items': dict}
+        self._compress_min  = compress_min
+        self._codec         = get_codec(codec)
+        self._timeout       = (connect_timeout, read_timeout)
+        self._debug         = self._log.isEnabledFor(logging.DEBUG)
+        self._etags         = _ValidatorCache(etag_cache)
+        self._timings       = _TimingLog(timings, self._prof)
         self._url           = ru.Url(url)
-        self._qbase         = ru.Url(url)
-        self._qbase         = str(self._qbase).rstrip('/')
 
-        if self._url.username and self._url.password:
-            self.login(self._url.username, self._url.password)
+        # credentials are only sent on `login`, not with every request
+        self._qbase         = '%s://%s' % (self._url.schema, self._url.host)
+        if self._url.port:
+            self._qbase    += ':%d' % self._url.port
+        self._qbase        += (self._url.path or '').rstrip('/')
 
     # --------------------------------------------------------------------------
     #
-    def _query(self, mode, route, data=None):
+    def _prepare(self, mode, route, data=None, params=None):
+        '''
+        return the URL, headers, body and query parameters of a request, and
+        the context to pass to `_reply`
+        '''
 
-        url = self._qbase + route
+        if mode not in ['get', 'put', 'post', 'delete']:
+            raise ValueError('invalid query mode %s' % mode)
 
-        ldata = -1
-        if data is not None:
-            ldata = len(str(data))
+        url   = self._qbase + route
+        start = time.time()
 
-        print('---> %-5s  %-60s [data:%d]' % (mode.upper(), url, ldata))
+        if self._debug:
+            self._log.debug('request %5s: %s', mode, url)
 
-        self._log.debug('request %5s: %s [%s]', mode, route, data)
-        self._log.debug('request %5s: %s', mode, url)
+        if self._prof.enabled:
+            self._prof.prof('query_start', msg='%s %s' % (mode, route))
 
-        if mode == 'get':
-            r = requests.get(url, cookies=self._cookies) #, json=data)
+        body    = None
+        headers = dict(self._headers)
+        headers['Accept'] = self._codec.content_type
 
-        elif mode == 'put':
-            r = requests.put(url, cookies=self._cookies, json=data)
+        if data is not None and mode != 'get':
+            body    = self._codec.encode(data)
+            headers['Content-Type'] = self._codec.content_type
 
-        elif mode == 'post':
-            r = requests.post(url, cookies=self._cookies, json=data)
+            if self._compress_min is not None and \
+                    len(body) >= self._compress_min:
+                body = gzip.compress(body, compresslevel=6)
+                headers['Content-Encoding'] = 'gzip'
 
-        elif mode == 'delete':
-            r = requests.delete(url, cookies=self._cookies, json=data)
+        if params:
+            params = {k: str(v) for k, v in params.items() if v is not None}
 
-        else:
-            raise ValueError('invalid query mode %s' % mode)
+        key, cached = self._etags.lookup(mode, route, params, headers)
 
-        self._log.debug('reply   %3s: %s [%s]', r.status_code,
-                                                 len(r.content), r.content[:64])
+        return url, headers, body, params, (mode, route, start, key, cached)
 
-        if r.status_code != 200:
-            raise RuntimeError('query failed:\n %s' % r.content)
+    # --------------------------------------------------------------------------
+    #
+    def _reply(self, ctx, status, headers, content):
+        '''
+        evaluate the reply to a request prepared by `_prepare`, and return the
+        result of the call
+        '''
 
-        if r.cookies:
-            assert(not self._cookies), 'we allow auth only once'
-            self._cookies = r.cookies
+        mode, route, start, key, cached = ctx
+
+        self._timings.record(mode, route, start, headers.get('Server-Timing'))
+
+        if self._prof.enabled:
+            self._prof.prof('query_stop', msg='%s %s' % (mode, route))
+
+        if self._debug:
+            self._log.debug('reply   %3s: %s [%s]', status, len(content),
+                            content[:64])
+
+        ctype = headers.get('Content-Type')
+
+        if status == 304 and cached:
+            _, ctype, content = cached
+
+        elif status != 200:
+            raise RuntimeError('query failed:\n %s' % content)
+
+        elif key:
+            self._etags.store(key, headers.get('ETag'), ctype, content)
 
         try:
-            result = json.loads(r.content)
+            codec  = for_content_type(ctype)
+            result = codec.decode(content)
 
         except ValueError as e:
             raise RuntimeError('query failed: %s' % repr(e))
 
-        print('     %-6s [%s]' % (result['success'], result.get('error', '')))
         if not result['success']:
             raise RuntimeError('query failed: %s' % result['error'])
 
         return result['result']
 
+    # --------------------------------------------------------------------------
+    #
+    def _stream_request(self, route, params, accept=None, ctype=None):
+        '''
+        return the URL, headers and query parameters of a streamed request
+        '''
+
+        headers = dict(self._headers)
+        if accept: headers['Accept']       = accept
+        if ctype : headers['Content-Type'] = ctype
+
+        params = {k: str(v) for k, v in params.items() if v is not None}
+
+        return self._qbase + route, headers, params
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _stream_error(status, ctype, content):
+        '''
+        raise the error reported by a failed streamed request
+        '''
+
+        if status not in [200, 206]:
+            raise RuntimeError('query failed:\n %s' % content)
+
+        # errors are reported as json documents
+        if (ctype or '').startswith('application/json'):
+            result = JSON.decode(content)
+            raise RuntimeError('query failed: %s' % result['error'])
+
+    # --------------------------------------------------------------------------
+    #
+    def timings(self, route=None):
+        """
+        return the latency breakdown of the recent requests (optionally only
+        of those whose route contains `route`, e.g. `/tasks/`), oldest first:
+
+            {'method' : 'GET',
+             'route'  : '/sessions/<sid>/tasks/',
+             'time'   : <request start (epoch)>,
+             'total'  : <request duration as seen by the client [s]>,
+             'server' : {'auth': [s], 'parse': [s], 'call': [s],
+                         'serialize': [s], 'total': [s]},
+             'network': <total - server total [s]>}
+
+        `server` is empty for services which don't send `Server-Timing`.
+        """
+        return self._timings.entries(route)
+
     # --------------------------------------------------------------------------
     #
     def login(self, username=None, password=None):
         """
         login to the service with given username and password.  This method will
-        stor a cookie with a session secret so that future calls on this NGE
-        object instance use the same credentials.  Another call to `login` will
-        overwrite that cookie and use the new credentials.
+        store the bearer token issued by the service (or a cookie with a session
+        secret for services which don't issue tokens) so that future calls on
+        this object instance use the same credentials.  Another call to `login`
+        will overwrite those and use the new credentials.
         """
+        return self._run(self._login(username, password))
+
+    def _login(self, username, password):
+
         username = username or self._url.username
         password = password or self._url.password
-        return self._query('put', '/login/', {'username': username,
-                                              'password': password})
+
+        self._clear_credentials()
+
+        result = yield ('put', '/login/', {'username': username,
+                                           'password': password}, None)
+        if result and result.get('token'):
+            self._clear_credentials()
+            self._headers = {'Authorization': 'Bearer %s' % result['token']}
+
+        return result
 
     # --------------------------------------------------------------------------
     #
     def logout(self):
         """
-        delete all sessions, terminate all pilots, invalidate the cookie.
+        delete all sessions, terminate all pilots, invalidate the credentials.
+        """
+        return self._run(self._logout())
+
+    def _logout(self):
+
+        result = yield ('put', '/logout/', None, None)
+        self._clear_credentials()
+
+        return result
+
+    # --------------------------------------------------------------------------
+    #
+    def status(self):
+        """
+        return service statistics (session pool usage etc.)
         """
-        return self._query('put', '/logout/')
+        return self._query('get', '/status/')
 
     # --------------------------------------------------------------------------
     #
-    def sessions_create(self, sid):
+    def sessions_create(self, sid, stage_output=None):
         """
         create named session.
         This will raise an error if the session already exists.
+
+        `stage_output` sets the output staging policy of the session:
+        `always` (default), `failed`, `never` or `lazy` (stage the output of
+        a task when it is first requested).  Tasks can override it via the
+        description key `stage_output`.
         """
-        return self._query('put', '/sessions/%s/' % sid)
+        data = None
+        if stage_output:
+            data = {'stage_output': stage_output}
+
+        return self._query('put', '/sessions/%s/' % sid, data)
 
     # --------------------------------------------------------------------------
     #
@@ -137,6 +540,18 @@ class PI:
         """
         return self._query('delete', '/sessions/%s/' % sid)
 
+    # --------------------------------------------------------------------------
+    #
+    def sessions_summary(self, sid):
+        """
+        return the number of pilots and tasks per state, the number of tasks
+        per pilot and state, and the task submission and completion rates
+        (tasks/s) over the last 10, 60 and 300 seconds.  This is cheap for
+        sessions of any size - poll it instead of `tasks_inspect` to monitor
+        progress.
+        """
+        return self._query('get', '/sessions/%s/summary' % sid)
+
     # --------------------------------------------------------------------------
     #
     def pilots_submit(self, sid, descriptions):
@@ -144,27 +559,114 @@ class PI:
         request pilots, either as backfill or batch queue pilots.  This call
         will return a list of pilot IDs.
         """
+        return self._run(self._submit('/sessions/%s/pilots/' % sid,
+                                      descriptions))
+
+    def _submit(self, route, descriptions):
+
         if not descriptions:
             return []
 
-        args = ['put', '/sessions/%s/pilots/' % sid, ru.as_list(descriptions)]
-        return self._query(*args)
+        return (yield ('put', route, ru.as_list(descriptions), None))
 
     # --------------------------------------------------------------------------
     #
-    def pilots_inspect(self, sid, pids=None):
+    def pilots_inspect(self, sid, pids=None, states=None, prefix=None,
+                             fields=None):
         """
-        return information about all pilots
+        return information about all pilots (or the ones with the given IDs),
+        optionally filtered by `states` and uid `prefix`.  If `fields` are
+        given, the returned dicts only contain those fields.
         """
-        pids = ru.as_list(pids)
+        return self._query('get', *self._inspect(sid, 'pilots', pids, states,
+                                                 prefix, fields))
 
-        args = ['get', '/sessions/%s/pilots/' % sid]
-        if pids and len(pids) == 1 and pids[0]:
-            args[1] += '%s/' % pids[0]
-        elif pids:
-            args.append({'pids': pids})
+    # --------------------------------------------------------------------------
+    #
+    def pilots_iter(self, sid, states=None, prefix=None, fields=None,
+                          page_size=1000):
+        """
+        like `pilots_inspect`, but iterate over the pilot dicts, fetching them
+        page by page from the service.
+        """
+        return self._iter_pages('/sessions/%s/pilots/' % sid,
+                                self._inspect_params(None, states, prefix,
+                                                     fields), page_size)
 
-        return self._query(*args)
+    # --------------------------------------------------------------------------
+    #
+    def pilots_sync(self, sid, fields=None):
+        """
+        return a client side mirror `{uid: pilot_dict}` of all pilots of the
+        session.  Only pilots which changed state since the last call are
+        fetched from the service and merged into the mirror.
+        """
+        return self._run(self._sync(sid, 'pilots', fields))
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync(self, sid, kind, fields):
+
+        route  = '/sessions/%s/%s/' % (sid, kind)
+        mirror = self._mirrors.setdefault((sid, route),
+                                          {'seq': 0, 'items': dict()})
+        if fields:
+            fields = ['uid'] + [f for f in ru.as_list(fields) if f != 'uid']
+
+        params = self._inspect_params(None, None, None, fields)
+        params['since'] = mirror['seq']
+
+        result = yield ('get', route, None, params)
+        for item in result['items']:
+            mirror['items'].setdefault(item['uid'], dict()).update(item)
+
+        mirror['seq'] = result['seq']
+
+        return mirror['items']
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _inspect_params(uids, states, prefix, fields):
+
+        params = {'uids'  : ','.join(ru.as_list(uids)),
+                  'state' : ','.join(ru.as_list(states)),
+                  'prefix': prefix,
+                  'fields': ','.join(ru.as_list(fields))}
+
+        return {k: v for k, v in params.items() if v}
+
+    def _inspect(self, sid, kind, uids, states, prefix, fields):
+
+        uids   = ru.as_list(uids)
+        params = self._inspect_params(uids, states, prefix, fields)
+
+        route = '/sessions/%s/%s/' % (sid, kind)
+        if uids and len(uids) == 1 and uids[0]:
+            route += '%s/' % uids[0]
+            del params['uids']
+
+        return route, None, params
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _next_page(params, page=None, page_size=None):
+        '''
+        return the query parameters for the first page (no `page` given) or
+        the page after `page` (`None` if that was the last one)
+        '''
+
+        if page is None:
+            params = dict(params)
+            params['limit'] = page_size
+            return params
+
+        if not page['cursor']:
+            return None
+
+        params['cursor'] = page['cursor']
+        return params
 
     # --------------------------------------------------------------------------
     #
@@ -176,16 +678,45 @@ class PI:
         reached, whichever occurs first.  A negative timeout value will cause it
         to wait forever.
         """
-        pids = ru.as_list(pids)
-        data = {'pids'   : pids,
+        return self._query(*self._wait(sid, 'pilots', 'pids', pids, states,
+                                       timeout))
+
+    def _wait(self, sid, kind, key, uids, states, timeout, count=None):
+
+        uids = ru.as_list(uids)
+        data = {key      : uids,
                 'states' : ru.as_list(states),
                 'timeout': timeout}
 
-        args = ['post', '/sessions/%s/pilots/' % sid, data]
-        if pids and len(pids) == 1 and pids[0]:
-            args[1] += '%s/' % pids[0]
+        if count is not None:
+            data['count'] = count
 
-        return self._query(*args)
+        route = '/sessions/%s/%s/' % (sid, kind)
+        if uids and len(uids) == 1 and uids[0]:
+            route += '%s/' % uids[0]
+
+        return 'post', route, data
+
+    # --------------------------------------------------------------------------
+    #
+    def pilots_wait_async(self, sid, pids=None, states=None):
+        """
+        like `pilots_wait`, but return immediately with a `WaitHandle` which
+        resolves once the pilots reached any of the given states.
+        """
+        return self._run(self._wait_async(sid, 'pilots', 'pids', pids, states))
+
+    def _wait_async(self, sid, kind, key, uids, states, count=None):
+
+        data = {key     : ru.as_list(uids),
+                'states': ru.as_list(states),
+                'async' : True}
+
+        if count is not None:
+            data['count'] = count
+
+        wid = yield ('post', '/sessions/%s/%s/' % (sid, kind), data, None)
+        return self._wait_handle(self, sid, wid)
 
     # --------------------------------------------------------------------------
     #
@@ -195,43 +726,88 @@ class PI:
         known resources if no UID is specified).  This call will return when the
         resource states are final.
         """
-        pids = ru.as_list(pids)
+        return self._query(*self._cancel(sid, 'pilots', 'pids', pids))
+
+    def _cancel(self, sid, kind, key, uids):
 
-        args = ['delete', '/sessions/%s/pilots/' % sid]
-        if pids and len(pids) == 1 and pids[0]:
-            args[1] += '%s/' % pids[0]
+        uids = ru.as_list(uids)
+
+        args = ['delete', '/sessions/%s/%s/' % (sid, kind)]
+        if uids and len(uids) == 1 and uids[0]:
+            args[1] += '%s/' % uids[0]
         else:
-            args.append({'pids': pids})
+            args.append({key: uids})
 
-        return self._query(*args)
+        return args
 
     # --------------------------------------------------------------------------
     #
     def tasks_submit(self, sid, descriptions):
         """
         task descriptions are submitted to the RP level resources  (pilots).
+        `descriptions` can be a list, or any iterable or generator - the latter
+        are streamed to the service (see `tasks_submit_stream`).
         """
-        if not descriptions:
-            return []
+        if isinstance(descriptions, dict):
+            descriptions = [descriptions]
+
+        if not isinstance(descriptions, (list, tuple)):
+            return self._collect(self.tasks_submit_stream(sid, descriptions))
+
+        return self._run(self._submit('/sessions/%s/tasks/' % sid,
+                                      list(descriptions)))
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _submitted(line):
+        '''
+        return the task UIDs reported in a line of a streamed submission
+        '''
+
+        record = JSON.decode(line)
 
-        args = ['put', '/sessions/%s/tasks/' % sid, ru.as_list(descriptions)]
-        return self._query(*args)
+        if 'uids' in record:
+            return record['uids']
+
+        if not record['success']:
+            raise RuntimeError('query failed: %s' % record['error'])
+
+        return []
 
     # --------------------------------------------------------------------------
     #
-    def tasks_inspect(self, sid, tids=None):
+    def tasks_inspect(self, sid, tids=None, states=None, prefix=None,
+                            fields=None):
         """
-        return UIDs for all known tasks
+        return information about all tasks (or the ones with the given IDs),
+        optionally filtered by `states` and uid `prefix`.  If `fields` are
+        given, the returned dicts only contain those fields.
         """
-        tids = ru.as_list(tids)
+        return self._query('get', *self._inspect(sid, 'tasks', tids, states,
+                                                 prefix, fields))
 
-        args = ['get', '/sessions/%s/tasks/' % sid]
-        if tids and len(tids) == 1 and tids[0]:
-            args[1] += '%s/' % tids[0]
-        elif tids:
-            args.append({'tids': tids})
+    # --------------------------------------------------------------------------
+    #
+    def tasks_iter(self, sid, states=None, prefix=None, fields=None,
+                         page_size=1000):
+        """
+        like `tasks_inspect`, but iterate over the task dicts, fetching them
+        page by page from the service.
+        """
+        return self._iter_pages('/sessions/%s/tasks/' % sid,
+                                self._inspect_params(None, states, prefix,
+                                                     fields), page_size)
 
-        return self._query(*args)
+    # --------------------------------------------------------------------------
+    #
+    def tasks_sync(self, sid, fields=None):
+        """
+        return a client side mirror `{uid: task_dict}` of all tasks of the
+        session.  Only tasks which changed state since the last call are
+        fetched from the service and merged into the mirror.
+        """
+        return self._run(self._sync(sid, 'tasks', fields))
 
     # --------------------------------------------------------------------------
     #
@@ -251,24 +827,424 @@ class PI:
 
     # --------------------------------------------------------------------------
     #
-    def tasks_wait(self, sid, tids=None, states=None, timeout=None):
+    def tasks_stdout_stream(self, sid, tid, offset=None, tail=None,
+                            follow=False, chunk_size=64 * 1024):
+        """
+        iterate over the stdout of a task in chunks of up to `chunk_size`
+        bytes, without holding the complete output in memory.  Start at byte
+        `offset` or with the last `tail` lines.  With `follow`, keep streaming
+        while the output grows, until the task is final - chunks are yielded
+        as soon as they arrive.
+        """
+        return self._output_stream(sid, tid, 'stdout', offset, tail, follow,
+                                   chunk_size)
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_stderr_stream(self, sid, tid, offset=None, tail=None,
+                            follow=False, chunk_size=64 * 1024):
+        """
+        iterate over the stderr of a task in chunks of bytes (see
+        `tasks_stdout_stream`)
+        """
+        return self._output_stream(sid, tid, 'stderr', offset, tail, follow,
+                                   chunk_size)
+
+    # --------------------------------------------------------------------------
+    #
+    def _output_request(self, sid, tid, ftype, offset, tail, follow):
+
+        return self._stream_request('/sessions/%s/tasks/%s/%s'
+                                    % (sid, tid, ftype),
+                                    {'offset': offset,
+                                     'tail'  : tail,
+                                     'follow': 1 if follow else None},
+                                    accept='text/plain')
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_wait(self, sid, tids=None, states=None, timeout=None,
+                         count=None):
         """
         wait for a specific (set of) states for all tasks
         with the given UIDs (or for all known tasks if no UID is specified).
         This call will return after a given timeout, or after the states have
         been reached, whichever occurs first.  A negative timeout value will
-        cause it to wait forever.
+        cause it to wait forever.  If `count` is given, the call returns as
+        soon as that many of the tasks reached the states.
         """
-        tids = ru.as_list(tids)
-        data = {'tids'   : tids,
-                'states' : ru.as_list(states),
-                'timeout': timeout}
+        return self._query(*self._wait(sid, 'tasks', 'tids', tids, states,
+                                       timeout, count))
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_wait_async(self, sid, tids=None, states=None, count=None):
+        """
+        like `tasks_wait`, but return immediately with a `WaitHandle` which
+        resolves once the tasks (or `count` of them) reached any of the given
+        states.
+        """
+        return self._run(self._wait_async(sid, 'tasks', 'tids', tids, states,
+                                          count))
+
+    # --------------------------------------------------------------------------
+    #
+    def task_manager_open(self, sid):
+        """
+        start the task manager of the session ahead of the first submission.
+        The task manager stays open across submissions and waits (so that
+        subsequent generations of tasks only pay the scheduling latency),
+        until `task_manager_close` is called or the session is closed.
+        """
+        return self._query('put', '/sessions/%s/taskmanager/' % sid)
+
+    # --------------------------------------------------------------------------
+    #
+    def task_manager_close(self, sid):
+        """
+        close the task manager of the session: tasks which are not final yet
+        are canceled (the next submission opens a new task manager)
+        """
+        return self._query('delete', '/sessions/%s/taskmanager/' % sid)
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_cancel(self, sid, tids=None):
+        """
+        cancel the tasks with the given UIDs (or all tasks of the session), and
+        return their states
+        """
+        return self._query(*self._cancel(sid, 'tasks', 'tids', tids))
+
+    # --------------------------------------------------------------------------
+    #
+    def waits_check(self, sid, wids, timeout=0):
+        """
+        return the status dicts of the given wait tickets (IDs or
+        `WaitHandle`s).  If none is resolved, wait up to `timeout` seconds for
+        any of them to resolve.  Handles passed in are updated in place.
+        """
+        return self._run(self._waits_check(sid, wids, timeout))
+
+    def _waits_check(self, sid, wids, timeout):
+
+        handles = {w.wid: w for w in ru.as_list(wids)
+                                       if isinstance(w, WaitHandle)}
+        wids    = [w.wid if isinstance(w, WaitHandle) else w
+                                       for w in ru.as_list(wids)]
+
+        infos = yield ('get', '/sessions/%s/waits/' % sid, None,
+                       {'wids'   : ','.join(wids),
+                        'timeout': timeout})
+
+        for info in infos:
+            if info['wid'] in handles:
+                handles[info['wid']]._update(info)
+
+        return infos
+
+    # --------------------------------------------------------------------------
+    #
+    def waits_release(self, sid, wid):
+        """
+        release a wait ticket on the service side
+        """
+        return self._query('delete', '/sessions/%s/waits/%s/' % (sid, wid))
+
+    # --------------------------------------------------------------------------
+    #
+    def _events_request(self, sid, since, batch):
+
+        return self._stream_request('/sessions/%s/events' % sid,
+                                    {'since': since, 'batch': batch},
+                                    accept='application/x-ndjson')
+
+    def _events(self, line, since):
+        '''
+        return the events contained in a line of an event stream
+        '''
+
+        record = JSON.decode(line)
+
+        if 'success' in record:
+            raise RuntimeError('query failed: %s' % record['error'])
+
+        if record['gap']:
+            self._log.warning('events lost after %d', since)
+
+        return record['events']
+
+
+# ------------------------------------------------------------------------------
+#
+class PI(_ClientBase):
+    """PI client class - RESTful API for `PilotClient`.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, url, log=None, prof=None, rep=None,
+                       compress_min=64 * 1024, codec='json',
+                       pool_size=10, retries=3, backoff=0.5,
+                       connect_timeout=10.0, read_timeout=None,
+                       etag_cache=256, timings=1024):
+        """
+        Connect to the service at `url` (and login if the URL contains
+        credentials).  Request bodies larger than `compress_min` bytes are sent
+        gzip compressed (`None` disables request compression), responses are
+        decompressed transparently.  Request and response bodies are encoded
+        with the given `codec` (`json` or `msgpack`, see `radical.pi.codec`).
+
+        GET responses which carry an `ETag` are cached (up to `etag_cache`
+        of them), and repeated requests are sent as conditional requests, so
+        that the service can answer with `304 Not Modified` if nothing changed.
+
+        The latency breakdown (see `timings()`) of the last `timings` requests
+        is kept (`0` disables the record).
+
+        Requests are sent over a pool of up to `pool_size` keep-alive
+        connections.  Failed connection attempts (and, for idempotent
+        requests, `502`, `503` and `504` replies) are retried up to `retries`
+        times with exponential `backoff` (seconds).  `connect_timeout` and
+        `read_timeout` limit the time to connect and to wait for data (`None`:
+        forever, as waits can block for a long time).
+        """
+
+        super().__init__(url, log, prof, rep, compress_min, codec,
+                         connect_timeout, read_timeout, etag_cache, timings)
+
+        self._cookies = []
+        self._session = self._create_session(pool_size, retries, backoff)
+
+        if self._url.username and self._url.password:
+            self.login(self._url.username, self._url.password)
+
+    # --------------------------------------------------------------------------
+    #
+    def _create_session(self, pool_size, retries, backoff):
+
+        # connection errors are always retried (the request was not sent),
+        # server errors only for idempotent requests
+        retry   = Retry(total=retries, backoff_factor=backoff,
+                        status_forcelist=[502, 503, 504],
+                        allowed_methods=['GET', 'HEAD', 'DELETE'],
+                        raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('http://',  adapter)
+        session.mount('https://', adapter)
+
+        # all requests go to the same service: evaluate proxy and CA settings
+        # from the environment once, not on every request
+        env = session.merge_environment_settings(self._qbase, {}, None,
+                                                 None, None)
+        session.proxies   = env['proxies']
+        session.verify    = env['verify']
+        session.trust_env = False
+
+        return session
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        """
+        close all pooled connections to the service
+        """
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # --------------------------------------------------------------------------
+    #
+    def _query(self, mode, route, data=None, params=None):
+
+        url, headers, body, params, ctx = self._prepare(mode, route, data,
+                                                        params)
+
+        r = self._session.request(mode.upper(), url, params=params,
+                                  cookies=self._cookies, headers=headers,
+                                  data=body, timeout=self._timeout)
+
+        result = self._reply(ctx, r.status_code, r.headers, r.content)
+
+        if r.cookies and not self._headers:
+            self._cookies = r.cookies
+
+        return result
+
+    # --------------------------------------------------------------------------
+    #
+    def _run(self, plan):
+
+        result = None
+        try:
+            while True:
+                result = self._query(*plan.send(result))
+
+        except StopIteration as e:
+            return e.value
+
+    def _collect(self, stream):
+
+        return list(stream)
+
+    def _clear_credentials(self):
+
+        self._cookies = []
+        self._headers = {}
+        self._session.cookies.clear()
+
+    # --------------------------------------------------------------------------
+    #
+    def _iter_pages(self, route, params, page_size):
+
+        params = self._next_page(params, page_size=page_size)
+
+        while params:
+
+            page = self._query('get', route, params=params)
+
+            for item in page['items']:
+                yield item
+
+            params = self._next_page(params, page)
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_submitter(self, sid, max_count=1024, max_bytes=4 * 1024 * 1024,
+                              linger=0.05):
+        """
+        return a `TaskSubmitter` which coalesces individual task submissions
+        into bulk requests, and returns futures for the task UIDs.
+        """
+        return TaskSubmitter(self, sid, max_count=max_count,
+                             max_bytes=max_bytes, linger=linger)
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_submit_stream(self, sid, descriptions, batch=1024):
+        """
+        stream task descriptions (any iterable or generator) to the service as
+        newline delimited json, without holding them all in memory.  Once the
+        upload is complete, the service submits them in batches of size
+        `batch`, and the task UIDs are yielded per batch as they are assigned.
+        """
+
+        def _lines():
+            for descr in descriptions:
+                yield JSON.encode(descr) + b'\n'
+
+        url, headers, params = self._stream_request(
+                                      '/sessions/%s/tasks/' % sid,
+                                      {'batch': batch},
+                                      ctype='application/x-ndjson')
+
+        with self._session.put(url, params=params, data=_lines(),
+                               cookies=self._cookies, headers=headers,
+                               timeout=self._timeout, stream=True) as r:
+
+            if r.status_code != 200:
+                raise RuntimeError('query failed:\n %s' % r.content)
+
+            for line in r.iter_lines():
+                if line:
+                    yield from self._submitted(line)
+
+    # --------------------------------------------------------------------------
+    #
+    def _output_stream(self, sid, tid, ftype, offset, tail, follow,
+                             chunk_size):
+
+        url, headers, params = self._output_request(sid, tid, ftype, offset,
+                                                    tail, follow)
+
+        with self._session.get(url, params=params, cookies=self._cookies,
+                               headers=headers, timeout=self._timeout,
+                               stream=True) as r:
+
+            ctype = r.headers.get('Content-Type')
+            if r.status_code not in [200, 206] or \
+                    (ctype or '').startswith('application/json'):
+                self._stream_error(r.status_code, ctype, r.content)
+
+            for chunk in _iter_body(r, chunk_size, live=follow):
+                yield chunk
+
+    # --------------------------------------------------------------------------
+    #
+    def as_completed(self, handles, timeout=None):
+        """
+        iterate over the given `WaitHandle`s (of any sessions) as they
+        resolve, using one long-poll per session and iteration.
+        """
+        pending = list(handles)
+        start   = time.time()
+
+        while pending:
+
+            for handle in [h for h in pending if h._done]:
+                pending.remove(handle)
+                yield handle
+
+            if not pending:
+                break
+
+            poll = WaitHandle._poll_time(start, timeout)
+            if poll is None:
+                raise TimeoutError('%d waits not resolved' % len(pending))
+
+            sids = {h.sid for h in pending}
+            for sid in sids:
+                self.waits_check(sid, [h for h in pending if h.sid == sid],
+                                 timeout=poll / len(sids))
+
+    # --------------------------------------------------------------------------
+    #
+    def events(self, sid, since=0, batch=1000, reconnect=True):
+        """
+        iterate over the pilot and task state transitions of a session, as
+        dicts with the keys `seq`, `kind`, `uid`, `state` and `time`.
+        Iteration starts after the sequence number `since` and ends when the
+        session is closed.  If the connection is lost, the stream is resumed
+        after the last seen event (unless `reconnect` is `False`).
+        """
+
+        while True:
+
+            url, headers, params = self._events_request(sid, since, batch)
+            try:
+                with self._session.get(url, params=params,
+                                       cookies=self._cookies, headers=headers,
+                                       timeout=self._timeout, stream=True) as r:
+
+                    if r.status_code != 200:
+                        raise RuntimeError('query failed:\n %s' % r.content)
+
+                    for line in _iter_lines(r):
+
+                        if not line:
+                            continue
+
+                        for event in self._events(line, since):
+                            since = event['seq']
+                            yield event
+
+                # the stream ended regularly: session is closed
+                return
 
-        args = ['post', '/sessions/%s/tasks/' % sid, data]
-        if tids and len(tids) == 1 and tids[0]:
-            args[1] += '%s/' % tids[0]
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.ChunkedEncodingError):
+                if not reconnect:
+                    raise
+                self._log.debug('event stream lost at %d, reconnect', since)
+                time.sleep(1)
 
-        return self._query(*args)
 
 # ------------------------------------------------------------------------------
 
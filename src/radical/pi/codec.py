@@ -0,0 +1,144 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# ------------------------------------------------------------------------------
+#
+def _default(obj):
+    '''
+    fallback serialization for types the codecs don't handle natively
+    '''
+
+    if hasattr(obj, 'as_dict'):
+        return obj.as_dict()
+
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+
+    return str(obj)
+
+
+# ------------------------------------------------------------------------------
+#
+class JsonCodec:
+    '''
+    stdlib json - always available
+    '''
+
+    name         = 'json'
+    content_type = 'application/json'
+
+    @staticmethod
+    def encode(data):
+        return json.dumps(data, default=_default).encode()
+
+    @staticmethod
+    def decode(data):
+        return json.loads(data)
+
+
+# ------------------------------------------------------------------------------
+#
+class OrjsonCodec:
+    '''
+    json via `orjson` (optional): same wire format, but several times faster
+    '''
+
+    name         = 'json'
+    content_type = 'application/json'
+
+    @staticmethod
+    def encode(data):
+        return orjson.dumps(data, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS)
+
+    @staticmethod
+    def decode(data):
+        return orjson.loads(data)
+
+
+# ------------------------------------------------------------------------------
+#
+class MsgpackCodec:
+    '''
+    binary encoding via `msgpack` (optional)
+    '''
+
+    name         = 'msgpack'
+    content_type = 'application/msgpack'
+
+    @staticmethod
+    def encode(data):
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+    @staticmethod
+    def decode(data):
+        return msgpack.unpackb(data, raw=False)
+
+
+# ------------------------------------------------------------------------------
+#
+# the json codec is the fallback for unknown content types
+#
+JSON   = OrjsonCodec if orjson else JsonCodec
+CODECS = {JSON.content_type: JSON}
+
+if msgpack:
+    CODECS[MsgpackCodec.content_type] = MsgpackCodec
+
+
+# ------------------------------------------------------------------------------
+#
+def get_codec(name):
+    '''
+    return the codec for the given name (`json`, `msgpack`) or content type
+    '''
+
+    for codec in CODECS.values():
+        if name in [codec.name, codec.content_type]:
+            return codec
+
+    raise ValueError('codec %s is not available' % name)
+
+
+# ------------------------------------------------------------------------------
+#
+def for_content_type(content_type):
+    '''
+    return the codec for decoding a body of the given content type
+    '''
+
+    ctype = (content_type or '').split(';')[0].strip().lower()
+    return CODECS.get(ctype, JSON)
+
+
+# ------------------------------------------------------------------------------
+#
+def negotiate(accept):
+    '''
+    return the codec for a response, given the request's `Accept` header.  The
+    first available non-json codec listed in the header is used, json
+    otherwise.
+    '''
+
+    for item in (accept or '').split(','):
+        ctype = item.split(';')[0].strip().lower()
+        if ctype in CODECS:
+            return CODECS[ctype]
+
+    return JSON
+
+
+# ------------------------------------------------------------------------------
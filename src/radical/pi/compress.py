@@ -0,0 +1,371 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import io
+import zlib
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# content types which are compressed, and which of them are streamed (and thus
+# need to be flushed for every chunk)
+COMPRESS_TYPES = ['application/json', 'application/x-ndjson',
+                  'application/msgpack', 'text/event-stream']
+STREAM_TYPES   = ['application/x-ndjson', 'text/event-stream']
+
+# max size of decoded request bodies, and the size above which they are kept
+# on disk instead of in memory
+MAX_BODY       = 1024 * 1024 * 1024
+SPOOL_SIZE     = 1024 * 1024
+
+
+# ------------------------------------------------------------------------------
+#
+def encodings():
+    '''
+    return the supported content encodings, by preference
+    '''
+
+    if zstandard:
+        return ['zstd', 'gzip']
+    return ['gzip']
+
+
+# ------------------------------------------------------------------------------
+#
+class _GzipEncoder:
+
+    def __init__(self, level):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _ZstdEncoder:
+
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def _encoder(encoding, level):
+
+    if encoding == 'zstd':
+        return _ZstdEncoder(level)
+    return _GzipEncoder(level)
+
+
+# ------------------------------------------------------------------------------
+#
+def _decoder(encoding):
+
+    if encoding == 'gzip':
+        obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return obj.decompress, obj.flush
+
+    if encoding == 'zstd' and zstandard:
+        obj = zstandard.ZstdDecompressor().decompressobj()
+        return obj.decompress, lambda: b''
+
+    raise ValueError('unsupported content encoding %s' % encoding)
+
+
+# ------------------------------------------------------------------------------
+#
+def _accepted(header):
+    '''
+    parse an `Accept-Encoding` header into the set of acceptable encodings
+    '''
+
+    accepted = set()
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        name  = parts[0].strip().lower()
+        qval  = 1.0
+        for param in parts[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    qval = float(param[2:])
+                except ValueError:
+                    pass
+        if name and qval > 0:
+            accepted.add(name)
+
+    return accepted
+
+
+# ------------------------------------------------------------------------------
+#
+def _vary(headers):
+    '''
+    add `Accept-Encoding` to the `Vary` header of a response
+    '''
+
+    for k, v in headers:
+        if k.lower() == 'vary' and 'accept-encoding' in v.lower():
+            return headers
+
+    return headers + [('Vary', 'Accept-Encoding')]
+
+
+# ------------------------------------------------------------------------------
+#
+class Compressor:
+    '''
+    WSGI middleware which
+
+      - compresses response bodies of the types listed in `COMPRESS_TYPES`
+        with an encoding negotiated via `Accept-Encoding` (zstd if the
+        `zstandard` module is available, gzip otherwise), if they are larger
+        than `threshold` bytes.  Buffered bodies are compressed in one pass
+        (and keep a `Content-Length`), other bodies are compressed while they
+        are streamed, streaming responses (events, ndjson) are flushed per
+        chunk;
+      - transparently decodes request bodies sent with `Content-Encoding: gzip`
+        (or `zstd`).
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, app, threshold=1024, level=6):
+
+        self._app       = app
+        self._threshold = threshold
+        self._level     = level
+
+    # --------------------------------------------------------------------------
+    #
+    def __call__(self, environ, start_response):
+
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding and encoding != 'identity':
+            try:
+                self._decode_body(environ, encoding)
+            except ValueError as e:
+                start_response('415 Unsupported Media Type',
+                               [('Content-Type', 'text/plain')])
+                return [str(e).encode()]
+
+            # the decoded body must outlive (streamed) request handling
+            return self._closing(self._handle(environ, start_response),
+                                 environ['wsgi.input'])
+
+        return self._handle(environ, start_response)
+
+    # --------------------------------------------------------------------------
+    #
+    def _closing(self, body, fobj):
+
+        try:
+            yield from body
+        finally:
+            self._close(body)
+            fobj.close()
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle(self, environ, start_response):
+
+        if self._threshold < 0:
+            return self._app(environ, start_response)
+
+        accepted = _accepted(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding in encodings():
+            if encoding in accepted:
+                break
+        else:
+            return self._app(environ, start_response)
+
+        captured = dict()
+
+        def _start_response(status, headers, exc_info=None):
+            captured['status']   = status
+            captured['headers']  = headers
+            captured['exc_info'] = exc_info
+            return lambda data: None
+
+        body = self._app(environ, _start_response)
+
+        return self._respond(body, captured, encoding, start_response)
+
+    # --------------------------------------------------------------------------
+    #
+    def _decode_body(self, environ, encoding):
+
+        decode, flush = _decoder(encoding)
+
+        length = environ.get('CONTENT_LENGTH')
+        length = int(length) if length else None
+        reader = environ['wsgi.input']
+        target = io.BytesIO()
+        size   = 0
+
+        while length is None or length > 0:
+
+            chunk = reader.read(64 * 1024 if length is None
+                                          else min(64 * 1024, length))
+            if not chunk:
+                break
+
+            if length is not None:
+                length -= len(chunk)
+
+            data  = decode(chunk)
+            size += len(data)
+            if size > MAX_BODY:
+                raise ValueError('request body too large')
+
+            # spill large bodies to disk
+            if size > SPOOL_SIZE and isinstance(target, io.BytesIO):
+                spool = tempfile.TemporaryFile()
+                spool.write(target.getbuffer())
+                target = spool
+
+            target.write(data)
+
+        data  = flush()
+        size += len(data)
+        target.write(data)
+        target.seek(0)
+
+        environ['wsgi.input']     = target
+        environ['CONTENT_LENGTH'] = str(size)
+        del environ['HTTP_CONTENT_ENCODING']
+
+    # --------------------------------------------------------------------------
+    #
+    def _respond(self, body, captured, encoding, start_response):
+
+        status  = captured['status']
+        headers = captured['headers']
+        names   = {k.lower(): v for k, v in headers}
+        ctype   = names.get('content-type', '').split(';')[0].strip()
+
+        if ctype not in COMPRESS_TYPES        or \
+           'content-encoding' in names        or \
+           'content-range'    in names        or \
+           status[:3] in ['204', '206', '304']:
+            start_response(status, headers, captured['exc_info'])
+            return body
+
+        streaming = ctype in STREAM_TYPES
+
+        # bodies which are buffered already are compressed in one pass, so
+        # that the response keeps a `Content-Length` (and the connection can
+        # be reused)
+        if not streaming and isinstance(body, (list, tuple)):
+            return self._respond_buffered(body, status, headers, encoding,
+                                          start_response, captured['exc_info'])
+
+        # buffer non-streaming bodies up to the threshold, to avoid
+        # compressing small responses
+        it     = iter(body)
+        buffer = list()
+        size   = 0
+        done   = False
+
+        if not streaming:
+            while size < self._threshold:
+                try:
+                    chunk = next(it)
+                except StopIteration:
+                    done = True
+                    break
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                buffer.append(chunk)
+                size += len(chunk)
+
+            if done and size < self._threshold:
+                start_response(status, headers, captured['exc_info'])
+                self._close(body)
+                return buffer
+
+        headers = [(k, v) for k, v in headers
+                          if k.lower() != 'content-length']
+        headers.append(('Content-Encoding', encoding))
+        headers = _vary(headers)
+        start_response(status, headers, captured['exc_info'])
+
+        return self._encode(body, it, buffer, done, encoding, streaming)
+
+    # --------------------------------------------------------------------------
+    #
+    def _respond_buffered(self, body, status, headers, encoding,
+                          start_response, exc_info):
+
+        try:
+            data = b''.join(chunk.encode() if isinstance(chunk, str) else chunk
+                            for chunk in body)
+        finally:
+            self._close(body)
+
+        if len(data) >= self._threshold:
+            encoder = _encoder(encoding, self._level)
+            data    = encoder.compress(data) + encoder.finish()
+            headers = [(k, v) for k, v in headers
+                              if k.lower() != 'content-length']
+            headers.append(('Content-Encoding', encoding))
+            headers = _vary(headers)
+            headers.append(('Content-Length', str(len(data))))
+
+        start_response(status, headers, exc_info)
+        return [data]
+
+    # --------------------------------------------------------------------------
+    #
+    def _encode(self, body, it, buffer, done, encoding, streaming):
+
+        encoder = _encoder(encoding, self._level)
+
+        try:
+            for chunk in buffer:
+                data = encoder.compress(chunk)
+                if data:
+                    yield data
+
+            if not done:
+                for chunk in it:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    data = encoder.compress(chunk)
+                    if streaming:
+                        data += encoder.flush()
+                    if data:
+                        yield data
+
+            yield encoder.finish()
+
+        finally:
+            self._close(body)
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _close(body):
+
+        if hasattr(body, 'close'):
+            body.close()
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,246 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import time
+import sqlite3
+
+import threading as mt
+
+
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        user    TEXT NOT NULL,
+        sid     TEXT NOT NULL,
+        uid     TEXT,
+        created REAL,
+        PRIMARY KEY (user, sid));
+
+    CREATE TABLE IF NOT EXISTS entities (
+        user    TEXT NOT NULL,
+        sid     TEXT NOT NULL,
+        kind    TEXT NOT NULL,
+        uid     TEXT NOT NULL,
+        state   TEXT,
+        time    REAL,
+        PRIMARY KEY (user, sid, kind, uid));
+'''
+
+
+# ------------------------------------------------------------------------------
+#
+class Journal:
+    '''
+    Write-behind journal of the open sessions of a service, and of the UIDs
+    and states of their pilots and tasks, in an SQLite database (WAL mode).
+
+    Records are queued in memory, and a background thread commits them every
+    `interval` seconds in a single transaction.  Repeated state transitions of
+    the same pilot or task within an interval are coalesced into one row
+    update, so that the journal adds no I/O to the request path and little
+    I/O per transition.  Transitions of the last interval before a crash may
+    be lost (`flush()` forces a commit).
+
+    Closed sessions are removed from the journal, so that `load()` returns
+    the sessions which were open when the service stopped.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, path, interval=1.0, log=None):
+
+        self._path     = path
+        self._interval = interval
+        self._log      = log
+
+        self._db = sqlite3.connect(path, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+        self._cond     = mt.Condition()
+        self._ops      = list()    # session opens and closes, in order
+        self._states   = dict()    # (user, sid, kind, uid): (state, time)
+        self._queued   = 0         # number of records queued so far
+        self._written  = 0         # number of records committed so far
+        self._commits  = 0
+        self._flush    = False
+        self._term     = False
+
+        # serializes the use of the database connection
+        self._db_lock  = mt.Lock()
+
+        self._thread   = mt.Thread(target=self._work, name='pi.journal')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    #
+    def session_opened(self, user, sid, uid):
+
+        with self._cond:
+            self._ops.append(('open', user, sid, uid, time.time()))
+            self._queued += 1
+
+    # --------------------------------------------------------------------------
+    #
+    def session_closed(self, user, sid):
+
+        with self._cond:
+            # pending transitions of that session need not be written anymore
+            for key in [k for k in self._states if k[:2] == (user, sid)]:
+                del self._states[key]
+            self._ops.append(('close', user, sid, None, None))
+            self._queued += 1
+
+    # --------------------------------------------------------------------------
+    #
+    def recorder(self, user, sid):
+        '''
+        return a state listener `(kind, uid, state)` for the given session
+        (see `Provider.set_listener`)
+        '''
+
+        def _record(kind, uid, state):
+            with self._cond:
+                self._states[(user, sid, kind, uid)] = (state, time.time())
+                self._queued += 1
+
+        return _record
+
+    # --------------------------------------------------------------------------
+    #
+    def load(self):
+        '''
+        return the journaled sessions as list of `(user, sid, uid, entities)`
+        tuples, where `entities` is `{'pilot': {uid: state}, 'task': {...}}`.
+        '''
+
+        self.flush()
+
+        with self._db_lock:
+            sessions = self._db.execute(
+                    'SELECT user, sid, uid FROM sessions ORDER BY created'
+                    ).fetchall()
+            rows     = self._db.execute(
+                    'SELECT user, sid, kind, uid, state FROM entities '
+                    'ORDER BY rowid').fetchall()
+
+        entities = {(user, sid): {'pilot': dict(), 'task': dict()}
+                    for user, sid, _ in sessions}
+        for user, sid, kind, uid, state in rows:
+            if (user, sid) in entities:
+                entities[(user, sid)][kind][uid] = state
+
+        return [(user, sid, uid, entities[(user, sid)])
+                for user, sid, uid in sessions]
+
+    # --------------------------------------------------------------------------
+    #
+    def flush(self, timeout=None):
+        '''
+        commit all queued records, and return `True` if they were written
+        within `timeout` seconds
+        '''
+
+        with self._cond:
+            target      = self._queued
+            self._flush = True
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                    lambda: self._written >= target or self._term, timeout)
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        '''
+        commit all queued records and close the database
+        '''
+
+        with self._cond:
+            if self._term:
+                return
+            self._term = True
+            self._cond.notify_all()
+
+        self._thread.join()
+        self._db.close()
+
+    # --------------------------------------------------------------------------
+    #
+    def stats(self):
+
+        with self._cond:
+            return {'queued' : self._queued - self._written,
+                    'commits': self._commits}
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self):
+
+        while True:
+
+            with self._cond:
+
+                # commit every `interval` seconds, or on `flush()` / `close()`
+                if not self._term and not self._flush:
+                    self._cond.wait(timeout=self._interval)
+
+                ops          = self._ops
+                states       = self._states
+                target       = self._queued
+                term         = self._term
+                self._ops    = list()
+                self._states = dict()
+                self._flush  = False
+
+            if ops or states:
+                try:
+                    self._commit(ops, states)
+                except Exception:
+                    if self._log:
+                        self._log.exception('journal commit failed')
+
+            with self._cond:
+                self._written = target
+                if ops or states:
+                    self._commits += 1
+                self._cond.notify_all()
+
+            if term:
+                break
+
+    # --------------------------------------------------------------------------
+    #
+    def _commit(self, ops, states):
+
+        with self._db_lock:
+
+            db = self._db
+            db.execute('BEGIN')
+            try:
+                for op, user, sid, uid, created in ops:
+                    if op == 'open':
+                        db.execute('INSERT OR REPLACE INTO sessions '
+                                   'VALUES (?, ?, ?, ?)',
+                                   (user, sid, uid, created))
+                    else:
+                        db.execute('DELETE FROM sessions '
+                                   'WHERE user=? AND sid=?', (user, sid))
+                        db.execute('DELETE FROM entities '
+                                   'WHERE user=? AND sid=?', (user, sid))
+
+                db.executemany('INSERT INTO entities '
+                               'VALUES (?, ?, ?, ?, ?, ?) '
+                               'ON CONFLICT (user, sid, kind, uid) DO UPDATE '
+                               'SET state=excluded.state, time=excluded.time',
+                               [key + val for key, val in states.items()])
+                db.execute('COMMIT')
+
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,201 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import threading as mt
+
+
+# content type of the Prometheus text exposition format
+CONTENT_TYPE    = 'text/plain; version=0.0.4; charset=utf-8'
+
+# default histogram buckets for request latencies (seconds)
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+
+# ------------------------------------------------------------------------------
+#
+def _escape(value):
+
+    return str(value).replace('\\', '\\\\') \
+                     .replace('"',  '\\"')  \
+                     .replace('\n', '\\n')
+
+
+def _sample(name, labels, values, value, extra=None):
+
+    pairs = ['%s="%s"' % (k, _escape(v)) for k, v in zip(labels, values)]
+    if extra:
+        pairs.append('%s="%s"' % extra)
+
+    if pairs:
+        return '%s{%s} %s' % (name, ','.join(pairs), _format(value))
+    return '%s %s' % (name, _format(value))
+
+
+def _format(value):
+
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return '%d' % value
+    return repr(value)
+
+
+# ------------------------------------------------------------------------------
+#
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, doc, labels=()):
+
+        self.name    = name
+        self.doc     = doc
+        self.labels  = tuple(labels)
+        self._lock   = mt.Lock()
+        self._values = dict()          # label values: value
+
+    def render(self, only=None):
+        '''
+        render all samples, or only those whose labels match the label values
+        in the dict `only` (labels which the metric doesn't have are ignored)
+        '''
+
+        out = ['# HELP %s %s' % (self.name, self.doc),
+               '# TYPE %s %s' % (self.name, self.kind)]
+
+        with self._lock:
+            items = sorted(self._values.items())
+
+        match = [(self.labels.index(label), value)
+                 for label, value in (only or {}).items()
+                 if  label in self.labels]
+
+        for values, value in items:
+            if all(values[idx] == val for idx, val in match):
+                out.extend(self._samples(values, value))
+
+        return out
+
+    def _samples(self, values, value):
+
+        return [_sample(self.name, self.labels, values, value)]
+
+
+# ------------------------------------------------------------------------------
+#
+class Counter(_Metric):
+    '''
+    monotonically increasing value, per set of label values
+    '''
+
+    kind = 'counter'
+
+    def inc(self, values=(), amount=1):
+
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+
+# ------------------------------------------------------------------------------
+#
+class Gauge(_Metric):
+    '''
+    current value, per set of label values
+    '''
+
+    kind = 'gauge'
+
+    def set(self, values=(), value=0):
+
+        with self._lock:
+            self._values[values] = value
+
+
+# ------------------------------------------------------------------------------
+#
+class Histogram(_Metric):
+    '''
+    distribution of observed values over a fixed set of buckets, per set of
+    label values
+    '''
+
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets=None):
+
+        super().__init__(name, doc, labels)
+
+        self.buckets = sorted(buckets or LATENCY_BUCKETS) + [float('inf')]
+
+    def observe(self, value, values=()):
+
+        with self._lock:
+
+            entry = self._values.get(values)
+            if entry is None:
+                # [bucket counts..., sum]
+                entry = [0] * len(self.buckets) + [0.0]
+                self._values[values] = entry
+
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[idx] += 1
+                    break
+
+            entry[-1] += value
+
+    def _samples(self, values, entry):
+
+        out   = list()
+        total = 0
+        for bound, count in zip(self.buckets, entry):
+            total += count
+            out.append(_sample(self.name + '_bucket', self.labels, values,
+                               total, ('le', _format(float(bound)))))
+
+        out.append(_sample(self.name + '_sum',   self.labels, values,
+                           entry[-1]))
+        out.append(_sample(self.name + '_count', self.labels, values, total))
+
+        return out
+
+
+# ------------------------------------------------------------------------------
+#
+class Registry:
+    '''
+    Set of metrics rendered in the Prometheus text exposition format.
+    '''
+
+    def __init__(self):
+
+        self._metrics = list()
+
+    def counter(self, name, doc, labels=()):
+        return self._add(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, labels=()):
+        return self._add(Gauge(name, doc, labels))
+
+    def histogram(self, name, doc, labels=(), buckets=None):
+        return self._add(Histogram(name, doc, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra=None, only=None):
+        '''
+        render all registered metrics, and the `extra` (unregistered) ones
+        (see `_Metric.render` for `only`)
+        '''
+
+        out = list()
+        for metric in self._metrics + list(extra or []):
+            out.extend(metric.render(only))
+
+        return '\n'.join(out) + '\n'
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,195 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import time
+
+import threading as mt
+
+from collections import deque
+
+
+# ------------------------------------------------------------------------------
+#
+class SessionPool:
+    '''
+    Pool of pre-initialized session instances (`PilotClient`s).  Creating an
+    instance is slow (it creates an `rp.Session` and an `rp.PilotManager`), so
+    a background thread keeps up to `size` instances ready for checkout:
+
+      - refill: the pool is refilled to `size` as soon as fewer than `low`
+                instances are ready;
+      - evict : instances which have been idle for more than `idle` seconds
+                are closed and replaced by fresh ones.
+
+    If the pool is empty on checkout (a miss), an instance is created
+    synchronously.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, factory, size=1, low=None, idle=3600, log=None):
+
+        self._factory = factory
+        self._size    = size
+        self._low     = size if low is None else max(1, min(low, size))
+        self._idle    = idle
+        self._log     = log
+
+        self._ready   = deque()        # [(instance, creation time), ...]
+        self._cond    = mt.Condition()
+        self._term    = mt.Event()
+        self._thread  = None
+        self._filling = True
+
+        self._hits    = 0
+        self._misses  = 0
+        self._evicted = 0
+        self._failed  = 0
+        self._inits   = list()         # init times of the last 100 instances
+
+    # --------------------------------------------------------------------------
+    #
+    def start(self):
+
+        if self._size < 1 or self._thread:
+            return
+
+        self._thread = mt.Thread(target=self._work, name='pi.pool')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        '''
+        stop refilling and close all idle instances
+        '''
+
+        self._term.set()
+        with self._cond:
+            self._cond.notify_all()
+            ready = list(self._ready)
+            self._ready.clear()
+
+        if self._thread:
+            self._thread.join()
+
+        for instance, _ in ready:
+            self._close(instance)
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self):
+        '''
+        check out a ready instance, or create a new one if none is available
+        '''
+
+        with self._cond:
+
+            if self._ready:
+                instance, _ = self._ready.popleft()
+                self._hits += 1
+                if len(self._ready) < self._low:
+                    self._cond.notify_all()
+                return instance
+
+            self._misses += 1
+            self._cond.notify_all()
+
+        return self._create()
+
+    # --------------------------------------------------------------------------
+    #
+    def stats(self):
+
+        with self._cond:
+
+            total = self._hits + self._misses
+            inits = self._inits
+
+            return {'size'     : self._size,
+                    'ready'    : len(self._ready),
+                    'hits'     : self._hits,
+                    'misses'   : self._misses,
+                    'hit_rate' : self._hits / total if total else None,
+                    'evicted'  : self._evicted,
+                    'failed'   : self._failed,
+                    'init_last': inits[-1] if inits else None,
+                    'init_mean': sum(inits) / len(inits) if inits else None,
+                    'init_max' : max(inits) if inits else None}
+
+    # --------------------------------------------------------------------------
+    #
+    def _create(self):
+
+        start    = time.time()
+        instance = self._factory()
+        duration = time.time() - start
+
+        with self._cond:
+            self._inits.append(duration)
+            if len(self._inits) > 100:
+                self._inits.pop(0)
+
+        return instance
+
+    # --------------------------------------------------------------------------
+    #
+    def _close(self, instance):
+
+        try:
+            instance.close()
+        except Exception:
+            if self._log:
+                self._log.exception('failed to close pooled instance')
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self):
+
+        while not self._term.is_set():
+
+            # evict instances which have been idle for too long
+            expired = list()
+            with self._cond:
+                limit = time.time() - self._idle
+                while self._ready and self._ready[0][1] < limit:
+                    expired.append(self._ready.popleft()[0])
+                    self._evicted += 1
+
+                if len(self._ready) <  self._low : self._filling = True
+                if len(self._ready) >= self._size: self._filling = False
+
+                filling = self._filling
+
+            for instance in expired:
+                self._close(instance)
+
+            if not filling:
+                # wait until instances are checked out or need eviction
+                with self._cond:
+                    if len(self._ready) >= self._low:
+                        self._cond.wait(timeout=min(self._idle, 60))
+                continue
+
+            try:
+                instance = self._create()
+
+            except Exception:
+                if self._log:
+                    self._log.exception('failed to create pooled instance')
+                with self._cond:
+                    self._failed += 1
+                self._term.wait(timeout=10)
+                continue
+
+            with self._cond:
+                if not self._term.is_set():
+                    self._ready.append((instance, time.time()))
+                    instance = None
+
+            if instance:
+                self._close(instance)
+
+
+# ------------------------------------------------------------------------------
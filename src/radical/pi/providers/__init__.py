@@ -1,2 +1,60 @@
 
-from .pilot import PilotClient
+import os
+import importlib
+
+from .base import Provider
+
+
+# ------------------------------------------------------------------------------
+#
+# Registry of session providers: names map to provider classes, or to their
+# import paths (so that, e.g., `radical.pilot` is only imported if the `rp`
+# provider is used).  The service uses the provider named by the env variable
+# `RADICAL_PI_PROVIDER` (default: `rp`).
+#
+PROVIDERS = {'rp'   : 'radical.pi.providers.pilot.PilotClient',
+             'local': 'radical.pi.providers.local.LocalClient',
+             'sim'  : 'radical.pi.providers.sim.SimClient'}
+
+
+def register(name, provider):
+    '''
+    register a provider class (or its import path) under the given name
+    '''
+
+    PROVIDERS[name] = provider
+
+
+def get_provider(name=None):
+    '''
+    return the provider class registered under the given name (default: env
+    variable `RADICAL_PI_PROVIDER`, or `rp`).  Names which are not registered
+    are imported as `module.Class` path.
+    '''
+
+    name     = name or os.environ.get('RADICAL_PI_PROVIDER') or 'rp'
+    provider = PROVIDERS.get(name, name)
+
+    if isinstance(provider, str):
+
+        if '.' not in provider:
+            raise ValueError('unknown provider %s (known: %s)'
+                             % (name, ', '.join(sorted(PROVIDERS))))
+
+        mod, cls = provider.rsplit('.', 1)
+        provider = getattr(importlib.import_module(mod), cls)
+
+    return provider
+
+
+# provider classes are imported on first access
+def __getattr__(name):
+
+    for path in PROVIDERS.values():
+        if isinstance(path, str) and path.rsplit('.', 1)[1] == name:
+            return get_provider(path)
+
+    raise AttributeError('module %s has no attribute %s' % (__name__, name))
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,620 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import os
+import shutil
+import tempfile
+
+import threading as mt
+
+import radical.utils as ru
+
+from .tracker import StateTracker
+from .query   import Index, select
+from .cache   import get_output_cache
+
+
+# ------------------------------------------------------------------------------
+#
+class Entity:
+    '''
+    pilot or task of providers which don't have their own objects for those
+    '''
+
+    def __init__(self, uid, description, state='NEW'):
+
+        self.uid         = uid
+        self.state       = state
+        self.description = description
+        self.exit_code   = None
+        self.stdout      = None
+        self.stderr      = None
+        self.pilot       = None
+
+    def as_dict(self):
+
+        return {'uid'        : self.uid,
+                'state'      : self.state,
+                'description': self.description,
+                'exit_code'  : self.exit_code,
+                'stdout'     : self.stdout,
+                'stderr'     : self.stderr,
+                'pilot'      : self.pilot}
+
+
+# ------------------------------------------------------------------------------
+#
+class Provider:
+    """Base class for session providers, i.e., the backends which execute the
+    pilots and tasks of a service session.
+
+    A provider instance represents one session.  Subclasses implement
+
+      - `uid`                 : session ID
+      - `submit`              : submit pilots, return their UIDs
+      - `cancel`              : cancel pilots, return their states
+      - `submit_tasks_iter`   : submit tasks in batches, yield their UIDs
+      - `cancel_tasks`        : cancel tasks, return their states
+      - `_output_path`        : location of a task's stdout / stderr file
+      - `close`               : release all resources (call `Provider.close`)
+
+    and register the pilots and tasks they create in `_pilots` and `_tasks`
+    (`query.Index` dicts `{uid: obj}`, where `obj` has `uid` and `state`
+    attributes and an `as_dict()` method).  All state transitions must be
+    reported to `_tracker.advance()`, which drives inspection, waits and
+    events - the remaining API is implemented here on top of the tracker.
+    """
+
+    # final states of pilots and tasks
+    FINAL    = ['DONE', 'FAILED', 'CANCELED']
+    FAILED   = 'FAILED'
+    CANCELED = 'CANCELED'
+
+    # output staging policies (see `set_stage_output`)
+    STAGE_OUTPUT = ['always', 'failed', 'never', 'lazy']
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, log=None, prof=None, rep=None):
+
+        ns = self.__class__.__name__.lower()
+
+        if log : self._log  = log
+        else   : self._log  = ru.Logger(ns)
+
+        if prof: self._prof = prof
+        else   : self._prof = ru.Profiler(ns)
+
+        if rep : self._rep  = rep
+        else   : self._rep  = ru.Reporter(ns)
+
+        # serialize concurrent service requests where needed
+        self._lock    = mt.RLock()
+
+        # track pilot and task states for inspection, wait tickets and events
+        self._tracker = StateTracker(self.FINAL)
+
+        # track submitted pilots and tasks
+        self._pilots  = Index()
+        self._tasks   = Index()
+
+        # task output cache, shared by all sessions
+        self._outputs = get_output_cache()
+
+        # output staging policy of the session, and of each task
+        self._staging = None
+        self._stage   = {}
+        self.set_stage_output()
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def uid(self):
+
+        raise NotImplementedError('uid is not implemented')
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        self._tracker.close()
+        self._outputs.invalidate((self.uid,))
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def closed(self):
+
+        return self._tracker.closed
+
+    # --------------------------------------------------------------------------
+    #
+    def set_listener(self, listener):
+        '''
+        report all subsequent pilot and task state transitions to
+        `listener(kind, uid, state)` (see `StateTracker.set_listener`)
+        '''
+
+        self._tracker.set_listener(listener)
+
+    # --------------------------------------------------------------------------
+    #
+    def restore(self, pilots, tasks):
+        '''
+        register the pilots and tasks of a previous instance of this session
+        (`{uid: state}` dicts, e.g., from the service journal) for inspection.
+        Their execution ended with the previous instance, so that pilots and
+        tasks which were not final are moved to `CANCELED`.
+        '''
+
+        for kind, entities, states in [('pilot', self._pilots, pilots),
+                                       ('task',  self._tasks,  tasks)]:
+            for uid, state in states.items():
+
+                entity = Entity(uid, None, state)
+                with self._lock:
+                    entities[uid] = entity
+
+                self._tracker.advance(kind, uid, state)
+
+                if state not in self.FINAL:
+                    entity.state = self.CANCELED
+                    self._tracker.advance(kind, uid, self.CANCELED)
+
+    # --------------------------------------------------------------------------
+    #
+    def _next_uid(self, fmt, counter, entities):
+        '''
+        return the next UID (`fmt % next(counter)`) which is not in use, e.g.,
+        by restored entities
+        '''
+
+        while True:
+            uid = fmt % next(counter)
+            if uid not in entities:
+                return uid
+
+    # --------------------------------------------------------------------------
+    #
+    # Pilots
+    #
+    def submit(self, requests):
+
+        raise NotImplementedError('submit is not implemented')
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel(self, pids=None):
+
+        raise NotImplementedError('cancel is not implemented')
+
+    # --------------------------------------------------------------------------
+    #
+    def inspect(self, pids=None, states=None, prefix=None, fields=None,
+                      limit=None, cursor=None, since=None):
+        '''
+        return pilot dicts (see `_inspect`)
+        '''
+
+        return self._inspect('pilot', self._pilots, pids, states, prefix,
+                             fields, limit, cursor, since)
+
+    # --------------------------------------------------------------------------
+    #
+    def wait(self, pids=None, states=None, timeout=None):
+        '''
+        wait until the pilots reached any of the given states (default: final
+        states), and return their states
+        '''
+
+        return self._wait('pilot', pids, states, timeout)
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_ticket(self, pids=None, states=None):
+        '''
+        non-blocking version of `wait()`: return the ID of a wait ticket which
+        resolves once the pilots reached the given states (see `check_tickets`)
+        '''
+
+        return self._tracker.create_ticket('pilot', pids, states)
+
+    # --------------------------------------------------------------------------
+    #
+    # Tasks
+    #
+    def submit_tasks(self, descriptions):
+
+        uids = list()
+        for batch in self.submit_tasks_iter(descriptions):
+            uids.extend(batch)
+
+        return uids
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_tasks_iter(self, descriptions, batch_size=1024):
+        '''
+        submit task descriptions (any iterable) in batches of up to
+        `batch_size`, and yield the list of task UIDs for each batch as soon
+        as it is submitted.
+        '''
+
+        raise NotImplementedError('submit_tasks_iter is not implemented')
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_tasks(self, tids=None):
+
+        raise NotImplementedError('cancel_tasks is not implemented')
+
+    # --------------------------------------------------------------------------
+    #
+    def inspect_tasks(self, tids=None, states=None, prefix=None, fields=None,
+                            limit=None, cursor=None, since=None):
+        '''
+        return task dicts (see `_inspect`)
+        '''
+
+        return self._inspect('task', self._tasks, tids, states, prefix,
+                             fields, limit, cursor, since)
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_tasks(self, tids=None, states=None, timeout=None, count=None):
+        '''
+        wait until the tasks (or `count` of them) reached any of the given
+        states (default: final states), and return their states
+        '''
+
+        return self._wait('task', tids, states, timeout, count)
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_tasks_ticket(self, tids=None, states=None, count=None):
+        '''
+        non-blocking version of `wait_tasks()`: return the ID of a wait ticket
+        which resolves once the tasks (or `count` of them) reached the given
+        states (see `check_tickets`)
+        '''
+
+        return self._tracker.create_ticket('task', tids, states, count)
+
+    # --------------------------------------------------------------------------
+    #
+    def open_task_manager(self):
+        '''
+        prepare the execution of tasks ahead of the first submission (for
+        providers which need to, e.g., start a task manager)
+        '''
+
+        pass
+
+    # --------------------------------------------------------------------------
+    #
+    def close_task_manager(self):
+        '''
+        release the resources held for the execution of tasks, until the next
+        submission (for providers which hold any, see `open_task_manager`)
+        '''
+
+        pass
+
+    # --------------------------------------------------------------------------
+    #
+    def is_final(self, tid):
+
+        return self._tracker.is_final('task', tid)
+
+    # --------------------------------------------------------------------------
+    #
+    # Output
+    #
+    def set_stage_output(self, policy=None):
+        '''
+        set the default output staging policy for subsequently submitted
+        tasks (tasks can override it via the description key `stage_output`):
+
+          - `always`: stage stdout and stderr of all tasks
+          - `failed`: only stage the output of failed tasks
+          - `never` : don't stage any output
+          - `lazy`  : stage the output of a task when it is first requested
+
+        Without a policy, the service default `RADICAL_PI_STAGE_OUTPUT` is
+        used (`always` if that is not set).
+        '''
+
+        policy = policy or os.environ.get('RADICAL_PI_STAGE_OUTPUT') or 'always'
+        if policy not in self.STAGE_OUTPUT:
+            raise ValueError('invalid output staging policy %s' % policy)
+
+        self._staging = policy
+
+    # --------------------------------------------------------------------------
+    #
+    def _stage_policy(self, descr):
+        '''
+        remove the `stage_output` key from a task description, and return the
+        staging policy for that task
+        '''
+
+        policy = descr.pop('stage_output', None) or self._staging
+        if policy not in self.STAGE_OUTPUT:
+            raise ValueError('invalid output staging policy %s' % policy)
+
+        return policy
+
+    # --------------------------------------------------------------------------
+    #
+    def _fetch_output(self, tid, ftype, fname):
+        '''
+        stage the stdout or stderr of a final task on demand, if its staging
+        policy permits that, and return `True` if the file was staged
+        '''
+
+        policy = self._stage.get(tid)
+
+        if policy not in ['lazy', 'failed'] or not self.is_final(tid):
+            return False
+
+        if policy == 'failed' and self._tasks[tid].state != self.FAILED:
+            return False
+
+        return self._copy_output(tid, ftype, fname)
+
+    # --------------------------------------------------------------------------
+    #
+    def _copy_output(self, tid, ftype, fname):
+        '''
+        write the stdout or stderr of a task to `fname`, from the output
+        reported with the task (its `stdout` or `stderr` attribute)
+        '''
+
+        if ftype == 'out': data = getattr(self._tasks[tid], 'stdout', None)
+        else             : data = getattr(self._tasks[tid], 'stderr', None)
+
+        if data is None:
+            return False
+
+        self._write_output(fname, data.encode('utf-8'))
+        return True
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _write_output(fname, data):
+        '''
+        atomically write an output file (concurrent requests may stage it).
+        `data` is a bytes object, or a binary file object to copy from.
+        '''
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fname),
+                                   prefix='.%s.' % os.path.basename(fname))
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                if isinstance(data, bytes):
+                    fout.write(data)
+                else:
+                    shutil.copyfileobj(data, fout)
+            os.replace(tmp, fname)
+
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    # --------------------------------------------------------------------------
+    #
+    def _output_path(self, tid, ftype):
+
+        raise NotImplementedError('_output_path is not implemented')
+
+    # --------------------------------------------------------------------------
+    #
+    def get_output_path(self, tid, ftype, check=True):
+        '''
+        return the path of the stdout (`ftype='out'`) or stderr (`ftype='err'`)
+        file of a task.  If `check` is set and that file does not (yet) exist,
+        stage it on demand (see `set_stage_output`), or raise an error.
+        '''
+
+        if ftype not in ['out', 'err']:
+            raise RuntimeError('task output format incorrect: %s' % ftype)
+
+        if tid not in self._tasks:
+            raise ValueError('task ID is unknown')
+
+        std_fname = self._output_path(tid, ftype)
+
+        if check and not os.path.isfile(std_fname):
+            if not self._fetch_output(tid, ftype, std_fname):
+                raise RuntimeError('std%s for %s is not available'
+                                   % (ftype, tid))
+
+        return std_fname
+
+    # --------------------------------------------------------------------------
+    #
+    def follow_output(self, tid, ftype):
+        '''
+        return the path of the stdout or stderr file of a task which may still
+        be running, and a callable which returns `True` once the task is final
+        (see `stream.follow_file`).  Output which is staged on demand is
+        staged at that point.  For final tasks and for output which is never
+        staged, this raises like `get_output_path`.
+        '''
+
+        if self.is_final(tid):
+            return self.get_output_path(tid, ftype), lambda: True
+
+        fname = self.get_output_path(tid, ftype, check=False)
+
+        if self._stage.get(tid) == 'never':
+            raise RuntimeError('std%s for %s is not staged' % (ftype, tid))
+
+        def done():
+            if not self.is_final(tid):
+                return False
+            if not os.path.isfile(fname):
+                self._fetch_output(tid, ftype, fname)
+            return True
+
+        return fname, done
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_task_output(self, tid, ftype):
+
+        std_fname = self.get_output_path(tid, ftype)
+
+        return self._outputs.read((self.uid, tid, ftype), std_fname,
+                                  self._decode_output)
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _decode_output(data):
+
+        output = str(data, 'utf-8')
+
+        # universal newlines, as for files opened in text mode
+        if '\r' in output:
+            output = output.replace('\r\n', '\n').replace('\r', '\n')
+
+        return output
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_stdout(self, tid):
+        return self._get_task_output(tid=tid, ftype='out')
+
+    # --------------------------------------------------------------------------
+    #
+    def tasks_stderr(self, tid):
+        return self._get_task_output(tid=tid, ftype='err')
+
+    # --------------------------------------------------------------------------
+    #
+    # State tracking
+    #
+    def version(self, kind):
+        '''
+        return the version of the `pilot` or `task` collection, which changes
+        whenever any pilot or task of that kind is added or changes state
+        '''
+
+        return self._tracker.version(kind)
+
+    # --------------------------------------------------------------------------
+    #
+    def _inspect(self, kind, entities, uids, states, prefix, fields, limit,
+                       cursor, since):
+        '''
+        return pilot or task dicts, filtered by `states` and uid `prefix`, and
+        reduced to the given `fields`.  If `limit` or `cursor` are specified,
+        return a page of results as `{'items': [...], 'cursor': <next>}`
+        (see `query.select`).
+
+        If `since` is specified, only entities which changed state after that
+        sequence number are returned, and the result dict also contains the
+        current sequence number as `seq`.
+        '''
+
+        seq = None
+        if since is not None:
+            changed, seq = self._tracker.get_changed(kind, int(since))
+            if uids:
+                uids    = set(uids)
+                changed = [uid for uid in changed if uid in uids]
+            if not changed:
+                return {'items' : [],
+                        'cursor': None,
+                        'seq'   : seq}
+            uids = changed
+
+        items, nxt = select(entities, uids, states, prefix, fields,
+                            limit, cursor)
+
+        if seq is not None:
+            return {'items' : items,
+                    'cursor': nxt,
+                    'seq'   : seq}
+
+        if limit is None and cursor is None:
+            return items
+
+        return {'items' : items,
+                'cursor': nxt}
+
+    # --------------------------------------------------------------------------
+    #
+    def _wait(self, kind, uids, states, timeout, count=None):
+        '''
+        blocking wait on a wait ticket, returns the states of the pilots or
+        tasks (also on timeout)
+        '''
+
+        if timeout is not None and timeout < 0:
+            timeout = None
+
+        wid = self._tracker.create_ticket(kind, uids, states, count)
+        try:
+            info = self._tracker.check_tickets([wid], timeout)[0]
+        finally:
+            self._tracker.release_ticket(wid)
+
+        if info['result'] is not None:
+            return info['result']
+
+        current = self._tracker.get_states(kind, uids or None)
+        return list(current.values())
+
+    # --------------------------------------------------------------------------
+    #
+    def check_tickets(self, wids, timeout=None):
+        '''
+        return the status of the given wait tickets, waiting up to `timeout`
+        seconds for any of them to resolve
+        '''
+
+        return self._tracker.check_tickets(ru.as_list(wids), timeout)
+
+    # --------------------------------------------------------------------------
+    #
+    def release_ticket(self, wid):
+
+        self._tracker.release_ticket(wid)
+
+    # --------------------------------------------------------------------------
+    #
+    def get_events(self, since=0, limit=None, timeout=None):
+        '''
+        return pilot and task state transitions after sequence number `since`
+        (see `StateTracker.get_events`)
+        '''
+
+        return self._tracker.get_events(since, limit, timeout)
+
+    # --------------------------------------------------------------------------
+    #
+    def stats(self):
+        '''
+        return the number of pilots and tasks per state, and the number of
+        unresolved wait tickets
+        '''
+
+        return {'pilot'  : self._tracker.get_counts('pilot'),
+                'task'   : self._tracker.get_counts('task'),
+                'tickets': self._tracker.backlog}
+
+    # --------------------------------------------------------------------------
+    #
+    def summary(self):
+        '''
+        return the pilot and task counts per state, the task counts per pilot,
+        and the task throughput (see `StateTracker.summary`)
+        '''
+
+        return self._tracker.summary()
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,129 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import os
+
+import threading as mt
+
+from collections import OrderedDict
+
+
+# ------------------------------------------------------------------------------
+#
+class OutputCache:
+    '''
+    LRU cache of decoded task output (text) with a size budget, shared by all
+    sessions of a service.  Entries are keyed by `(session, tid, ftype)` and
+    validated against the file's mtime and size on every lookup (a single
+    `stat` call), so that outputs which are still growing are re-read.
+
+    A hit returns the cached text without reading or decoding the file.
+    Entries count against the `budget` with the size of their file: least
+    recently used entries are evicted when it is exceeded, files larger than
+    the budget are not cached at all.  (Raw and ranged output requests don't
+    use the cache, they are served from the files directly.)
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, budget=64 * 2**20):
+
+        self._budget   = budget
+        self._lock     = mt.Lock()
+        self._entries  = OrderedDict()    # key: (stamp, size, text)
+        self._size     = 0
+
+        self._hits     = 0
+        self._misses   = 0
+        self._evicted  = 0
+
+    # --------------------------------------------------------------------------
+    #
+    def read(self, key, fname, decode):
+        '''
+        return the content of the given file as decoded by `decode(bytes)`
+        '''
+
+        st    = os.stat(fname)
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[2]
+            self._misses += 1
+
+        with open(fname, 'rb') as fin:
+            text = decode(fin.read())
+
+        if self._budget and st.st_size <= self._budget:
+            with self._lock:
+                self._drop(key)
+                self._entries[key] = (stamp, st.st_size, text)
+                self._size += st.st_size
+                while self._size > self._budget:
+                    self._drop(next(iter(self._entries)))
+                    self._evicted += 1
+
+        return text
+
+    # --------------------------------------------------------------------------
+    #
+    def _drop(self, key):
+
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._size -= entry[1]
+
+    # --------------------------------------------------------------------------
+    #
+    def invalidate(self, prefix):
+        '''
+        drop all entries whose keys start with the given tuple (e.g., all
+        outputs of a session on `(session,)`)
+        '''
+
+        with self._lock:
+            for key in [k for k in self._entries if k[:len(prefix)] == prefix]:
+                self._drop(key)
+
+    # --------------------------------------------------------------------------
+    #
+    def stats(self):
+
+        with self._lock:
+            total = self._hits + self._misses
+            return {'entries' : len(self._entries),
+                    'bytes'   : self._size,
+                    'budget'  : self._budget,
+                    'hits'    : self._hits,
+                    'misses'  : self._misses,
+                    'hit_rate': self._hits / total if total else None,
+                    'evicted' : self._evicted}
+
+
+_cache      = None
+_cache_lock = mt.Lock()
+
+
+def get_output_cache():
+    '''
+    return the output cache of this process, configured by the env variable
+    `RADICAL_PI_OUTPUT_CACHE` (budget in bytes, `0` disables caching)
+    '''
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = OutputCache(
+                budget=int(os.environ.get('RADICAL_PI_OUTPUT_CACHE',
+                                          64 * 2**20)))
+
+    return _cache
+
+
+# ------------------------------------------------------------------------------
+
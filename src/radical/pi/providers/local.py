@@ -0,0 +1,327 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import os
+import itertools
+
+import subprocess as sp
+
+from concurrent.futures import ThreadPoolExecutor
+
+import radical.utils as ru
+
+from .base import Entity, Provider
+
+
+# states used by the local provider (a subset of the `radical.pilot` states)
+NEW             = 'NEW'
+PMGR_ACTIVE     = 'PMGR_ACTIVE'
+TMGR_SCHEDULING = 'TMGR_SCHEDULING'
+AGENT_EXECUTING = 'AGENT_EXECUTING'
+DONE            = 'DONE'
+FAILED          = 'FAILED'
+CANCELED        = 'CANCELED'
+
+FINAL           = [DONE, FAILED, CANCELED]
+
+# the task dicts contain up to this many bytes of the tail of stdout / stderr
+OUTPUT_MAX      = 64 * 1024
+
+# max time to wait for terminated tasks to exit (seconds)
+CANCEL_TIMEOUT  = 10.0
+
+
+# ------------------------------------------------------------------------------
+#
+class LocalClient(Provider):
+    """Provider which runs tasks directly on the service host, without pilots.
+
+    Tasks are executed as subprocesses, at most `cores` of them concurrently
+    (default: env variable `RADICAL_PI_LOCAL_CORES`, or the number of CPUs),
+    each in its own sandbox `<sandbox>/<session uid>/<task uid>/` (default:
+    env variable `RADICAL_PI_LOCAL_SANDBOX`, or the working directory).  The
+    task description keys `executable`, `arguments`, `environment`, `stdout`
+    and `stderr` are supported - tasks don't wait for resources, so that small
+    interactive workloads complete with sub-second turnaround.
+
+    Pilots can be submitted for API compatibility: they represent the service
+    host and are active right away, tasks don't depend on them.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, log=None, prof=None, rep=None, cores=None,
+                       sandbox=None):
+
+        super().__init__(log=log, prof=prof, rep=rep)
+
+        if not cores:
+            cores = int(os.environ.get('RADICAL_PI_LOCAL_CORES', 0)) \
+                    or os.cpu_count() or 1
+
+        if not sandbox:
+            sandbox = os.environ.get('RADICAL_PI_LOCAL_SANDBOX') or os.getcwd()
+
+        self._uid      = ru.generate_id('local.%(item_counter)04d',
+                                        ru.ID_CUSTOM)
+        self._sandbox  = os.path.join(os.path.abspath(sandbox), self._uid)
+        self._cores    = cores
+        self._pids     = itertools.count()
+        self._tids     = itertools.count()
+
+        self._procs    = dict()    # tid: running subprocess
+        self._futures  = dict()    # tid: future of a queued or running task
+        self._canceled = set()     # tids of tasks to cancel
+        self._pool     = ThreadPoolExecutor(max_workers=cores,
+                                            thread_name_prefix='pi.local')
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def uid(self):
+
+        return self._uid
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        super().close()
+
+        with self._lock:
+            tids = list(self._futures)
+
+        if tids:
+            self._cancel('task', self._tasks, tids)
+
+        self._pool.shutdown(wait=False)
+
+    # --------------------------------------------------------------------------
+    #
+    def _advance(self, kind, entity, state):
+        '''
+        move a pilot or task to a new state, unless it is final already
+        '''
+
+        with self._lock:
+
+            if entity.state in FINAL:
+                return False
+
+            entity.state = state
+
+        self._tracker.advance(kind, entity.uid, state)
+        return True
+
+    # --------------------------------------------------------------------------
+    #
+    def submit(self, requests):
+
+        pilots = list()
+        with self._lock:
+            for request in requests:
+                uid   = self._next_uid('pilot.%04d', self._pids, self._pilots)
+                pilot = Entity(uid, dict(request))
+                self._pilots[pilot.uid] = pilot
+                pilots.append(pilot)
+                self._tracker.advance('pilot', pilot.uid, NEW)
+
+        for pilot in pilots:
+            self._advance('pilot', pilot, PMGR_ACTIVE)
+
+        return [pilot.uid for pilot in pilots]
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel(self, pids=None):
+
+        return self._cancel('pilot', self._pilots, pids)
+
+    # --------------------------------------------------------------------------
+    #
+    def _cancel(self, kind, entities, uids):
+
+        with self._lock:
+            uids = uids or list(entities)
+            for uid in uids:
+                if uid not in entities:
+                    raise ValueError('unknown %s ID %s' % (kind, uid))
+
+        terminated = list()
+        for uid in uids:
+
+            if kind == 'task':
+                with self._lock:
+                    self._canceled.add(uid)
+                    future = self._futures.get(uid)
+                    proc   = self._procs.get(uid)
+
+                # queued tasks are dropped, running tasks are terminated (and
+                # reach their final state when the process exits)
+                if future and future.cancel():
+                    with self._lock:
+                        self._futures.pop(uid, None)
+
+                elif proc:
+                    proc.terminate()
+                    terminated.append(uid)
+                    continue
+
+            self._advance(kind, entities[uid], CANCELED)
+
+        if terminated:
+            self._wait('task', terminated, None, CANCEL_TIMEOUT)
+
+        return [entities[uid].state for uid in uids]
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_tasks_iter(self, descriptions, batch_size=1024):
+        '''
+        submit task descriptions in batches, see `PilotClient`
+        '''
+
+        batch = list()
+        for descr in descriptions:
+            batch.append(descr)
+            if len(batch) >= batch_size:
+                yield self._submit_batch(batch)
+                batch = list()
+
+        if batch:
+            yield self._submit_batch(batch)
+
+    # --------------------------------------------------------------------------
+    #
+    def _submit_batch(self, descriptions):
+
+        for descr in descriptions:
+            if not descr.get('executable'):
+                raise ValueError('task description without executable')
+
+        tasks = list()
+        with self._lock:
+            for descr in descriptions:
+
+                uid = descr.get('uid') or \
+                      self._next_uid('task.%06d', self._tids, self._tasks)
+                if uid in self._tasks:
+                    raise ValueError('task %s exists' % uid)
+
+                task = Entity(uid, descr)
+                self._tasks[uid] = task
+                tasks.append(task)
+                self._tracker.advance('task', uid, NEW)
+
+        for task in tasks:
+            self._advance('task', task, TMGR_SCHEDULING)
+            with self._lock:
+                self._futures[task.uid] = self._pool.submit(self._run, task)
+
+        return [task.uid for task in tasks]
+
+    # --------------------------------------------------------------------------
+    #
+    def _run(self, task):
+
+        if not self._advance('task', task, AGENT_EXECUTING):
+            return
+
+        descr   = task.description
+        sandbox = os.path.join(self._sandbox, task.uid)
+        out     = None
+        err     = None
+        ret     = None
+        error   = None
+
+        # any error below fails the task, it must not end up stuck in
+        # `AGENT_EXECUTING`
+        try:
+            out = self._output_path(task.uid, 'out')
+            err = self._output_path(task.uid, 'err')
+
+            os.makedirs(sandbox, exist_ok=True)
+
+            env = dict(os.environ)
+            env.update(descr.get('environment') or {})
+            env['RP_TASK_ID']      = task.uid
+            env['RP_TASK_SANDBOX'] = sandbox
+
+            cmd = [descr['executable']] + \
+                  [str(arg) for arg in descr.get('arguments') or []]
+
+            with open(out, 'wb') as fout, open(err, 'wb') as ferr:
+
+                proc = sp.Popen(cmd, cwd=sandbox, env=env, stdin=sp.DEVNULL,
+                                stdout=fout, stderr=ferr)
+
+                with self._lock:
+                    self._procs[task.uid] = proc
+                    if task.uid in self._canceled:
+                        proc.terminate()
+
+                ret = proc.wait()
+
+        except Exception as e:
+            self._log.exception('task %s failed to run', task.uid)
+            error = repr(e)
+
+            # the sandbox may not be writable - the error is then only
+            # reported as the task's `stderr`
+            try:
+                with open(err, 'a') as ferr:
+                    ferr.write('%s\n' % error)
+            except (OSError, TypeError):
+                pass
+
+        finally:
+            with self._lock:
+                self._procs.pop(task.uid, None)
+                self._futures.pop(task.uid, None)
+                canceled = task.uid in self._canceled
+
+        task.exit_code = ret
+        task.stdout    = self._tail(out)
+        task.stderr    = self._tail(err) or error
+
+        if   canceled: state = CANCELED
+        elif ret == 0: state = DONE
+        else         : state = FAILED
+
+        self._advance('task', task, state)
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _tail(fname):
+
+        if not fname:
+            return None
+
+        try:
+            with open(fname, 'rb') as fin:
+                fin.seek(0, os.SEEK_END)
+                fin.seek(max(0, fin.tell() - OUTPUT_MAX))
+                return fin.read().decode('utf-8', errors='replace')
+
+        except OSError:
+            return None
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_tasks(self, tids=None):
+
+        return self._cancel('task', self._tasks, tids)
+
+    # --------------------------------------------------------------------------
+    #
+    def _output_path(self, tid, ftype):
+
+        descr = self._tasks[tid].description
+        if ftype == 'out': fname = descr.get('stdout') or 'STDOUT'
+        else             : fname = descr.get('stderr') or 'STDERR'
+
+        return os.path.join(self._sandbox, tid, fname)
+
+
+# ------------------------------------------------------------------------------
@@ -10,27 +10,27 @@ warnings.filterwarnings('ignore', category=DeprecationWarning)
 import radical.pilot as rp
 import radical.utils as ru
 
+from .base import Provider
+
+
+# max time to wait for canceled tasks when closing the task manager (seconds)
+CANCEL_TIMEOUT = 60.0
+
 
 # ------------------------------------------------------------------------------
 #
-class PilotClient:
+class PilotClient(Provider):
     """Interface class from `Service` like API to `radical.pilot`.
     """
 
+    FINAL    = rp.FINAL
+    CANCELED = rp.CANCELED
+
     # --------------------------------------------------------------------------
     #
     def __init__(self, log=None, prof=None, rep=None):
 
-        ns = self.__class__.__name__.lower()
-
-        if log : self._log  = log
-        else   : self._log  = ru.Logger(ns)
-
-        if prof: self._prof = prof
-        else   : self._prof = ru.Profiler(ns)
-
-        if rep : self._rep  = log
-        else   : self._rep  = ru.Reporter(ns)
+        super().__init__(log=log, prof=prof, rep=rep)
 
         self._pmgr = None
         self._tmgr = None
@@ -42,24 +42,23 @@ class PilotClient:
         self._work_dir = os.getcwd()
         self._data_dir = 'data.%s' % self._session.uid
 
-        # track submitted tasks
-        self._tasks      = {}
-
     # --------------------------------------------------------------------------
     #
     def _init_pilot_manager(self):
 
-        if self._pmgr is None:
-            self._pmgr = rp.PilotManager(self._session)
-            self._pmgr.register_callback(self._pilot_state_cb)
+        with self._lock:
+            if self._pmgr is None:
+                self._pmgr = rp.PilotManager(self._session)
+                self._pmgr.register_callback(self._pilot_state_cb)
 
     # --------------------------------------------------------------------------
     #
     def _init_task_manager(self):
 
-        if self._tmgr is None:
-            self._tmgr = rp.TaskManager(self._session)
-            self._tmgr.register_callback(self._task_state_cb)
+        with self._lock:
+            if self._tmgr is None:
+                self._tmgr = rp.TaskManager(self._session)
+                self._tmgr.register_callback(self._task_state_cb)
 
     # --------------------------------------------------------------------------
     #
@@ -72,8 +71,36 @@ class PilotClient:
     #
     def close(self):
 
+        super().close()
         self._session.close(download=True)
 
+    # --------------------------------------------------------------------------
+    #
+    def _new_uid(self, fmt, entities):
+        '''
+        generate a UID in the session namespace which is not in use (e.g., by
+        restored pilots or tasks)
+        '''
+
+        while True:
+            uid = ru.generate_id(fmt, ru.ID_CUSTOM, ns=self._session.uid)
+            if uid not in entities:
+                return uid
+
+    # --------------------------------------------------------------------------
+    #
+    def restore(self, pilots, tasks):
+        '''
+        `radical.pilot` sessions can't be reconnected: the pilots of the
+        previous session ended with it, and only their (and their tasks')
+        last states are restored (see `Provider.restore`).
+        '''
+
+        self._rep.info('\nrestore %d pilots, %d tasks\n'
+                       % (len(pilots), len(tasks)))
+
+        super().restore(pilots, tasks)
+
     # --------------------------------------------------------------------------
     #
     def submit(self, requests):
@@ -82,25 +109,35 @@ class PilotClient:
 
         pilot_descr = []
         for request in requests:
-            pilot_descr.append(rp.PilotDescription(dict(request)))
+            descr = dict(request)
+            descr.setdefault('uid', self._new_uid('pilot.%(item_counter)04d',
+                                                  self._pilots))
+            pilot_descr.append(rp.PilotDescription(descr))
 
         pilots = self._pmgr.submit_pilots(pilot_descr)
+        with self._lock:
+            for p in pilots:
+                self._pilots[p.uid] = p
+                self._tracker.advance('pilot', p.uid, p.state)
+
+            # an open task manager also schedules tasks to the new pilots
+            if self._tmgr:
+                self._tmgr.add_pilots(pilots)
+
         return [p.uid for p in pilots]
 
     # --------------------------------------------------------------------------
     #
-    def inspect(self, pids=None):
-
-        self._rep.info('\nget pilot info: %s\n' % pids or 'ALL')
-
-        output = []
-        pilots = ru.as_list(self._pmgr.get_pilots(uids=pids))
+    def inspect(self, pids=None, states=None, prefix=None, fields=None,
+                      limit=None, cursor=None, since=None):
+        '''
+        return pilot dicts (see `_inspect`)
+        '''
 
-        for pilot in pilots:
-            self._rep.ok('    %s\n' % pilot.uid)
-            output.append(pilot.as_dict())
+        self._rep.info('\nget pilot info: %s\n' % (pids or 'ALL'))
 
-        return output
+        return super().inspect(pids, states, prefix, fields, limit, cursor,
+                               since)
 
     # --------------------------------------------------------------------------
     #
@@ -111,11 +148,24 @@ class PilotClient:
 
         return self._pmgr.wait_pilots(uids=pids, state=states, timeout=timeout)
 
+    # --------------------------------------------------------------------------
+    #
+    def wait_ticket(self, pids=None, states=None):
+        '''
+        non-blocking version of `wait()`: return the ID of a wait ticket which
+        resolves once the pilots reached the given states (see `check_tickets`)
+        '''
+
+        self._rep.info('\nwait ticket for pilots: %s (%s)\n' %
+                       (pids or 'ALL', states))
+
+        return super().wait_ticket(pids, states)
+
     # --------------------------------------------------------------------------
     #
     def cancel(self, pids=None):
 
-        self._rep.info('\ncancel pilots: %s\n' % pids or 'ALL')
+        self._rep.info('\ncancel pilots: %s\n' % (pids or 'ALL'))
 
         self._pmgr.cancel_pilots(pids)
         self._pmgr.wait_pilots(pids, rp.FINAL)
@@ -129,37 +179,104 @@ class PilotClient:
 
     # --------------------------------------------------------------------------
     #
-    def submit_tasks(self, descriptions):
-
-        if self._tmgr is None:
-            self._init_task_manager()
-            if self._pmgr:
-                self._tmgr.add_pilots(self._pmgr.get_pilots())
+    def submit_tasks_iter(self, descriptions, batch_size=1024):
+        '''
+        submit task descriptions (any iterable) to the task manager in batches
+        of up to `batch_size`, and yield the list of task UIDs for each batch
+        as soon as it is submitted.
+        '''
 
-            ru.rec_makedir(os.path.join(self._work_dir, self._data_dir))
+        self.open_task_manager()
 
         self._rep.header('submit tasks\n')
 
         tds = []
         for descr in descriptions:
-            tid = descr.setdefault('uid',
-                                   ru.generate_id('task.%(item_counter)06d',
-                                                  ru.ID_CUSTOM,
-                                                  ns=self._tmgr.session.uid))
+            policy = self._stage_policy(descr)
+            tid    = descr.setdefault('uid',
+                                      self._new_uid('task.%(item_counter)06d',
+                                                    self._tasks))
             stdout = descr.setdefault('stdout', 'STDOUT')
             stderr = descr.setdefault('stderr', 'STDERR')
-            descr.setdefault('output_staging', []).extend(
-                [{'source': 'task:///%s' % stdout,
-                  'target': 'client:///%s/%s.out' % (self._data_dir, tid),
-                  'action': rp.TRANSFER},
-                 {'source': 'task:///%s' % stderr,
-                  'target': 'client:///%s/%s.err' % (self._data_dir, tid),
-                  'action': rp.TRANSFER}])
+
+            # all other policies stage output from the task sandbox (or from
+            # the output reported with the task) when needed
+            if policy == 'always':
+                descr.setdefault('output_staging', []).extend(
+                    [{'source': 'task:///%s' % stdout,
+                      'target': 'client:///%s/%s.out' % (self._data_dir, tid),
+                      'action': rp.TRANSFER},
+                     {'source': 'task:///%s' % stderr,
+                      'target': 'client:///%s/%s.err' % (self._data_dir, tid),
+                      'action': rp.TRANSFER}])
+
+            self._stage[tid] = policy
             tds.append(rp.TaskDescription(descr))
 
-        tasks = self._tmgr.submit_tasks(tds)
-        for t in tasks:
-            self._tasks[t.uid] = t
+            if len(tds) >= batch_size:
+                yield self._submit_batch(tds)
+                tds = []
+
+        if tds:
+            yield self._submit_batch(tds)
+
+    # --------------------------------------------------------------------------
+    #
+    def open_task_manager(self):
+        '''
+        create the task manager (if needed), which then stays open across
+        submissions and waits until `close_task_manager()` is called or the
+        session is closed
+        '''
+
+        with self._lock:
+            if self._tmgr is None:
+                self._init_task_manager()
+                if self._pmgr:
+                    self._tmgr.add_pilots(self._pmgr.get_pilots())
+
+                ru.rec_makedir(os.path.join(self._work_dir, self._data_dir))
+
+    # --------------------------------------------------------------------------
+    #
+    def close_task_manager(self):
+        '''
+        close the task manager.  Tasks which are not final yet are canceled,
+        and are reported as `CANCELED` once the task manager is closed.  The
+        next submission opens a new task manager.
+        '''
+
+        with self._lock:
+            tmgr, self._tmgr = self._tmgr, None
+
+        if not tmgr:
+            return
+
+        self._rep.info('\nclose task manager\n')
+
+        states = self._tracker.get_states('task')
+        tids   = [tid for tid, state in states.items()
+                      if  state not in rp.FINAL]
+        if tids:
+            tmgr.cancel_tasks(tids)
+            tmgr.wait_tasks(tids, rp.FINAL, timeout=CANCEL_TIMEOUT)
+
+        tmgr.close()
+
+        # no state updates are delivered after closing the task manager
+        for tid in tids:
+            if not self._tracker.is_final('task', tid):
+                self._tracker.advance('task', tid, rp.CANCELED)
+
+    # --------------------------------------------------------------------------
+    #
+    def _submit_batch(self, tds):
+
+        tasks = ru.as_list(self._tmgr.submit_tasks(tds))
+        with self._lock:
+            for t in tasks:
+                self._tasks[t.uid] = t
+                self._tracker.advance('task', t.uid, t.state)
 
         return [t.uid for t in tasks]
 
@@ -167,6 +284,10 @@ class PilotClient:
     #
     def _pilot_state_cb(self, pilot, state):
 
+        # callbacks may fire before `submit` registered the pilot
+        self._pilots.setdefault(pilot.uid, pilot)
+        self._tracker.advance('pilot', pilot.uid, state)
+
         if state in rp.FINAL:
             self._rep.ok('pilot completed %s: %s\n' % (pilot.uid, pilot.state))
             if self._tmgr:
@@ -178,72 +299,119 @@ class PilotClient:
     #
     def _task_state_cb(self, task, state):
 
+        # callbacks may fire before `submit_tasks` registered the task
+        self._tasks.setdefault(task.uid, task)
+        self._tracker.advance('task', task.uid, state, pilot=task.pilot)
+
         if state == rp.DONE:
             self._rep.ok('task completed %s\n' % task.uid)
         elif state == rp.FAILED:
+            # with the `failed` policy, output is staged when first requested
+            # (see `_fetch_output`) - not here, to not delay state updates
             self._rep.error('task failed    %s\n' % task.uid)
 
         return True
 
     # --------------------------------------------------------------------------
     #
-    def inspect_tasks(self, tids=None):
-
-        self._rep.info('\nget task info: %s\n' % tids or 'ALL')
+    def inspect_tasks(self, tids=None, states=None, prefix=None, fields=None,
+                            limit=None, cursor=None, since=None):
+        '''
+        return task dicts (see `_inspect`)
+        '''
 
-        output = []
-        tasks = ru.as_list(self._tmgr.get_tasks(uids=tids))
+        self._rep.info('\nget task info: %s\n' % (tids or 'ALL'))
 
-        for task in tasks:
-            self._rep.ok('    %s\n' % task.uid)
-            output.append(task.as_dict())
-
-        return output
+        return super().inspect_tasks(tids, states, prefix, fields, limit,
+                                     cursor, since)
 
     # --------------------------------------------------------------------------
     #
-    def _get_task_output(self, tid, ftype):
+    def cancel_tasks(self, tids=None):
 
-        if ftype not in ['out', 'err']:
-            raise RuntimeError('task output format incorrect: %s' % ftype)
+        self._rep.info('\ncancel tasks: %s\n' % (tids or 'ALL'))
 
-        self._rep.info('\nget task std%s: %s\n' % (ftype, tid))
+        if self._tmgr is None:
+            # all tasks of a closed task manager are final
+            if tids:
+                raise ValueError('no task manager open, cannot cancel %s'
+                                 % tids)
+            return []
 
-        if tid not in self._tasks:
-            raise ValueError('task ID is unknown')
+        tids = tids or list(self._tasks)
+        self._tmgr.cancel_tasks(tids)
+        self._tmgr.wait_tasks(tids, rp.FINAL)
 
-        std_fname = os.path.join(self._work_dir,
-                                 self._data_dir,
-                                 '%s.%s' % (tid, ftype))
+        return [task.state for task in self._tmgr.get_tasks(tids)]
 
-        if not os.path.isfile(std_fname):
-            raise RuntimeError('std%s for %s is not available' % (ftype, tid))
+    # --------------------------------------------------------------------------
+    #
+    def _output_path(self, tid, ftype):
+        '''
+        staged stdout and stderr files are collected in the session's data dir
+        '''
 
-        with open(std_fname, 'r') as fd:
-            output = fd.read()
-        return output
+        return os.path.join(self._work_dir, self._data_dir,
+                            '%s.%s' % (tid, ftype))
 
     # --------------------------------------------------------------------------
     #
-    def tasks_stdout(self, tid):
-        return self._get_task_output(tid=tid, ftype='out')
+    def _copy_output(self, tid, ftype, fname):
+        '''
+        copy unstaged output from the task sandbox if that is accessible from
+        the service host, and fall back to the (possibly truncated) output
+        reported with the task otherwise
+        '''
+
+        task    = self._tasks[tid]
+        sandbox = getattr(task, 'sandbox', None)
+
+        if sandbox:
+            descr = task.description
+            src   = os.path.join(ru.Url(sandbox).path,
+                                 descr.get('std%s' % ftype) or
+                                 'STD%s' % ftype.upper())
+            if os.path.isfile(src):
+                self._rep.info('\nstage std%s: %s\n' % (ftype, tid))
+                with open(src, 'rb') as fin:
+                    self._write_output(fname, fin)
+                return True
+
+        return super()._copy_output(tid, ftype, fname)
 
     # --------------------------------------------------------------------------
     #
-    def tasks_stderr(self, tid):
-        return self._get_task_output(tid=tid, ftype='err')
+    def _get_task_output(self, tid, ftype):
+
+        self._rep.info('\nget task std%s: %s\n' % (ftype, tid))
+
+        return super()._get_task_output(tid, ftype)
 
     # --------------------------------------------------------------------------
     #
-    def wait_tasks(self, tids=None, states=None, timeout=None):
+    def wait_tasks(self, tids=None, states=None, timeout=None, count=None):
+        '''
+        wait for tasks via the state callbacks (see `Provider.wait_tasks`):
+        the task manager stays open for subsequent submissions
+        '''
 
         self._rep.info('\nwait for tasks: %s (%s)\n' % (tids or 'ALL', states))
-        task_states = self._tmgr.wait_tasks(uids=tids,
-                                            state=states,
-                                            timeout=timeout)
 
-        self._tmgr.close()
-        return task_states
+        return super().wait_tasks(tids, states, timeout, count)
 
-# ------------------------------------------------------------------------------
+    # --------------------------------------------------------------------------
+    #
+    def wait_tasks_ticket(self, tids=None, states=None, count=None):
+        '''
+        non-blocking version of `wait_tasks()`: return the ID of a wait ticket
+        which resolves once the tasks (or `count` of them) reached the given
+        states (see `check_tickets`)
+        '''
 
+        self._rep.info('\nwait ticket for tasks: %s (%s)\n' %
+                       (tids or 'ALL', states))
+
+        return super().wait_tasks_ticket(tids, states, count)
+
+
+# ------------------------------------------------------------------------------
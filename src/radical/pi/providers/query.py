@@ -0,0 +1,135 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+
+# ------------------------------------------------------------------------------
+#
+class QueryError(ValueError):
+    '''
+    invalid inspect query (unknown fields, invalid page size or cursor) - the
+    service reports it as `400 Bad Request`
+    '''
+    pass
+
+
+# ------------------------------------------------------------------------------
+#
+class Index(dict):
+    '''
+    `{uid: obj}` dict of pilots or tasks which also keeps the uids in insertion
+    order, so that a page can start at a cursor position without walking (or
+    copying) the objects before it.  Objects never get removed.
+    '''
+
+    def __init__(self):
+
+        super().__init__()
+        self._order = list()
+
+    def __setitem__(self, uid, obj):
+
+        if uid not in self:
+            self._order.append(uid)
+        super().__setitem__(uid, obj)
+
+    def setdefault(self, uid, obj=None):
+
+        if uid not in self:
+            self[uid] = obj
+        return self[uid]
+
+    def uids_from(self, start):
+        '''
+        iterate over the uids from position `start` on, including uids which
+        are added meanwhile
+        '''
+
+        order = self._order
+        pos   = start
+        while pos < len(order):
+            yield order[pos]
+            pos += 1
+
+
+# ------------------------------------------------------------------------------
+#
+def project(obj, fields=None):
+    '''
+    Serialize a pilot or task object.  If `fields` are given, only those keys
+    of its `as_dict()` representation are returned - other fields are
+    rejected.
+    '''
+
+    data = obj.as_dict()
+
+    if not fields:
+        return data
+
+    unknown = [field for field in fields if field not in data]
+    if unknown:
+        raise QueryError('unknown fields: %s' % unknown)
+
+    return {field: data[field] for field in fields}
+
+
+# ------------------------------------------------------------------------------
+#
+def select(objs, uids=None, states=None, prefix=None, fields=None,
+           limit=None, cursor=None):
+    '''
+    Filter, page and project pilot or task objects.
+
+    `objs` is an `Index` of objects, so that a position in it is a stable
+    cursor.  If `uids` are given, only those are considered (in that order).
+    Objects are filtered by `states` and uid `prefix` *before* serialization,
+    and up to `limit` objects are returned, starting at the position `cursor`.
+
+    Returns a tuple `(items, cursor)`, where `cursor` is the position to
+    continue from for the next page, or `None` if there are no further objects.
+    '''
+
+    if limit is not None and limit < 1:
+        raise QueryError('invalid limit %s' % limit)
+
+    try:
+        start = int(cursor or 0)
+    except ValueError:
+        start = -1
+    if start < 0:
+        raise QueryError('invalid cursor %s' % cursor)
+
+    if uids:
+        unknown = [uid for uid in uids if uid not in objs]
+        if unknown:
+            raise ValueError('unknown IDs: %s' % unknown)
+        candidates = iter(uids[start:])
+    else:
+        candidates = objs.uids_from(start)
+
+    items = list()
+    pos   = start
+
+    if states:
+        states = set(states)
+
+    for uid in candidates:
+
+        if limit is not None and len(items) >= limit:
+            return items, pos
+
+        pos += 1
+        obj  = objs[uid]
+
+        if prefix and not obj.uid.startswith(prefix):
+            continue
+
+        if states and obj.state not in states:
+            continue
+
+        items.append(project(obj, fields))
+
+    return items, None
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,364 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import os
+import time
+import heapq
+import random
+import shutil
+import tempfile
+import itertools
+
+import threading as mt
+
+import radical.utils as ru
+
+from .base import Entity, Provider
+
+
+# states used by the simulation (a subset of the `radical.pilot` states)
+NEW             = 'NEW'
+PMGR_LAUNCHING  = 'PMGR_LAUNCHING'
+PMGR_ACTIVE     = 'PMGR_ACTIVE'
+TMGR_SCHEDULING = 'TMGR_SCHEDULING'
+AGENT_EXECUTING = 'AGENT_EXECUTING'
+DONE            = 'DONE'
+FAILED          = 'FAILED'
+CANCELED        = 'CANCELED'
+
+FINAL           = [DONE, FAILED, CANCELED]
+
+
+# ------------------------------------------------------------------------------
+#
+class SimClient(Provider):
+    """In-memory simulation of `PilotClient`, for tests and benchmarks.
+
+    Pilots and tasks progress through their states on a timer, without any
+    `radical.pilot` session or resources:
+
+      - pilots become active after `startup` seconds;
+      - tasks start executing after `queue` seconds and complete after another
+        `runtime` seconds (both +/- `jitter`); a fraction `fail` of them fails.
+
+    Every API call is delayed by `latency` seconds, to mimic the overhead of
+    the `radical.pilot` managers.  Tasks execute independently of pilots.
+    Unless given explicitly, the parameters are read from the environment
+    (`RADICAL_PI_SIM_<PARAMETER>`, e.g. `RADICAL_PI_SIM_RUNTIME=10`).
+    """
+
+    # default simulation parameters
+    DEFAULTS = {'latency': 0.0,
+                'startup': 1.0,
+                'queue'  : 0.1,
+                'runtime': 1.0,
+                'jitter' : 0.1,
+                'fail'   : 0.0}
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, log=None, prof=None, rep=None, **params):
+
+        super().__init__(log=log, prof=prof, rep=rep)
+
+        for key, default in self.DEFAULTS.items():
+            value = params.get(key)
+            if value is None:
+                value = os.environ.get('RADICAL_PI_SIM_%s' % key.upper(),
+                                       default)
+            setattr(self, '_%s' % key, float(value))
+
+        self._uid      = ru.generate_id('sim.%(item_counter)04d',
+                                        ru.ID_CUSTOM)
+        self._random   = random.Random()
+        self._pids     = itertools.count()
+        self._tids     = itertools.count()
+
+        # scheduled state transitions: [(time, order, kind, uid, state), ...]
+        self._timeline = list()
+        self._order    = itertools.count()
+        self._cond     = mt.Condition()
+        self._thread   = mt.Thread(target=self._work, name='pi.sim')
+        self._thread.daemon = True
+        self._thread.start()
+
+        # staged task output
+        self._data_dir = tempfile.mkdtemp(prefix='%s.' % self._uid)
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def uid(self):
+
+        return self._uid
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        super().close()
+
+        with self._cond:
+            self._timeline = list()
+            self._cond.notify_all()
+
+        self._thread.join()
+        shutil.rmtree(self._data_dir, ignore_errors=True)
+
+    # --------------------------------------------------------------------------
+    #
+    def _delay(self):
+
+        if self._latency:
+            time.sleep(self._latency)
+
+    def _vary(self, duration):
+
+        if self._jitter:
+            duration *= 1 + self._random.uniform(-self._jitter, self._jitter)
+
+        return max(0.0, duration)
+
+    # --------------------------------------------------------------------------
+    #
+    def _schedule(self, transitions):
+        '''
+        schedule state transitions `[(delay, kind, uid, state), ...]`
+        '''
+
+        now = time.time()
+        with self._cond:
+            for delay, kind, uid, state in transitions:
+                heapq.heappush(self._timeline, (now + delay,
+                                                next(self._order),
+                                                kind, uid, state))
+            self._cond.notify_all()
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self):
+
+        while not self._tracker.closed:
+
+            with self._cond:
+
+                if not self._timeline:
+                    self._cond.wait(timeout=1.0)
+                    continue
+
+                due = self._timeline[0][0] - time.time()
+                if due > 0:
+                    self._cond.wait(timeout=due)
+                    continue
+
+                _, _, kind, uid, state = heapq.heappop(self._timeline)
+
+            self._advance(kind, uid, state)
+
+    # --------------------------------------------------------------------------
+    #
+    def _advance(self, kind, uid, state):
+
+        with self._lock:
+
+            if kind == 'pilot': entity = self._pilots[uid]
+            else              : entity = self._tasks[uid]
+
+            # canceled entities don't progress any further
+            if entity.state in FINAL:
+                return
+
+            entity.state = state
+
+            if kind == 'task' and state in FINAL:
+                self._stage_output(entity)
+
+        self._tracker.advance(kind, uid, state)
+
+    # --------------------------------------------------------------------------
+    #
+    def _stage_output(self, task):
+
+        if task.state == DONE:
+            task.exit_code = 0
+            task.stdout    = '%s\n' % task.uid
+            task.stderr    = ''
+        else:
+            task.exit_code = 1
+            task.stdout    = ''
+            task.stderr    = '%s %s\n' % (task.uid, task.state.lower())
+
+        # the output is kept with the task, files are written according to
+        # the staging policy (or on demand, see `Provider._fetch_output`)
+        policy = self._stage.get(task.uid)
+        if policy == 'always' or (policy == 'failed' and task.state == FAILED):
+            for ftype, data in [('out', task.stdout), ('err', task.stderr)]:
+                fname = os.path.join(self._data_dir,
+                                     '%s.%s' % (task.uid, ftype))
+                with open(fname, 'w') as fout:
+                    fout.write(data)
+
+    # --------------------------------------------------------------------------
+    #
+    def submit(self, requests):
+
+        self._delay()
+
+        pilots = list()
+        with self._lock:
+            for request in requests:
+                uid = self._next_uid('pilot.%04d', self._pids, self._pilots)
+                self._pilots[uid] = Entity(uid, dict(request))
+                pilots.append(uid)
+                self._tracker.advance('pilot', uid, NEW)
+
+        self._schedule([(0.0, 'pilot', uid, PMGR_LAUNCHING) for uid in pilots] +
+                       [(self._vary(self._startup), 'pilot', uid,
+                         PMGR_ACTIVE) for uid in pilots])
+
+        return pilots
+
+    # --------------------------------------------------------------------------
+    #
+    def inspect(self, pids=None, states=None, prefix=None, fields=None,
+                      limit=None, cursor=None, since=None):
+        '''
+        return pilot dicts (see `PilotClient.inspect`)
+        '''
+
+        self._delay()
+
+        return super().inspect(pids, states, prefix, fields, limit, cursor,
+                               since)
+
+    # --------------------------------------------------------------------------
+    #
+    def wait(self, pids=None, states=None, timeout=None):
+
+        self._delay()
+
+        return super().wait(pids, states, timeout)
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel(self, pids=None):
+
+        return self._cancel('pilot', self._pilots, pids)
+
+    # --------------------------------------------------------------------------
+    #
+    def _cancel(self, kind, entities, uids):
+
+        self._delay()
+
+        with self._lock:
+            uids = uids or list(entities)
+            for uid in uids:
+                if uid not in entities:
+                    raise ValueError('unknown %s ID %s' % (kind, uid))
+
+        for uid in uids:
+            self._advance(kind, uid, CANCELED)
+
+        return [entities[uid].state for uid in uids]
+
+    # --------------------------------------------------------------------------
+    #
+    def submit_tasks_iter(self, descriptions, batch_size=1024):
+        '''
+        submit task descriptions in batches, see `PilotClient`
+        '''
+
+        batch = list()
+        for descr in descriptions:
+            batch.append(descr)
+            if len(batch) >= batch_size:
+                yield self._submit_batch(batch)
+                batch = list()
+
+        if batch:
+            yield self._submit_batch(batch)
+
+    # --------------------------------------------------------------------------
+    #
+    def _submit_batch(self, descriptions):
+
+        self._delay()
+
+        uids        = list()
+        transitions = list()
+        with self._lock:
+            for descr in descriptions:
+
+                policy = self._stage_policy(descr)
+                uid    = descr.get('uid') or \
+                         self._next_uid('task.%06d', self._tids, self._tasks)
+                if uid in self._tasks:
+                    raise ValueError('task %s exists' % uid)
+
+                self._tasks[uid] = Entity(uid, descr)
+                self._stage[uid] = policy
+                uids.append(uid)
+                self._tracker.advance('task', uid, NEW)
+
+                queue   = self._vary(self._queue)
+                runtime = self._vary(self._runtime)
+
+                if self._fail and self._random.random() < self._fail:
+                    final = FAILED
+                else:
+                    final = DONE
+
+                transitions.append((0.0,             'task', uid,
+                                    TMGR_SCHEDULING))
+                transitions.append((queue,           'task', uid,
+                                    AGENT_EXECUTING))
+                transitions.append((queue + runtime, 'task', uid, final))
+
+        self._schedule(transitions)
+
+        return uids
+
+    # --------------------------------------------------------------------------
+    #
+    def cancel_tasks(self, tids=None):
+
+        return self._cancel('task', self._tasks, tids)
+
+    # --------------------------------------------------------------------------
+    #
+    def inspect_tasks(self, tids=None, states=None, prefix=None, fields=None,
+                            limit=None, cursor=None, since=None):
+        '''
+        return task dicts (see `PilotClient.inspect_tasks`)
+        '''
+
+        self._delay()
+
+        return super().inspect_tasks(tids, states, prefix, fields, limit,
+                                     cursor, since)
+
+    # --------------------------------------------------------------------------
+    #
+    def _output_path(self, tid, ftype):
+
+        return os.path.join(self._data_dir, '%s.%s' % (tid, ftype))
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_task_output(self, tid, ftype):
+
+        self._delay()
+
+        return super()._get_task_output(tid, ftype)
+
+    # --------------------------------------------------------------------------
+    #
+    def wait_tasks(self, tids=None, states=None, timeout=None, count=None):
+
+        self._delay()
+
+        return super().wait_tasks(tids, states, timeout, count)
+
+
+# ------------------------------------------------------------------------------
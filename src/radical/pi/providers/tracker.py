@@ -0,0 +1,537 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import time
+import itertools
+
+import threading as mt
+
+from collections import deque
+
+import radical.utils as ru
+
+
+# ------------------------------------------------------------------------------
+#
+class _Ticket:
+    '''
+    A wait ticket represents a pending wait for a set of pilots or tasks to
+    reach any of the given states.  It is resolved by the state callbacks, not
+    by a blocked request.
+    '''
+
+    def __init__(self, wid, kind, uids, states, count=None):
+
+        self.wid      = wid
+        self.kind     = kind
+        self.uids     = uids
+        self.states   = states
+        self.pending  = set(uids)
+        self.resolved = None       # time of resolution
+
+        # resolve once this many pilots or tasks reached the states
+        self.count    = len(uids) if count is None else min(count, len(uids))
+
+
+    @property
+    def done(self):
+        return self.resolved is not None
+
+
+    def as_dict(self, current):
+
+        result = None
+        if self.done:
+            result = [current.get(uid) for uid in self.uids]
+
+        return {'wid'   : self.wid,
+                'done'  : self.done,
+                'result': result}
+
+
+# ------------------------------------------------------------------------------
+#
+class _Rate:
+    '''
+    Count events in one second buckets over the last `horizon` seconds, to
+    report event rates over sliding windows of up to that length.
+    '''
+
+    def __init__(self, horizon):
+
+        self._horizon = horizon
+        self._buckets = deque()    # [second, n]
+
+
+    def add(self, now):
+
+        sec = int(now)
+        if self._buckets and self._buckets[-1][0] == sec:
+            self._buckets[-1][1] += 1
+        else:
+            self._buckets.append([sec, 1])
+
+        while self._buckets[0][0] <= sec - self._horizon:
+            self._buckets.popleft()
+
+
+    def count(self, now, window):
+
+        start = int(now) - window
+        n     = 0
+        for sec, cnt in reversed(self._buckets):
+            if sec <= start:
+                break
+            n += cnt
+
+        return n
+
+
+# ------------------------------------------------------------------------------
+#
+class StateTracker:
+    '''
+    Track the states of the pilots and tasks of a session as reported by the
+    state callbacks, and resolve wait tickets once the requested states are
+    reached.  All state transitions are stamped with a monotonically increasing
+    sequence number and kept in a bounded event log.  All methods are thread
+    safe.
+    '''
+
+    KINDS = ['pilot', 'task']
+
+    # sliding windows of the task throughput rates (seconds)
+    WINDOWS = [10, 60, 300]
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, final, ttl=600, backlog=100000):
+        '''
+        `final` is the list of final states (which also terminate any wait),
+        resolved tickets are garbage collected after `ttl` seconds.  The event
+        log keeps the last `backlog` state transitions.
+        '''
+
+        self._final   = final
+        self._ttl     = ttl
+        self._cond    = mt.Condition(mt.RLock())
+        self._states  = {kind: dict() for kind in self.KINDS}
+        self._watch   = {kind: dict() for kind in self.KINDS}
+        self._tickets = dict()
+        self._gc_last = time.time()
+        self._seq     = 0
+        self._events  = deque(maxlen=backlog)
+        self._changed = {kind: dict() for kind in self.KINDS}  # uid: seq
+        self._counts  = {kind: dict() for kind in self.KINDS}  # state: n
+        self._closed  = False
+        self._listen  = None
+
+        # task counts per pilot and state, and task throughput
+        self._placed  = dict()                                 # tid: pid
+        self._per_pid = dict()                                 # pid: {state: n}
+        self._started = time.time()
+        self._rates   = {'submitted': _Rate(max(self.WINDOWS)),
+                         'completed': _Rate(max(self.WINDOWS))}
+
+    # --------------------------------------------------------------------------
+    #
+    def advance(self, kind, uid, state, pilot=None):
+        '''
+        record a state transition and resolve all tickets which wait for it.
+        For tasks, `pilot` is the UID of the pilot the task is assigned to
+        (if known).
+        '''
+
+        with self._cond:
+
+            old = self._states[kind].get(uid)
+
+            if pilot and kind == 'task':
+                self._place(uid, pilot, old)
+
+            if old == state:
+                return
+
+            self._states[kind][uid] = state
+
+            # number of entities per state, and of tasks per pilot and state
+            self._count(self._counts[kind], old, state)
+
+            if kind == 'task':
+                pid = self._placed.get(uid)
+                if pid:
+                    self._count(self._per_pid[pid], old, state)
+
+                now = time.time()
+                if old is None:
+                    self._rates['submitted'].add(now)
+                if state in self._final and old not in self._final:
+                    self._rates['completed'].add(now)
+
+            self._seq += 1
+
+            # keep `_changed` ordered by sequence number
+            self._changed[kind].pop(uid, None)
+            self._changed[kind][uid] = self._seq
+
+            self._events.append({'seq'  : self._seq,
+                                 'kind' : kind,
+                                 'uid'  : uid,
+                                 'state': state,
+                                 'time' : time.time()})
+
+            if self._listen:
+                self._listen(kind, uid, state)
+
+            wids = self._watch[kind].get(uid)
+            if wids:
+                for wid in list(wids):
+                    ticket = self._tickets.get(wid)
+                    if ticket and self._check(ticket, uid, state):
+                        wids.discard(wid)
+
+                if not wids:
+                    del self._watch[kind][uid]
+
+            # wake up ticket waiters and event readers
+            self._cond.notify_all()
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _count(counts, old, new):
+
+        if old is not None:
+            counts[old] -= 1
+            if not counts[old]:
+                del counts[old]
+
+        if new is not None:
+            counts[new] = counts.get(new, 0) + 1
+
+    # --------------------------------------------------------------------------
+    #
+    def _place(self, tid, pid, state):
+
+        # move the task (in its current state) to the counts of the new pilot
+        prev = self._placed.get(tid)
+        if prev == pid:
+            return
+
+        if prev:
+            self._count(self._per_pid[prev], state, None)
+
+        self._placed[tid] = pid
+        self._count(self._per_pid.setdefault(pid, dict()), None, state)
+
+    # --------------------------------------------------------------------------
+    #
+    def set_listener(self, listener):
+        '''
+        call `listener(kind, uid, state)` on all subsequent state transitions
+        (in order).  The listener is called with the tracker lock held, and
+        must not block.  `None` removes the listener.
+        '''
+
+        with self._cond:
+            self._listen = listener
+
+    # --------------------------------------------------------------------------
+    #
+    def _check(self, ticket, uid, state):
+
+        if state not in ticket.states and state not in self._final:
+            return False
+
+        ticket.pending.discard(uid)
+        if not ticket.done and \
+                len(ticket.uids) - len(ticket.pending) >= ticket.count:
+            ticket.resolved = time.time()
+
+        return True
+
+    # --------------------------------------------------------------------------
+    #
+    def get_states(self, kind, uids=None):
+
+        with self._cond:
+            if uids is None:
+                return dict(self._states[kind])
+            return {uid: self._states[kind].get(uid) for uid in uids}
+
+    # --------------------------------------------------------------------------
+    #
+    def is_final(self, kind, uid):
+
+        with self._cond:
+            return self._states[kind].get(uid) in self._final
+
+    # --------------------------------------------------------------------------
+    #
+    def create_ticket(self, kind, uids=None, states=None, count=None):
+        '''
+        create a ticket which resolves once all pilots or tasks with the given
+        UIDs (default: all known ones) reached any of the given states (default:
+        final states).  If `count` is given, the ticket resolves as soon as
+        that many of them reached those states.  Returns the ticket ID.
+        '''
+
+        if count is not None and count < 0:
+            raise ValueError('invalid wait count %d' % count)
+
+        states = ru.as_list(states) or list(self._final)
+
+        with self._cond:
+
+            self._collect()
+
+            known = self._states[kind]
+            if not uids:
+                uids = list(known.keys())
+
+            unknown = [uid for uid in uids if uid not in known]
+            if unknown:
+                raise ValueError('unknown %s IDs: %s' % (kind, unknown))
+
+            wid    = ru.generate_id('wait.%(item_counter)06d', ru.ID_CUSTOM)
+            ticket = _Ticket(wid, kind, list(uids), states, count)
+
+            if not ticket.count:
+                ticket.resolved = time.time()
+
+            for uid in uids:
+                if not self._check(ticket, uid, known[uid]):
+                    self._watch[kind].setdefault(uid, set()).add(wid)
+
+            if ticket.done:
+                self._unwatch(ticket)
+
+            self._tickets[wid] = ticket
+
+        return wid
+
+    # --------------------------------------------------------------------------
+    #
+    def check_tickets(self, wids, timeout=None):
+        '''
+        return the status of the given tickets.  If none of them is resolved,
+        wait up to `timeout` seconds (forever on `None` or negative values) for
+        any of them to resolve.
+        '''
+
+        if timeout is not None and timeout < 0:
+            timeout = None
+
+        with self._cond:
+
+            for wid in wids:
+                if wid not in self._tickets:
+                    raise ValueError('unknown wait ticket %s' % wid)
+
+            tickets = [self._tickets[wid] for wid in wids]
+            self._cond.wait_for(lambda: self._closed or
+                                        any(t.done for t in tickets), timeout)
+
+            return [t.as_dict(self._states[t.kind]) for t in tickets]
+
+    # --------------------------------------------------------------------------
+    #
+    def release_ticket(self, wid):
+        '''
+        drop a (resolved or pending) ticket
+        '''
+
+        with self._cond:
+
+            ticket = self._tickets.pop(wid, None)
+            if not ticket:
+                raise ValueError('unknown wait ticket %s' % wid)
+
+            self._unwatch(ticket)
+
+    # --------------------------------------------------------------------------
+    #
+    def _unwatch(self, ticket):
+
+        watch = self._watch[ticket.kind]
+        for uid in ticket.pending:
+            wids = watch.get(uid)
+            if wids:
+                wids.discard(ticket.wid)
+                if not wids:
+                    del watch[uid]
+
+    # --------------------------------------------------------------------------
+    #
+    def _collect(self):
+
+        # garbage collect resolved tickets which have not been released, but
+        # don't scan all tickets more often than every few seconds
+        now = time.time()
+        if now - self._gc_last < self._ttl / 100:
+            return
+
+        self._gc_last = now
+        limit = now - self._ttl
+        for wid in list(self._tickets):
+            ticket = self._tickets[wid]
+            if ticket.done and ticket.resolved < limit:
+                del self._tickets[wid]
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def seq(self):
+        '''
+        sequence number of the last recorded state transition
+        '''
+
+        with self._cond:
+            return self._seq
+
+    # --------------------------------------------------------------------------
+    #
+    def get_counts(self, kind):
+        '''
+        return a dict `{state: n}` with the number of pilots or tasks per state
+        '''
+
+        with self._cond:
+            return dict(self._counts[kind])
+
+    # --------------------------------------------------------------------------
+    #
+    def summary(self):
+        '''
+        return a summary of the session from the incrementally maintained
+        counters (the cost does not depend on the number of tasks):
+
+            {
+                'seq'   : 42,
+                'pilots': {'total': 1, 'states': {'PMGR_ACTIVE': 1}},
+                'tasks' : {'total': 8, 'states': {'DONE': 6, ...}},
+                'per_pilot': {
+                    'pilot.0000': {'state': 'PMGR_ACTIVE',
+                                   'tasks': {'DONE': 6, ...}}
+                },
+                'rates' : {'10s' : {'submitted': 0.8, 'completed': 0.6},
+                           '60s' : {...},
+                           '300s': {...}}
+            }
+
+        Rates are tasks per second over the given windows (or over the
+        lifetime of the tracker if that is shorter).
+        '''
+
+        with self._cond:
+
+            now    = time.time()
+            pilots = self._counts['pilot']
+            tasks  = self._counts['task']
+
+            per_pilot = dict()
+            for pid, state in self._states['pilot'].items():
+                per_pilot[pid] = {'state': state,
+                                  'tasks': dict(self._per_pid.get(pid, {}))}
+
+            rates = dict()
+            for window in self.WINDOWS:
+                span = max(1.0, min(window, now - self._started))
+                rates['%ds' % window] = {
+                        name: rate.count(now, window) / span
+                        for name, rate in self._rates.items()}
+
+            return {'seq'      : self._seq,
+                    'pilots'   : {'total' : sum(pilots.values()),
+                                  'states': dict(pilots)},
+                    'tasks'    : {'total' : sum(tasks.values()),
+                                  'states': dict(tasks)},
+                    'per_pilot': per_pilot,
+                    'rates'    : rates}
+
+    # --------------------------------------------------------------------------
+    #
+    def version(self, kind):
+        '''
+        version of the pilot or task collection: the sequence number of the
+        last state transition of that kind (0 if there was none)
+        '''
+
+        with self._cond:
+            return next(reversed(self._changed[kind].values()), 0)
+
+    # --------------------------------------------------------------------------
+    #
+    def get_changed(self, kind, since=0):
+        '''
+        return a tuple `(uids, seq)` with the UIDs of all pilots or tasks which
+        changed state after the sequence number `since` (in order of their
+        last change), and the current sequence number.
+        '''
+
+        with self._cond:
+
+            uids = list()
+            for uid, seq in reversed(self._changed[kind].items()):
+                if seq <= since:
+                    break
+                uids.append(uid)
+
+            return uids[::-1], self._seq
+
+    # --------------------------------------------------------------------------
+    #
+    def get_events(self, since=0, limit=None, timeout=None):
+        '''
+        return a tuple `(events, gap)` with up to `limit` state transition
+        events with a sequence number larger than `since`.  If there are none,
+        wait up to `timeout` seconds (forever on `None`) for new events.  `gap`
+        is `True` if events after `since` were already dropped from the event
+        log.  The call returns an empty list once the tracker is closed.
+        '''
+
+        with self._cond:
+
+            self._cond.wait_for(lambda: self._seq > since or self._closed,
+                                timeout)
+
+            if not self._events or self._seq <= since:
+                return [], False
+
+            first = self._events[0]['seq']
+            gap   = since + 1 < first
+            start = max(since + 1 - first, 0)
+            stop  = None if limit is None else start + limit
+
+            return list(itertools.islice(self._events, start, stop)), gap
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        '''
+        wake up and terminate all event readers
+        '''
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def closed(self):
+        return self._closed
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def backlog(self):
+        '''
+        number of unresolved tickets
+        '''
+
+        with self._cond:
+            return len([t for t in self._tickets.values() if not t.done])
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,419 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import os
+import time
+import zlib
+import socket
+import secrets
+
+import multiprocessing as mp
+
+import bottle
+import urllib3
+
+from .server  import _Service, PIServer, methodroute
+from .server  import INTERNAL_KEY, INTERNAL_USER
+from .codec   import JSON
+from .metrics import Gauge, CONTENT_TYPE as METRICS_TYPE
+
+
+# request headers which are not forwarded to the workers: hop-by-hop headers,
+# and the client credentials (replaced by the internal key and user)
+_SKIP_REQUEST  = {'host', 'content-length', 'connection', 'keep-alive',
+                  'transfer-encoding', 'te', 'upgrade', 'authorization',
+                  'cookie', 'proxy-authorization', INTERNAL_KEY.lower(),
+                  INTERNAL_USER.lower()}
+
+# response headers which are not forwarded to the clients (the worker's
+# `Content-Length` is, so that the client connection can be kept open)
+_SKIP_RESPONSE = {'connection', 'keep-alive', 'transfer-encoding', 'server',
+                  'date'}
+
+# chunk size for streaming worker responses back to the client
+_CHUNK = 64 * 1024
+
+# max time to wait for the workers to start (seconds)
+START_TIMEOUT = 60.0
+
+
+# ------------------------------------------------------------------------------
+#
+def _serve(idx, port, key, provider):
+    '''
+    worker process: a `PIServer` which only accepts requests from the router
+    '''
+
+    os.environ['RADICAL_PI_HOST']         = '127.0.0.1'
+    os.environ['RADICAL_PI_PORT']         = str(port)
+    os.environ['RADICAL_PI_INTERNAL_KEY'] = key
+
+    # each worker journals its own shard of the sessions
+    if os.environ.get('RADICAL_PI_JOURNAL'):
+        os.environ['RADICAL_PI_JOURNAL'] += '.%d' % idx
+
+    server = None
+    try:
+        server = PIServer(provider=provider)
+        server.start()
+
+    finally:
+        if server:
+            server.terminate()
+
+
+def _free_port():
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    return port
+
+
+# ------------------------------------------------------------------------------
+#
+class PIRouter(_Service):
+    """Front end of a multi-process service.
+
+    The router starts `workers` worker processes (default: env variable
+    `RADICAL_PI_WORKERS`), each running a `PIServer` on a local port, and
+    dispatches all `/sessions/<sid>/...` requests by session affinity: the
+    worker owning a session is determined by a hash of user name and session
+    ID, so that all requests for a session are served by the same process.
+    Login, logout, bearer tokens and the session listing are handled by the
+    router, which forwards requests with an internal key shared with its
+    workers.  Responses (including streamed task output) are passed through
+    unchanged.
+
+    `provider` is passed on to the `PIServer` of each worker, and thus must be
+    a provider name or an importable class.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, workers=None, provider=None):
+
+        super().__init__()
+
+        if workers is None:
+            workers = int(os.environ.get('RADICAL_PI_WORKERS', 0))
+
+        if workers < 1:
+            raise ValueError('invalid number of workers %d' % workers)
+
+        self._provider = provider
+        self._n_work   = workers
+        self._key      = secrets.token_hex(32)
+        self._procs    = list()
+        self._ports    = list()
+        self._conns    = list()
+
+        self._rep.header('--- Pilot RESTful API (%d workers) ---' % workers)
+
+    # --------------------------------------------------------------------------
+    #
+    def _plugins(self):
+
+        # the workers report the phase timings of forwarded requests
+        return [plugin for plugin in super()._plugins()
+                       if  plugin.name != 'timing']
+
+    # --------------------------------------------------------------------------
+    #
+    def _prepare(self):
+
+        ctx = mp.get_context('spawn')
+
+        for idx in range(self._n_work):
+
+            port = _free_port()
+            proc = ctx.Process(target=_serve,
+                               args=(idx, port, self._key, self._provider),
+                               daemon=True)
+            proc.start()
+
+            self._procs.append(proc)
+            self._ports.append(port)
+            self._conns.append(urllib3.HTTPConnectionPool(
+                '127.0.0.1', port, maxsize=32, block=False, retries=False,
+                timeout=urllib3.Timeout(connect=10.0, read=None)))
+
+        start = time.time()
+        for proc, port in zip(self._procs, self._ports):
+            while True:
+                try:
+                    socket.create_connection(('127.0.0.1', port),
+                                             timeout=1).close()
+                    break
+                except OSError:
+                    if not proc.is_alive():
+                        raise RuntimeError('worker on port %d failed' % port)
+                    if time.time() - start > START_TIMEOUT:
+                        raise RuntimeError('worker on port %d did not start'
+                                           % port)
+                    time.sleep(0.1)
+
+        self._rep.info('started %d workers\n' % self._n_work)
+
+    # --------------------------------------------------------------------------
+    #
+    def terminate(self):
+        """Close this service endpoint
+
+          - stop listening on the service port
+          - stop all workers (which closes their sessions)
+        """
+
+        super().terminate()
+
+        for conn in self._conns:
+            conn.close()
+
+        for proc in self._procs:
+            proc.terminate()
+
+        for proc in self._procs:
+            proc.join(timeout=10)
+
+    # --------------------------------------------------------------------------
+    #
+    def _shard(self, account, sid):
+        '''
+        return the index of the worker which owns the given session
+        '''
+
+        key = '%s/%s' % (account['username'], sid)
+        return zlib.crc32(key.encode('utf-8')) % self._n_work
+
+    # --------------------------------------------------------------------------
+    #
+    def _internal_headers(self, account):
+
+        return {INTERNAL_KEY : self._key,
+                INTERNAL_USER: account['username']}
+
+    # --------------------------------------------------------------------------
+    #
+    def _call(self, idx, account, method, route):
+        '''
+        call a route on a worker and return the decoded result
+        '''
+
+        headers = self._internal_headers(account)
+        headers['Accept'] = JSON.content_type
+
+        r = self._conns[idx].request(method, route, headers=headers)
+        if r.status != 200:
+            raise RuntimeError('worker %d: %s %s failed (%d)'
+                               % (idx, method, route, r.status))
+
+        reply = JSON.decode(r.data)
+        if not reply.get('success'):
+            raise RuntimeError('worker %d: %s' % (idx, reply.get('error')))
+
+        return reply['result']
+
+    # --------------------------------------------------------------------------
+    #
+    def _close_sessions(self, account):
+
+        for idx in range(self._n_work):
+            try:
+                self._call(idx, account, 'DELETE', '/sessions/')
+            except Exception:
+                self._log.exception('worker %d: session close failed', idx)
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/', method=['PUT', 'DELETE'])
+    def forward_session(self, sid):
+        '''
+        Forward session creation and removal (see `forward`)
+        '''
+
+        return self.forward(sid)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/<path:path>',
+                 method=['GET', 'PUT', 'POST', 'DELETE'])
+    def forward(self, sid, path=''):
+        '''
+        Forward a session request to the worker owning that session, and pass
+        the response through.  The request body is read completely before it
+        is forwarded, the response body is streamed (with the worker's
+        `Content-Length` if it sent one, chunked otherwise).
+        '''
+
+        try:
+            request = bottle.request
+            account = self._check_cookie(request)
+            idx     = self._shard(account, sid)
+
+            route   = '/sessions/%s/%s' % (sid, path)
+            if request.query_string:
+                route += '?%s' % request.query_string
+
+            headers = {k: v for k, v in request.headers.items()
+                            if k.lower() not in _SKIP_REQUEST}
+            headers.update(self._internal_headers(account))
+
+            body = request.body.read() or None
+
+            r = self._conns[idx].urlopen(request.method, route, body=body,
+                                         headers=headers, retries=False,
+                                         preload_content=False,
+                                         decode_content=False)
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+        for key, val in r.headers.items():
+            if key.lower() in _SKIP_RESPONSE:
+                continue
+            if key.lower() == 'set-cookie':
+                bottle.response.add_header(key, val)
+            else:
+                bottle.response.set_header(key, val)
+
+        bottle.response.status = r.status
+
+        def _stream():
+            try:
+                for chunk in r.stream(_CHUNK, decode_content=False):
+                    yield chunk
+            finally:
+                r.release_conn()
+
+        return _stream()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/', method='GET')
+    def sessions_inspect(self):
+        '''
+        List all known session IDs for the current user (on all workers)
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+
+            sids = list()
+            for idx in range(self._n_work):
+                sids.extend(self._call(idx, account, 'GET', '/sessions/'))
+
+            return {'success' : True,
+                    'result'  : sids}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/', method='DELETE')
+    def sessions_close(self):
+        '''
+        Close all sessions for this user (on all workers)
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+
+            for idx in range(self._n_work):
+                self._call(idx, account, 'DELETE', '/sessions/')
+
+            return {'success' : True,
+                    'result'  : None}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/status/', method='GET')
+    def status(self):
+        '''
+        Return the service statistics of all workers
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+
+            workers = list()
+            for idx, proc in enumerate(self._procs):
+                info = {'port' : self._ports[idx],
+                        'alive': proc.is_alive()}
+                if info['alive']:
+                    info.update(self._call(idx, account, 'GET', '/status/'))
+                workers.append(info)
+
+            return {'success' : True,
+                    'result'  : {'workers': workers}}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/metrics', method='GET')
+    def metrics(self):
+        '''
+        Return the router metrics in the Prometheus text format: request
+        counts, errors and latencies per route, and the number of running
+        workers.  The metrics of worker `<n>` are exported on `/metrics/<n>`.
+        '''
+
+        self._check_metrics_token(bottle.request)
+
+        g_up = Gauge('radical_pi_workers_up', 'number of running workers', [])
+        g_up.set((), sum(proc.is_alive() for proc in self._procs))
+
+        bottle.response.content_type = METRICS_TYPE
+        return self._metrics.render([g_up])
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/metrics/<idx:int>', method='GET')
+    def metrics_worker(self, idx):
+        '''
+        Return the metrics of a worker (see `PIServer.metrics`)
+        '''
+
+        account = self._check_metrics_token(bottle.request)
+
+        if idx < 0 or idx >= self._n_work:
+            raise bottle.HTTPError(404, 'no worker %d' % idx)
+
+        # users are authenticated by the router, scrapers by the worker
+        if account:
+            headers = self._internal_headers(account)
+        else:
+            headers = {'Authorization':
+                       bottle.request.headers.get('Authorization')}
+
+        r = self._conns[idx].request('GET', '/metrics', headers=headers)
+
+        bottle.response.status       = r.status
+        bottle.response.content_type = r.headers.get('Content-Type',
+                                                     METRICS_TYPE)
+        return r.data
+
+
+# ------------------------------------------------------------------------------
+
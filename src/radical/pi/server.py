@@ -11,14 +11,45 @@ __license__   = 'MIT'
 # ------------------------------------------------------------------------------
 
 import os
-import json
+import hmac
+import time
+import zlib
+import socket
+import selectors
+import itertools
+import threading as mt
+
+from concurrent.futures    import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, ServerHandler
+
 # Bottle: Python Web Framework (lightweight WSGI micro web-framework for Python)
 import bottle
 
 import radical.utils as ru
 
 from .constants import PACKAGE_NS
-from .providers import PilotClient
+from .providers import Provider, get_provider
+from .providers.cache import get_output_cache
+from .providers.query import QueryError
+from .pool      import SessionPool
+from .journal   import Journal
+from .auth      import TokenCache
+from .stream    import tail_offset, iter_file, follow_file
+from .compress  import Compressor
+from .codec     import JSON, for_content_type, negotiate
+from .metrics   import Registry, Counter, Gauge
+from .metrics   import CONTENT_TYPE as METRICS_TYPE
+from .timing    import Timing, NoTiming
+
+
+_NO_TIMING = NoTiming()
+
+
+def _timing():
+    '''
+    return the phase timing record of the current request (see `Timing`)
+    '''
+    return bottle.request.environ.get('radical.pi.timing', _NO_TIMING)
 
 
 # ------------------------------------------------------------------------------
@@ -65,6 +96,607 @@ def routeapp(obj):
                 bottle.route(route, method, callback, name, aply, skip)(attr)
 
 
+# ------------------------------------------------------------------------------
+#
+class _CodecPlugin:
+    '''
+    bottle plugin which replaces the default `JSONPlugin`: dict results are
+    serialized with the codec negotiated via the request's `Accept` header
+    (see `codec.negotiate`).
+    '''
+
+    name = 'json'
+    api  = 2
+
+    def apply(self, callback, route):
+
+        def wrapper(*args, **kwargs):
+
+            result = callback(*args, **kwargs)
+
+            if isinstance(result, dict):
+                if result.get('success') is False:
+                    # reported as error by `_MetricsPlugin`
+                    bottle.request.environ['radical.pi.failed'] = True
+                codec = negotiate(bottle.request.headers.get('Accept'))
+                bottle.response.content_type = codec.content_type
+                with _timing().phase('serialize'):
+                    return codec.encode(result)
+
+            return result
+
+        return wrapper
+
+
+# ------------------------------------------------------------------------------
+#
+class _MetricsPlugin:
+    '''
+    bottle plugin which counts requests and errors, and records the request
+    latency (until the response body is returned or starts streaming), per
+    route and method.  Errors are requests which raise, which return an HTTP
+    error status, or whose result reports `'success': False`.
+    '''
+
+    name = 'metrics'
+    api  = 2
+
+    def __init__(self, requests, errors, latency):
+
+        self._requests = requests
+        self._errors   = errors
+        self._latency  = latency
+
+    def apply(self, callback, route):
+
+        labels = (route.rule, route.method)
+
+        def wrapper(*args, **kwargs):
+
+            start  = time.time()
+            failed = True
+            try:
+                result = callback(*args, **kwargs)
+                failed = bottle.response.status_code >= 400 or \
+                         bool(bottle.request.environ.get('radical.pi.failed'))
+                return result
+
+            except bottle.HTTPResponse as e:
+                failed = e.status_code >= 400
+                raise
+
+            finally:
+                self._requests.inc(labels)
+                self._latency.observe(time.time() - start, labels)
+                if failed:
+                    self._errors.inc(labels)
+
+        return wrapper
+
+
+# ------------------------------------------------------------------------------
+#
+class _TimingPlugin:
+    '''
+    bottle plugin which records the time spent in the phases of a request:
+    authentication (`auth`), request parsing (`parse`), the provider call
+    (`call`, i.e., all time not accounted to other phases) and response
+    serialization (`serialize`).  The phases are recorded as profiler events
+    and are reported to the client in a `Server-Timing` header.
+    '''
+
+    name = 'timing'
+    api  = 2
+
+    def __init__(self, prof):
+
+        self._prof = prof
+        self._rids = itertools.count()
+
+    def apply(self, callback, route):
+
+        msg = '%s %s' % (route.method, route.rule)
+
+        def wrapper(*args, **kwargs):
+
+            timing = Timing(self._prof, 'request.%06d' % next(self._rids), msg)
+            bottle.request.environ['radical.pi.timing'] = timing
+            timing.event('request_start')
+
+            try:
+                result = callback(*args, **kwargs)
+                bottle.response.set_header('Server-Timing', timing.header())
+                return result
+
+            except bottle.HTTPResponse as e:
+                e.set_header('Server-Timing', timing.header())
+                raise
+
+            finally:
+                timing.event('request_stop')
+
+        return wrapper
+
+
+# ------------------------------------------------------------------------------
+#
+class _TimedBody:
+    '''
+    response body wrapper which records the time spent on sending the body
+    (`write_start` / `write_stop` profiler events).  That phase ends after the
+    `Server-Timing` header is sent, and thus is only visible in profiles.
+    '''
+
+    def __init__(self, body, timing):
+
+        self._body   = body
+        self._timing = timing
+
+    def __iter__(self):
+
+        self._timing.event('write_start')
+        for chunk in self._body:
+            yield chunk
+
+    def close(self):
+
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._timing.event('write_stop')
+
+
+def _timed_app(app):
+    '''
+    WSGI middleware wrapping response bodies into `_TimedBody`
+    '''
+
+    def wrapper(environ, start_response):
+
+        body   = app(environ, start_response)
+        timing = environ.get('radical.pi.timing')
+
+        if timing is None:
+            return body
+
+        return _TimedBody(body, timing)
+
+    return wrapper
+
+
+# ------------------------------------------------------------------------------
+#
+class _PooledWSGIServer(WSGIServer):
+    '''
+    `wsgiref` server which dispatches each incoming connection to a bounded
+    pool of worker threads, so that long running requests (`*_wait`) do not
+    stall the requests of other users and sessions.
+
+    Idle keep-alive connections don't hold a worker thread: between requests
+    they are parked in a selector, watched by a single thread which hands them
+    back to the pool once the next request arrives, and closes them after
+    `idle` seconds without one.
+    '''
+
+    threads            = 32
+    request_queue_size = 128
+    idle               = 15
+
+    def server_activate(self):
+
+        super().server_activate()
+        self._pool    = ThreadPoolExecutor(max_workers=self.threads,
+                                           thread_name_prefix='pi.worker')
+        self._parked  = list()     # handlers to add to the selector
+        self._p_lock  = mt.Lock()
+        self._p_stop  = False
+        self._p_wake  = socket.socketpair()
+        self._p_sel   = selectors.DefaultSelector()
+        self._p_sel.register(self._p_wake[0], selectors.EVENT_READ, None)
+
+        self._p_thread = mt.Thread(target=self._watch_idle, name='pi.idle')
+        self._p_thread.daemon = True
+        self._p_thread.start()
+
+    def process_request(self, request, client_address):
+
+        self._pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+
+        # the handler closes or parks the connection when it is done
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+
+    def _resume(self, handler):
+
+        try:
+            handler.handle()
+        except Exception:
+            handler.close_connection = True
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            handler.finish()
+
+    def park(self, handler):
+        '''
+        watch an idle keep-alive connection for the next request
+        '''
+
+        with self._p_lock:
+            if self._p_stop:
+                handler.close()
+                return
+            self._parked.append(handler)
+
+        self._p_wake[1].send(b'x')
+
+    def _watch_idle(self):
+
+        sel = self._p_sel
+
+        while True:
+
+            events = sel.select(timeout=1.0)
+            now    = time.time()
+
+            for key, _ in events:
+                if key.data is None:
+                    self._p_wake[0].recv(4096)
+                    continue
+                sel.unregister(key.fileobj)
+                try:
+                    self._pool.submit(self._resume, key.data)
+                except RuntimeError:
+                    # the pool is shut down
+                    key.data.close()
+
+            with self._p_lock:
+                parked, self._parked = self._parked, list()
+                stop = self._p_stop
+
+            for handler in parked:
+                handler.parked = now
+                sel.register(handler.request, selectors.EVENT_READ, handler)
+
+            for key in list(sel.get_map().values()):
+                handler = key.data
+                if handler and (stop or now - handler.parked > self.idle):
+                    sel.unregister(key.fileobj)
+                    handler.close()
+
+            if stop:
+                break
+
+        sel.close()
+        for sock in self._p_wake:
+            sock.close()
+
+    def server_close(self):
+
+        super().server_close()
+        if getattr(self, '_pool', None):
+            with self._p_lock:
+                self._p_stop = True
+            self._p_wake[1].send(b'x')
+            self._pool.shutdown(wait=False)
+
+
+# ------------------------------------------------------------------------------
+#
+class _RequestBody:
+    '''
+    `wsgi.input` wrapper which stops at the end of the request body, so that
+    unread body data can be skipped before the next request on a keep-alive
+    connection is parsed.
+    '''
+
+    def __init__(self, rfile, length):
+
+        self._rfile  = rfile
+        self._remain = length
+
+    def read(self, size=-1):
+
+        if size is None or size < 0 or size > self._remain:
+            size = self._remain
+        data = self._rfile.read(size)
+        self._remain -= len(data)
+        return data
+
+    def readline(self, size=-1):
+
+        if size is None or size < 0 or size > self._remain:
+            size = self._remain
+        data = self._rfile.readline(size)
+        self._remain -= len(data)
+        return data
+
+    def __iter__(self):
+
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            yield line
+
+    def drain(self):
+
+        while self._remain > 0:
+            if not self.read(min(self._remain, 64 * 1024)):
+                return False
+        return True
+
+
+class _KeepAliveServerHandler(ServerHandler):
+    '''
+    `wsgiref` handler which sends responses of unknown length (streams) with
+    chunked transfer encoding to HTTP/1.1 clients, so that the connection
+    can be reused.  For older clients, the end of such a response is marked
+    by closing the connection.
+    '''
+
+    http_version = '1.1'
+    chunked      = False
+    framing      = False
+
+    def cleanup_headers(self):
+
+        super().cleanup_headers()
+
+        # the request handler may close the connection anyway (e.g., after a
+        # chunked request body) - the client must not reuse it
+        if self.request_handler.close_connection:
+            self.headers['Connection'] = 'close'
+            return
+
+        if 'Content-Length' in self.headers:
+            return
+
+        # responses without a body need no delimiter
+        if self.environ.get('REQUEST_METHOD') == 'HEAD' or \
+           self.status[:3] in ['204', '304']:
+            return
+
+        if self.environ.get('SERVER_PROTOCOL') == 'HTTP/1.1':
+            self.headers['Transfer-Encoding'] = 'chunked'
+            self.chunked = True
+        else:
+            self.headers['Connection'] = 'close'
+            self.request_handler.close_connection = True
+
+    def send_headers(self):
+
+        super().send_headers()
+        self.framing = self.chunked
+
+    def _write(self, data):
+
+        # only the body is framed, not the status line and headers
+        if self.framing:
+            if not data:
+                # an empty chunk would end the response
+                return
+            data = b'%x\r\n%s\r\n' % (len(data), data)
+
+        super()._write(data)
+
+    def finish_content(self):
+
+        super().finish_content()
+
+        if self.chunked:
+            self.framing = False
+            self._write(b'0\r\n\r\n')
+            self._flush()
+
+    def handle_error(self):
+
+        # a partially sent response can't be completed
+        if self.headers_sent:
+            self.request_handler.close_connection = True
+
+        super().handle_error()
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    '''
+    `wsgiref` request handler which serves several requests per (HTTP/1.1)
+    connection, so that clients don't need to reconnect for every request.
+    Between requests, the connection is parked with the server (see
+    `_PooledWSGIServer.park`) instead of blocking a worker thread.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    # max time to receive the request line of a connection which became
+    # readable (seconds)
+    timeout_line     = 15
+
+    # headers and body are written separately - don't let Nagle's algorithm
+    # delay the body on persistent connections
+    disable_nagle_algorithm = True
+
+    def address_string(self):
+        # avoid reverse DNS lookups
+        return self.client_address[0]
+
+    def handle(self):
+
+        self.close_connection = True
+        try:
+            self._handle_one()
+
+            # serve requests which are already buffered (pipelining) right away
+            while not self.close_connection and self._buffered():
+                self._handle_one()
+
+        except Exception:
+            self.close_connection = True
+            raise
+
+    def _buffered(self):
+
+        # peek into the read buffer without blocking on the socket
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.setblocking(True)
+
+    def finish(self):
+
+        if self.close_connection or not hasattr(self.server, 'park'):
+            self.close()
+            return
+
+        try:
+            self.wfile.flush()
+        except OSError:
+            self.close()
+            return
+
+        self.server.park(self)
+
+    def close(self):
+
+        try:
+            super().finish()
+        except OSError:
+            pass
+        self.server.shutdown_request(self.request)
+
+    def _handle_one(self):
+
+        try:
+            self.connection.settimeout(self.timeout_line)
+            self.raw_requestline = self.rfile.readline(65537)
+            self.connection.settimeout(None)
+
+        except (socket.timeout, OSError):
+            self.close_connection = True
+            return
+
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+
+        if len(self.raw_requestline) > 65536:
+            self.requestline     = ''
+            self.request_version = ''
+            self.command         = ''
+            self.send_error(414)
+            self.close_connection = True
+            return
+
+        if not self.parse_request():
+            return
+
+        length = self.headers.get('Content-Length')
+        if length is not None:
+            body = _RequestBody(self.rfile, int(length))
+        else:
+            # chunked bodies are not tracked - don't reuse the connection
+            body = self.rfile
+            if self.headers.get('Transfer-Encoding'):
+                self.close_connection = True
+
+        handler = _KeepAliveServerHandler(body, self.wfile, self.get_stderr(),
+                                          self.get_environ(),
+                                          multithread=True)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+        try:
+            if isinstance(body, _RequestBody) and not body.drain():
+                self.close_connection = True
+        except OSError:
+            self.close_connection = True
+
+
+# ------------------------------------------------------------------------------
+#
+class _ThreadedServer(bottle.WSGIRefServer):
+    '''
+    bottle server adapter for `_PooledWSGIServer` with keep-alive connections
+    - the option `threads` determines the size of the worker thread pool.
+    '''
+
+    def run(self, app):
+
+        threads = int(self.options.pop('threads', _PooledWSGIServer.threads))
+        server_cls = type('_PooledWSGIServer', (_PooledWSGIServer,),
+                          {'threads'           : threads,
+                           'request_queue_size': max(threads * 4, 128)})
+
+        self.options['server_class']  = server_cls
+        self.options['handler_class'] = _KeepAliveHandler
+        super().run(app)
+
+    def shutdown(self):
+
+        srv = getattr(self, 'srv', None)
+        if srv:
+            srv.shutdown()
+            srv.server_close()
+
+
+# ------------------------------------------------------------------------------
+#
+# server modes supported by `PIServer.start()`:
+#
+#   threaded : wsgiref with a bounded thread pool (default)
+#   wsgiref  : bottle's single threaded development server
+#   waitress : thread pool based production server (`pip install waitress`)
+#   cheroot  : thread pool based production server (`pip install cheroot`)
+#   gunicorn : `gthread` worker with a thread pool  (`pip install gunicorn`)
+#   gevent   : async event loop (`pip install gevent`), requires monkey
+#              patching before `radical.pi` is imported (see
+#              `bin/radical-pi-start.py`)
+#   aiohttp  : asyncio event loop (`pip install aiohttp-wsgi`)
+#
+# Session state is held in-process, so all modes run a single process, and the
+# number of concurrently served requests is tuned via `RADICAL_PI_THREADS`.
+# To use several processes, `router.PIRouter` runs a set of worker services,
+# each owning a shard of the sessions (see `RADICAL_PI_WORKERS`).
+#
+SERVER_MODES = ['threaded', 'wsgiref', 'waitress', 'cheroot', 'gunicorn',
+                'gevent', 'aiohttp']
+
+
+# request headers which select the representation of tagged (`ETag`)
+# responses: the codec and the content encoding
+ETAG_VARY     = 'Accept, Accept-Encoding'
+
+
+# headers of requests forwarded by the router: the internal key shared by the
+# router and its workers, and the authenticated user
+INTERNAL_KEY  = 'X-Radical-Pi-Key'
+INTERNAL_USER = 'X-Radical-Pi-User'
+
+
+# long-polls on wait tickets are capped to this many seconds, so that they don't
+# bind server threads indefinitely
+WAIT_POLL_MAX = 60
+
+
+def _server_options(mode, threads):
+
+    if mode == 'threaded': return {'threads'   : threads}
+    if mode == 'waitress': return {'threads'   : threads}
+    if mode == 'cheroot' : return {'numthreads': threads}
+    if mode == 'gunicorn': return {'workers'     : 1,
+                                   'threads'     : threads,
+                                   'worker_class': 'gthread'}
+    return {}
+
+
 # ------------------------------------------------------------------------------
 #
 class _Account(dict):
@@ -81,99 +713,226 @@ class _Account(dict):
 
 # ------------------------------------------------------------------------------
 #
-class PIServer:
+class _Service:
+    '''
+    Base class of the service endpoints (`PIServer` and `router.PIRouter`):
+    user accounts and authentication, request metrics, and serving the routes.
+    '''
 
     # --------------------------------------------------------------------------
     #
     def __init__(self):
-        """Initialize the service endpoint
-
-          - create logger, profile and reporter
-          - set up accounts
-        """
 
         self._log      = ru.Logger  (PACKAGE_NS)
         self._rep      = ru.Reporter(PACKAGE_NS)
         self._prof     = ru.Profiler(PACKAGE_NS)
         self._accounts = {'rct': _Account('rct', 'lacidar')}
+        self._server   = None
+
+        # protects `_accounts` and the session registries of all accounts
+        # against concurrent requests
+        self._lock     = mt.RLock()
+
+        # bearer tokens issued on login
+        self._tokens   = TokenCache(
+                ttl=float(os.environ.get('RADICAL_PI_TOKEN_TTL', 86400)),
+                size=int(os.environ.get('RADICAL_PI_TOKEN_MAX', 10000)))
+
+        # requests carrying this key (in the `INTERNAL_KEY` header) are
+        # authenticated as the user named in the `INTERNAL_USER` header
+        self._internal_key = os.environ.get('RADICAL_PI_INTERNAL_KEY')
+
+        # service metrics (see `metrics()`)
+        self._metrics  = Registry()
+        self._m_reqs   = self._metrics.counter(
+                                'radical_pi_requests_total',
+                                'number of requests', ['route', 'method'])
+        self._m_errs   = self._metrics.counter(
+                                'radical_pi_errors_total',
+                                'number of failed requests',
+                                ['route', 'method'])
+        self._m_lat    = self._metrics.histogram(
+                                'radical_pi_request_duration_seconds',
+                                'request latency', ['route', 'method'])
 
-        self._rep.header('--- Pilot RESTful API ---')
+    # --------------------------------------------------------------------------
+    #
+    def _plugins(self):
+        '''
+        return the bottle plugins to install.  Plugins installed last are
+        applied first: the metrics and timing plugins wrap the codec plugin, so
+        that latencies include serialization.
+        '''
+
+        return [_TimingPlugin(self._prof),
+                _MetricsPlugin(self._m_reqs, self._m_errs, self._m_lat),
+                _CodecPlugin()]
+
+    # --------------------------------------------------------------------------
+    #
+    def _prepare(self):
+        '''
+        called before the service starts listening
+        '''
+        pass
+
+    # --------------------------------------------------------------------------
+    #
+    def _wrap(self, app):
+        '''
+        return the WSGI app to serve (wrapping the bottle app in middleware)
+        '''
+        return app
 
     # --------------------------------------------------------------------------
     #
-    def start(self):
+    def start(self, mode=None, threads=None):
         """Open this service endpoint and begin serving requests.
+
+        The server backend is selected by `mode` (default: env variable
+        `RADICAL_PI_SERVER`, or `threaded`), see `SERVER_MODES`.  `threads`
+        (default: env variable `RADICAL_PI_THREADS`, or 32) determines the
+        number of concurrently served requests for thread pool based backends.
         """
 
         routeapp(self)
 
-        port = int(os.environ.get('RADICAL_PI_PORT', 8090))
-        host = str(os.environ.get('RADICAL_PI_HOST', '0.0.0.0'))
+        app = bottle.default_app()
+        app.uninstall('json')
+        for plugin in self._plugins():
+            app.install(plugin)
+
+        port    = int(os.environ.get('RADICAL_PI_PORT', 8090))
+        host    = str(os.environ.get('RADICAL_PI_HOST', '0.0.0.0'))
+        mode    = mode    or os.environ.get('RADICAL_PI_SERVER',  'threaded')
+        threads = threads or os.environ.get('RADICAL_PI_THREADS', 32)
+        threads = int(threads)
+
+        if mode not in SERVER_MODES:
+            raise ValueError('invalid server mode %s' % mode)
+
+        if threads < 1:
+            raise ValueError('invalid number of threads %d' % threads)
+
+        self._prepare()
+
+        options = _server_options(mode, threads)
+        if mode == 'threaded':
+            self._server = _ThreadedServer(host=host, port=port, **options)
+        else:
+            self._server = mode
+
+        app = self._wrap(app)
 
-        self._rep.info('serve on http://%s:%d/\n\n' % (host, port))
-        bottle.run(host=host, port=port, debug=True, quiet=False)
+        self._rep.info('serve on http://%s:%d/ [%s:%d]\n\n'
+                       % (host, port, mode, threads))
+        bottle.run(app=app, server=self._server, host=host, port=port,
+                   debug=True, quiet=False,
+                   **({} if mode == 'threaded' else options))
 
     # --------------------------------------------------------------------------
     #
     def terminate(self):
-        """Close this service endpoint
+        '''
+        stop listening on the service port (only supported for the `threaded`
+        mode)
+        '''
 
-          - close all sessions for all users (which frees all pilots)
-          - stop listening on the service port
-        """
-        # close all open sessions
-        for user in self._accounts:
-            for session in self._accounts[user]['sessions'].values():
-                try   : session.close()
-                except: pass
-            self._accounts[user]['sessions'] = {}
+        if isinstance(self._server, _ThreadedServer):
+            self._server.shutdown()
 
     # --------------------------------------------------------------------------
     #
     def _check_cookie(self, request):
         '''
-        Check if the given request carries a cookie and if this cookie is
-        associated with a user account.  If it is, return the respective account
-        record.
+        Check if the given request carries a valid bearer token or a cookie
+        associated with a user account.  If it does, return the respective
+        account record.
         '''
 
-        username = request.get_cookie('username')
-        account  = self._get_account(username)
-        secret   = account['secret']
-        check    = request.get_cookie('secret', secret=secret)
+        with _timing().phase('auth'):
+
+            # requests forwarded by the router (see `router.PIRouter`)
+            if self._internal_key and request.headers.get(INTERNAL_KEY):
+                if not hmac.compare_digest(request.headers[INTERNAL_KEY],
+                                           self._internal_key):
+                    raise RuntimeError('invalid internal key')
+                return self._get_account(request.headers.get(INTERNAL_USER))
 
-        if not check or check != username:
-            raise RuntimeError('invalid session (%s != %s)' % (check, username))
+            auth = request.headers.get('Authorization')
+            if auth and auth.startswith('Bearer '):
+                username = self._tokens.check(auth[7:])
+                if not username:
+                    raise RuntimeError('invalid or expired token')
+                return self._get_account(username)
+
+            username = request.get_cookie('username')
+            account  = self._get_account(username)
+            secret   = account['secret']
+            check    = request.get_cookie('secret', secret=secret)
 
-        account['username'] = username
+            if not secret or not check or check != username:
+                raise RuntimeError('invalid session (%s != %s)'
+                                   % (check, username))
 
-        return account
+            return account
 
 
     # --------------------------------------------------------------------------
     #
-    def _get_account(self, username):
+    def _check_metrics_token(self, request):
         '''
-        Check if given username is known and return the full account record
+        Metrics requests must carry the token `RADICAL_PI_METRICS_TOKEN` (if
+        set) as `Authorization: Bearer <token>` header, and may then see the
+        metrics of all accounts - `None` is returned.  Otherwise they must be
+        authenticated like any other request (see `_check_cookie`), and the
+        account is returned: its metrics are the only per-account ones shown.
         '''
 
-        if username not in self._accounts:
-            raise ValueError('invalid username [%s]' % username)
+        token = os.environ.get('RADICAL_PI_METRICS_TOKEN')
+        if token:
+            auth = request.headers.get('Authorization', '')
+            if hmac.compare_digest(auth.encode(),
+                                   ('Bearer %s' % token).encode()):
+                return None
 
-        return self._accounts[username]
+        try:
+            return self._check_cookie(request)
+
+        except Exception as e:
+            raise bottle.HTTPError(401, 'metrics require a token or login') \
+                from e
 
 
     # --------------------------------------------------------------------------
     #
-    def _get_session(self, account, sid):
+    @staticmethod
+    def _get_data(request):
         '''
-        Check if a session exists and return it
+        Decode the request body with the codec matching its content type (json
+        by default).  Returns `None` for empty bodies.
         '''
 
-        if sid not in account['sessions']:
-            raise ValueError('session %s does not exist' % sid)
+        with _timing().phase('parse'):
+
+            data = request.body.read()
+            if not data:
+                return None
+
+            return for_content_type(request.content_type).decode(data)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_account(self, username):
+        '''
+        Check if given username is known and return the full account record
+        '''
+
+        if username not in self._accounts:
+            raise ValueError('invalid username [%s]' % username)
 
-        return account['sessions'][sid]
+        return self._accounts[username]
 
 
     # --------------------------------------------------------------------------
@@ -190,14 +949,16 @@ class PIServer:
                  'password' : 'bar'
             }
 
-        The response will contain a cookie which must be used for subsequent
-        requests to this service endpoint.  The cookie is valid until `logout`
-        is called.
+        The response will contain a cookie, and the result will contain a bearer
+        token (`{'token': '...'}`).  Either must be used for subsequent requests
+        to this service endpoint, the token as `Authorization: Bearer <token>`
+        header.  Both are valid until `logout` is called, tokens expire after
+        `RADICAL_PI_TOKEN_TTL` seconds.
         '''
 
         self._log.info('login')
         try:
-            data = json.loads(bottle.request.body.read())
+            data = self._get_data(bottle.request)
 
             username = data.get('username')
             password = data.get('password')
@@ -209,18 +970,19 @@ class PIServer:
                 raise RuntimeError('invalid password')
 
             # create a new cookie secret if needed
-            if 'secret' in account:
-                secret = account['secret']
-            else:
-                secret = ru.generate_id('nge.secret', mode=ru.ID_UUID)
-                account['secret'] = secret
+            with self._lock:
+                if account.get('secret'):
+                    secret = account['secret']
+                else:
+                    secret = ru.generate_id('nge.secret', mode=ru.ID_UUID)
+                    account['secret'] = secret
 
             bottle.response.set_cookie('username', username, path='/')
             bottle.response.set_cookie('secret',   username, path='/',
                                        secret=secret)
 
             return {'success' : True,
-                    'result'  : None}
+                    'result'  : {'token': self._tokens.issue(username)}}
 
         except Exception as e:
             self._log.exception('login failed')
@@ -234,8 +996,9 @@ class PIServer:
     @methodroute('/logout/', method='PUT')
     def logout(self):
         '''
-        This method will invalidate the session cookie, and all further
-        operations (apart from a new login) will cause an error.
+        This method will invalidate the session cookie and all tokens of the
+        user, and all further operations (apart from a new login) will cause an
+        error.
 
         On logout, all sessions for the user will be closed, all pilots will be
         terminated.
@@ -244,107 +1007,547 @@ class PIServer:
         try:
             account = self._check_cookie(bottle.request)
 
-            self._log.info('logout %s', account['username'])
+            self._log.info('logout %s', account['username'])
+
+            # revoke credentials and close all sessions for this user
+            self._tokens.revoke(account['username'])
+
+            with self._lock:
+                account['secret'] = None
+
+            self._close_sessions(account)
+
+            return {'success' : True,
+                    'result'  : None}
+
+        except Exception as e:
+            self._log.exception('logout failed')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _close_sessions(self, account):
+        '''
+        close all sessions of the given account (on logout)
+        '''
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+class PIServer(_Service):
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, provider=None):
+        """Initialize the service endpoint
+
+          - create logger, profile and reporter
+          - set up accounts
+
+        `provider` is the class of the session instances, or its name in the
+        provider registry (default: env variable `RADICAL_PI_PROVIDER`, or
+        `rp`, see `providers.get_provider`).  It is called with the `log`,
+        `prof` and `rep` keyword arguments.
+        """
+
+        super().__init__()
+
+        self._provider = provider
+
+        if provider is None or isinstance(provider, str):
+            self._provider = get_provider(provider)
+
+        # pre-initialized session instances, to speed up session creation
+        self._pool     = SessionPool(
+                self._create_session,
+                size=int(os.environ.get('RADICAL_PI_POOL_SIZE', 1)),
+                low=int(os.environ.get('RADICAL_PI_POOL_LOW', 0)) or None,
+                idle=float(os.environ.get('RADICAL_PI_POOL_IDLE', 3600)),
+                log=self._log)
+
+        self._m_subs   = self._metrics.counter(
+                                'radical_pi_submitted_total',
+                                'number of submitted pilots and tasks',
+                                ['account', 'kind'])
+
+        # durable record of the open sessions, restored on startup
+        self._journal  = None
+        if os.environ.get('RADICAL_PI_JOURNAL'):
+            self._journal = Journal(
+                os.environ['RADICAL_PI_JOURNAL'],
+                interval=float(os.environ.get('RADICAL_PI_JOURNAL_INTERVAL',
+                                              1.0)),
+                log=self._log)
+
+        self._rep.header('--- Pilot RESTful API ---')
+
+    # --------------------------------------------------------------------------
+    #
+    def _create_session(self):
+
+        return self._provider(log=self._log, prof=self._prof, rep=self._rep)
+
+    # --------------------------------------------------------------------------
+    #
+    def _prepare(self):
+
+        self._pool.start()
+        self._restore()
+
+    # --------------------------------------------------------------------------
+    #
+    def _restore(self):
+        '''
+        re-open the sessions recorded in the journal, with the last known
+        states of their pilots and tasks (see `Provider.restore`)
+        '''
+
+        if not self._journal:
+            return
+
+        for user, sid, uid, entities in self._journal.load():
+
+            account = self._accounts.get(user)
+            if not account or sid in account['sessions']:
+                continue
+
+            session = None
+            try:
+                session = self._pool.get()
+                self._journal_open(user, sid, session)
+                session.restore(entities['pilot'], entities['task'])
+
+            except Exception:
+                self._log.exception('failed to restore session %s', sid)
+                self._journal.session_closed(user, sid)
+                if session:
+                    session.close()
+                continue
+
+            with self._lock:
+                account['sessions'][sid] = session
+
+            self._rep.info('restored session %s [%s]: %d pilots, %d tasks\n'
+                           % (sid, uid, len(entities['pilot']),
+                              len(entities['task'])))
+
+    # --------------------------------------------------------------------------
+    #
+    def _journal_open(self, user, sid, session):
+
+        if self._journal:
+            self._journal.session_opened(user, sid, session.uid)
+            session.set_listener(self._journal.recorder(user, sid))
+
+    # --------------------------------------------------------------------------
+    #
+    def _journal_close(self, user, sid, session):
+
+        if self._journal:
+            session.set_listener(None)
+            self._journal.session_closed(user, sid)
+
+    # --------------------------------------------------------------------------
+    #
+    def _wrap(self, app):
+
+        # negotiate response compression, decode compressed request bodies
+        app = Compressor(app,
+                threshold=int(os.environ.get('RADICAL_PI_COMPRESS_MIN', 1024)),
+                level=int(os.environ.get('RADICAL_PI_COMPRESS_LEVEL', 6)))
+
+        # profile sending (and compressing) response bodies
+        if self._prof.enabled:
+            app = _timed_app(app)
+
+        return app
+
+    # --------------------------------------------------------------------------
+    #
+    def terminate(self):
+        """Close this service endpoint
+
+          - close all sessions for all users (which frees all pilots)
+          - stop listening on the service port
+        """
+        # stop serving requests
+        super().terminate()
+
+        # drop all pre-initialized sessions
+        self._pool.close()
+
+        # the open sessions are interrupted, not closed: keep them journaled
+        # for the next start
+        if self._journal:
+            self._journal.close()
+
+        # close all open sessions
+        sessions = list()
+        with self._lock:
+            for user in self._accounts:
+                sessions.extend(self._accounts[user]['sessions'].values())
+                self._accounts[user]['sessions'] = {}
+
+        for session in sessions:
+            try   : session.close()
+            except: pass
+
+    # --------------------------------------------------------------------------
+    #
+    def _close_sessions(self, account):
+
+        with self._lock:
+            sessions = account['sessions']
+            account['sessions'] = dict()
+
+        for sid, session in sessions.items():
+            self._journal_close(account['username'], sid, session)
+            session.close()
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_session(self, account, sid):
+        '''
+        Check if a session exists and return it
+        '''
+
+        with self._lock:
+            if sid not in account['sessions']:
+                raise ValueError('session %s does not exist' % sid)
+
+            return account['sessions'][sid]
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/', method='PUT')
+    def sessions_create(self, sid):
+        '''
+        For any user (login), several `sessions` can coexist.  A session is here
+        defined as a set of pilot resources and tasks.  A `PUT` on this route
+        will create such a session.  The optional request body can set the
+        output staging policy of the session (`{'stage_output': 'lazy'}`, see
+        `Provider.set_stage_output`).
+
+        The call will raise an error if the session exists.
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+            data    = self._get_data(bottle.request) or {}
+            policy  = data.get('stage_output')
+
+            if policy and policy not in Provider.STAGE_OUTPUT:
+                raise ValueError('invalid output staging policy %s' % policy)
+
+            with self._lock:
+                if sid in account['sessions']:
+                    raise ValueError('session %s exists' %  sid)
+
+            # session creation can be slow (on pool misses) - don't block other
+            # requests meanwhile
+            session = self._pool.get()
+            if policy:
+                session.set_stage_output(policy)
+
+            with self._lock:
+                if sid in account['sessions']:
+                    session.close()
+                    raise ValueError('session %s exists' %  sid)
+                account['sessions'][sid] = session
+
+            self._journal_open(account['username'], sid, session)
+
+            return {'success' : True,
+                    'result'  : None}
+
+        except Exception as e:
+            self._log.exception('session creation failed')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/status/', method='GET')
+    def status(self):
+        '''
+        Return service statistics, for example the hit and miss rates and
+        instance initialization times of the session pool, the hit and miss
+        counts of the task output cache, and the backlog of the session
+        journal.
+        '''
+
+        try:
+            self._check_cookie(bottle.request)
+
+            result = {'pool'   : self._pool.stats(),
+                      'outputs': get_output_cache().stats()}
+            if self._journal:
+                result['journal'] = self._journal.stats()
+
+            return {'success' : True,
+                    'result'  : result}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/metrics', method='GET')
+    def metrics(self):
+        '''
+        Return service metrics in the Prometheus text format: request counts,
+        errors and latencies per route, the number of submitted pilots and
+        tasks, and per account the number of sessions, of pilots and tasks per
+        state, and of unresolved wait tickets.  All numbers are maintained
+        incrementally, a scrape does not inspect individual pilots or tasks.
+
+        Scrapers authenticate with the token `RADICAL_PI_METRICS_TOKEN`, and
+        see all accounts.  Requests authenticated as a user only see the
+        per-account metrics of that user (see `_check_metrics_token`).
+        '''
+
+        account = self._check_metrics_token(bottle.request)
+        only    = None
+
+        with self._lock:
+            if account:
+                only     = {'account': account['username']}
+                sessions = {account['username']:
+                            list(account['sessions'].values())}
+            else:
+                sessions = {user: list(acct['sessions'].values())
+                            for user, acct in self._accounts.items()}
+
+        g_sess    = Gauge('radical_pi_sessions', 'number of open sessions',
+                          ['account'])
+        g_pilots  = Gauge('radical_pi_pilots', 'number of pilots per state',
+                          ['account', 'state'])
+        g_tasks   = Gauge('radical_pi_tasks', 'number of tasks per state',
+                          ['account', 'state'])
+        g_tickets = Gauge('radical_pi_wait_tickets',
+                          'number of unresolved wait tickets', ['account'])
+        g_pool    = Gauge('radical_pi_pool_sessions',
+                          'number of pre-initialized sessions ready', [])
+
+        for user, user_sessions in sessions.items():
+
+            pilots  = dict()
+            tasks   = dict()
+            tickets = 0
+
+            for session in user_sessions:
+                stats    = session.stats()
+                tickets += stats['tickets']
+                for state, n in stats['pilot'].items():
+                    pilots[state] = pilots.get(state, 0) + n
+                for state, n in stats['task'].items():
+                    tasks[state] = tasks.get(state, 0) + n
+
+            g_sess.set((user,), len(user_sessions))
+            g_tickets.set((user,), tickets)
+            for state, n in pilots.items():
+                g_pilots.set((user, state), n)
+            for state, n in tasks.items():
+                g_tasks.set((user, state), n)
+
+        g_pool.set((), self._pool.stats()['ready'])
+
+        outputs   = get_output_cache().stats()
+        c_outputs = Counter('radical_pi_output_cache_total',
+                            'task output cache lookups', ['result'])
+        g_outputs = Gauge('radical_pi_output_cache_bytes',
+                          'size of the cached task output', [])
+        c_outputs.inc(('hit',),  outputs['hits'])
+        c_outputs.inc(('miss',), outputs['misses'])
+        g_outputs.set((), outputs['bytes'])
+
+        bottle.response.content_type = METRICS_TYPE
+        return self._metrics.render([g_sess, g_pilots, g_tasks, g_tickets,
+                                     g_pool, c_outputs, g_outputs], only)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/', method='GET')
+    def sessions_inspect(self):
+        '''
+        List all known session IDs for the current user
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+
+            with self._lock:
+                sids = list(account['sessions'].keys())
+
+            return {'success' : True,
+                    'result'  : sids}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/',       method='DELETE')
+    @methodroute('/sessions/<sid>/', method='DELETE')
+    def sessions_close(self, sid=None):
+        '''
+        Close the session identified by `sid`.  This will terminate all pilots
+        and tasks started in this session.  If no SID is given, close all
+        sessions for this user.
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+
+            with self._lock:
+                if sid:
+                    # delete session with given ID
+                    if sid not in account['sessions']:
+                        raise ValueError('session %s does not exist' % sid)
+                    sessions = {sid: account['sessions'].pop(sid)}
 
-            # close all sessions for this user
-            for sid in account['sessions']:
-                account['sessions'][sid].close()
+                else:
+                    # delete all of them
+                    sessions = account['sessions']
+                    account['sessions'] = dict()
 
-            account['sessions'] = dict()
+            for sid, session in sessions.items():
+                self._journal_close(account['username'], sid, session)
+                session.close()
 
             return {'success' : True,
                     'result'  : None}
 
         except Exception as e:
-            self._log.exception('logout failed')
+            self._log.exception('oops')
             return {'success' : False,
                     'error'   : repr(e)}
 
 
     # --------------------------------------------------------------------------
     #
-    @methodroute('/sessions/<sid>/', method='PUT')
-    def sessions_create(self, sid):
+    @methodroute('/sessions/<sid>/summary', method='GET')
+    def sessions_summary(self, sid):
         '''
-        For any user (login), several `sessions` can coexist.  A session is here
-        defined as a set of pilot resources and tasks.  A `PUT` on this route
-        will create such a session.
-
-        The call will raise an error if the session exists.
+        Return a summary of the session: the number of pilots and tasks per
+        state, the number of tasks per pilot and state, and the task submission
+        and completion rates (tasks/s) over the last 10, 60 and 300 seconds.
+        The summary is served from counters maintained by the state callbacks,
+        so that its cost does not depend on the number of tasks.
         '''
 
         try:
             account = self._check_cookie(bottle.request)
-
-            if sid in account['sessions']:
-                raise ValueError('session %s exists' %  sid)
-
-            session = PilotClient(self._rep, self._log, self._prof)
-            account['sessions'][sid] = session
+            session = self._get_session(account, sid)
 
             return {'success' : True,
-                    'result'  : None}
+                    'result'  : session.summary()}
 
         except Exception as e:
-            self._log.exception('session creation failed')
+            self._log.exception('oops')
             return {'success' : False,
                     'error'   : repr(e)}
 
 
     # --------------------------------------------------------------------------
     #
-    @methodroute('/sessions/', method='GET')
-    def sessions_inspect(self):
+    def _inspect_args(self, request):
         '''
-        List all known session IDs for the current user
+        Parse the query parameters of the inspect routes:
+
+            uids  : comma separated list of UIDs to inspect
+            state : comma separated list of states to filter for
+            prefix: only inspect UIDs with that prefix
+            fields: comma separated list of fields to return per entity
+            limit : page size
+            cursor: continue after the previous page
+            since : only return entities which changed state after this
+                    sequence number
+
+        If `limit`, `cursor` or `since` are given, the result is a page of the
+        form `{'items': [...], 'cursor': <cursor for the next page or None>}`,
+        with `since` it also contains the current sequence number as `seq`.
+        Filtering and projection happen before entities are serialized.
+        Invalid queries (a `limit` below 1, unknown `fields`) are rejected
+        with `400 Bad Request`.
         '''
 
-        try:
-            account = self._check_cookie(bottle.request)
+        def _list(val):
+            return [v for v in val.split(',') if v] or None
 
-            return {'success' : True,
-                    'result'  : list(account['sessions'].keys())}
+        with _timing().phase('parse'):
 
-        except Exception as e:
-            self._log.exception('oops')
-            return {'success' : False,
-                    'error'   : repr(e)}
+            query = request.query
+            limit = query.get('limit')
+            since = query.get('since')
+
+            try:
+                limit = int(limit) if limit else None
+                since = int(since) if since else None
+            except ValueError as e:
+                raise QueryError(str(e)) from e
+
+            if limit is not None and limit < 1:
+                raise QueryError('invalid limit %d' % limit)
+
+            return {'uids'  : _list(query.get('uids',   '')),
+                    'states': _list(query.get('state',  '')),
+                    'prefix': query.get('prefix') or None,
+                    'fields': _list(query.get('fields', '')),
+                    'limit' : limit,
+                    'cursor': query.get('cursor') or None,
+                    'since' : since}
 
 
     # --------------------------------------------------------------------------
     #
-    @methodroute('/sessions/',       method='DELETE')
-    @methodroute('/sessions/<sid>/', method='DELETE')
-    def sessions_close(self, sid=None):
+    def _check_etag(self, session, kind, request):
         '''
-        Close the session identified by `sid`.  This will terminate all pilots
-        and tasks started in this session.  If no SID is given, close all
-        sessions for this user.
+        Conditional GET support for the inspect routes: return the entity tag
+        for the current version of the session's pilot or task collection
+        (which changes with every state transition), combined with the
+        request's path, query and negotiated codec.  If the request's
+        `If-None-Match` header matches that tag, raise a `304 Not Modified`
+        response - the entities are then not serialized at all.  The tag is
+        weak, as it does not depend on the content encoding.
+
+        Returns `None` for requests with a body (which are not tagged).
         '''
 
-        try:
-            account = self._check_cookie(bottle.request)
+        if request.content_length > 0:
+            return None
 
-            if sid:
-                # delete session with given ID
-                if sid not in account['sessions']:
-                    raise ValueError('session %s does not exist' % sid)
-                account['sessions'][sid].close()
-                del(account['sessions'][sid])
+        codec = negotiate(request.headers.get('Accept'))
+        key   = '%s %s?%s %s' % (session.uid, request.path,
+                                 request.query_string, codec.name)
+        tag   = '"%s-%d-%08x"' % (kind, session.version(kind),
+                                  zlib.crc32(key.encode()))
 
-            else:
-                # delete all of them
-                for sid in account['sessions']:
-                    account['sessions'][sid].close()
-                account['sessions'] = dict()
+        # the tag is weak: the identity, gzip and zstd encodings of the body
+        # share it, but are not byte identical
+        etag  = 'W/' + tag
 
-            return {'success' : True,
-                    'result'  : None}
+        match = request.headers.get('If-None-Match')
+        if match:
+            tags = [t.strip() for t in match.split(',')]
+            if tag in tags or etag in tags or '*' in tags:
+                raise bottle.HTTPResponse(status=304,
+                                          headers={'ETag': etag,
+                                                   'Vary': ETAG_VARY})
 
-        except Exception as e:
-            self._log.exception('oops')
-            return {'success' : False,
-                    'error'   : repr(e)}
+        return etag
 
 
     # --------------------------------------------------------------------------
@@ -364,9 +1567,11 @@ class PIServer:
         try:
             account     = self._check_cookie(bottle.request)
             session     = self._get_session(account, sid)
-            pilot_desc  = json.loads(bottle.request.body.read())
+            pilot_desc  = self._get_data(bottle.request)
             pilot_uids  = session.submit(pilot_desc)
 
+            self._m_subs.inc((account['username'], 'pilot'), len(pilot_uids))
+
             return {'success' : True,
                     'result'  : pilot_uids}
 
@@ -382,25 +1587,41 @@ class PIServer:
     @methodroute('/sessions/<sid>/pilots/',       method='GET')
     def pilots_inspect(self, sid, pid=None):
         '''
-        This method will inspect one or multiple pilots, returning no
+        This method will inspect one or multiple pilots, returning a list of
+        pilot dicts.  The query parameters described in `_inspect_args` filter,
+        page and project the result.  Conditional requests are supported (see
+        `_check_etag`).
         '''
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
+            etag    = self._check_etag(session, 'pilot', bottle.request)
+            kwargs  = self._inspect_args(bottle.request)
+            uids    = kwargs.pop('uids')
 
-            pids = ru.as_list(pid)
+            pids = ru.as_list(pid) or uids
             if not pids:
-                request_data = bottle.request.body.read()
-                if request_data:
-                    data = json.loads(request_data)
+                data = self._get_data(bottle.request)
+                if data:
                     pids = data.get('pids')
 
-            pilot_desc = session.inspect(pids)
+            pilot_desc = session.inspect(pids, **kwargs)
+
+            if etag:
+                bottle.response.set_header('ETag', etag)
+                bottle.response.set_header('Vary', ETAG_VARY)
+                bottle.response.set_header('Cache-Control', 'no-cache')
 
             return {'success' : True,
                     'result'  : pilot_desc}
 
+        except bottle.HTTPResponse:
+            raise
+
+        except QueryError as e:
+            raise bottle.HTTPError(400, str(e)) from e
+
         except Exception as e:
             self._log.exception('oops')
             return {'success' : False,
@@ -412,11 +1633,16 @@ class PIServer:
     @methodroute('/sessions/<sid>/pilots/<pid>/', method='POST')
     @methodroute('/sessions/<sid>/pilots/',       method='POST')
     def pilots_wait(self, sid, pid=None):
+        '''
+        Wait for pilots to reach any of the given states.  If the json data
+        contain `'async': True`, the call returns a wait ticket ID immediately,
+        which can be checked via `/sessions/<sid>/waits/<wid>/`.
+        '''
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
-            data    = json.loads(bottle.request.body.read())
+            data    = self._get_data(bottle.request)
 
             if pid:
                 pids = [pid]
@@ -426,7 +1652,10 @@ class PIServer:
             states  = data.get('states')
             timeout = data.get('timeout')
 
-            pilot_states  = session.wait(pids, states, timeout)
+            if data.get('async'):
+                pilot_states = session.wait_ticket(pids, states)
+            else:
+                pilot_states = session.wait(pids, states, timeout)
 
         except Exception as e:
             self._log.exception('oops')
@@ -439,13 +1668,18 @@ class PIServer:
 
     # --------------------------------------------------------------------------
     #
-    @methodroute('/sessions/<sid>/pilots/<pids>', method='DELETE')
-    @methodroute('/sessions/<sid>/pilots/',       method='DELETE')
+    @methodroute('/sessions/<sid>/pilots/<pids>/', method='DELETE')
+    @methodroute('/sessions/<sid>/pilots/<pids>',  method='DELETE')
+    @methodroute('/sessions/<sid>/pilots/',        method='DELETE')
     def pilots_cancel(self, sid, pids=None):
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
+            data    = self._get_data(bottle.request) or {}
+
+            if pids: pids = [pids]
+            else   : pids = data.get('pids')
 
             pilot_states  = session.cancel(pids)
 
@@ -465,14 +1699,37 @@ class PIServer:
     #
     @methodroute('/sessions/<sid>/tasks/', method='PUT')
     def tasks_submit(self, sid):
+        '''
+        Submit a list of task descriptions (json data).  The result is the list
+        of task UIDs.
+
+        With content type `application/x-ndjson`, the body is parsed as one
+        task description per line, and the descriptions are submitted in
+        batches (query parameter `batch`, default: 1024), so that they are
+        never all held in memory.  The body is received completely (and
+        spooled to disk if large) before the first batch is submitted.  The
+        response streams one `{'uids': [...]}` line per submitted batch, and
+        a final `{'success': True, 'result': <count>}` (or `{'success': False,
+        'error': ...}`) line.
+        '''
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
 
-            task_desc = json.loads(bottle.request.body.read())
+            if bottle.request.content_type.startswith('application/x-ndjson'):
+
+                batch = int(bottle.request.query.get('batch', 1024))
+                body  = bottle.request.body
+
+                bottle.response.content_type = 'application/x-ndjson'
+                return self._stream_submit(account, session, body, batch)
+
+            task_desc = self._get_data(bottle.request)
             task_uids = session.submit_tasks(task_desc)
 
+            self._m_subs.inc((account['username'], 'task'), len(task_uids))
+
             return {'success' : True,
                     'result'  : task_uids}
 
@@ -482,24 +1739,74 @@ class PIServer:
                     'error'   : repr(e)}
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _stream_submit(self, account, session, body, batch):
+
+        def _descriptions():
+            for line in body:
+                line = line.strip()
+                if line:
+                    yield JSON.decode(line)
+
+        count = 0
+        try:
+            for uids in session.submit_tasks_iter(_descriptions(), batch):
+                count += len(uids)
+                self._m_subs.inc((account['username'], 'task'), len(uids))
+                yield JSON.encode({'uids': uids}) + b'\n'
+
+            yield JSON.encode({'success': True,
+                               'result' : count}) + b'\n'
+
+        except Exception as e:
+            self._log.exception('oops')
+            yield JSON.encode({'success': False,
+                               'error'  : repr(e)}) + b'\n'
+
+        finally:
+            # large bodies are spooled to a temporary file
+            body.close()
+
+
     # --------------------------------------------------------------------------
     #
     @methodroute('/sessions/<sid>/tasks/<tid>/', method='GET')
     @methodroute('/sessions/<sid>/tasks/',       method='GET')
     def tasks_inspect(self, sid, tid=None):
+        '''
+        This method will inspect one or multiple tasks, returning a list of
+        task dicts.  The query parameters described in `_inspect_args` filter,
+        page and project the result.  Conditional requests are supported (see
+        `_check_etag`).
+        '''
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
+            etag    = self._check_etag(session, 'task', bottle.request)
 
-            tids = ru.as_list(tid)
+            kwargs  = self._inspect_args(bottle.request)
+            uids    = kwargs.pop('uids')
+
+            tids = ru.as_list(tid) or uids
             if not tids:
-                request_data = bottle.request.body.read()
-                if request_data:
-                    data = json.loads(request_data)
+                data = self._get_data(bottle.request)
+                if data:
                     tids = data.get('tids')
 
-            task_desc = session.inspect_tasks(tids)
+            task_desc = session.inspect_tasks(tids, **kwargs)
+
+            if etag:
+                bottle.response.set_header('ETag', etag)
+                bottle.response.set_header('Vary', ETAG_VARY)
+                bottle.response.set_header('Cache-Control', 'no-cache')
+
+        except bottle.HTTPResponse:
+            raise
+
+        except QueryError as e:
+            raise bottle.HTTPError(400, str(e)) from e
 
         except Exception as e:
             self._log.exception('oops')
@@ -510,15 +1817,86 @@ class PIServer:
                 'result': task_desc}
 
 
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def _want_raw(request):
+
+        if request.headers.get('Range'):
+            return True
+
+        query = request.query
+        if query.get('offset') or query.get('tail') or query.get('follow'):
+            return True
+
+        accept = request.headers.get('Accept', '')
+        return 'text/plain'               in accept or \
+               'application/octet-stream' in accept
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _stream_output(self, session, tid, ftype):
+        '''
+        Stream task output as raw bytes, without loading it into memory.  The
+        response supports HTTP `Range` requests (served via `sendfile` where
+        the server supports it), and the query parameters
+
+            offset: start at this byte offset
+            tail  : only return the last `tail` lines
+            follow: keep streaming while the output grows, until the task is
+                    final (`follow=1`)
+        '''
+
+        query  = bottle.request.query
+        offset = query.get('offset')
+        tail   = query.get('tail')
+        follow = query.get('follow') in ['1', 'true', 'True']
+
+        if follow:
+            # output which is staged on demand is staged once the task is
+            # final (see `Provider.follow_output`)
+            fname, done = session.follow_output(tid, ftype)
+        else:
+            fname = session.get_output_path(tid, ftype)
+
+        if not (offset or tail or follow):
+            # bottle handles `Range`, `If-Modified-Since` and file wrappers
+            return bottle.static_file(os.path.basename(fname),
+                                      root=os.path.dirname(fname),
+                                      mimetype='text/plain')
+
+        start = 0
+        if offset:
+            start = int(offset)
+        elif tail and os.path.isfile(fname):
+            start = tail_offset(fname, int(tail))
+
+        bottle.response.content_type = 'text/plain; charset=UTF-8'
+        bottle.response.set_header('Cache-Control', 'no-cache')
+
+        if follow:
+            return follow_file(fname, start, done)
+
+        return iter_file(fname, start)
+
+
     # --------------------------------------------------------------------------
     #
     @methodroute('/sessions/<sid>/tasks/<tid>/stdout', method='GET')
     def tasks_stdout(self, sid, tid):
+        '''
+        Return the stdout of a task as json string, or stream it raw (see
+        `_stream_output`).
+        '''
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
 
+            if self._want_raw(bottle.request):
+                return self._stream_output(session, tid, 'out')
+
             task_stdout  = session.tasks_stdout(tid)
 
             return {'success' : True,
@@ -534,11 +1912,18 @@ class PIServer:
     #
     @methodroute('/sessions/<sid>/tasks/<tid>/stderr', method='GET')
     def tasks_stderr(self, sid, tid):
+        '''
+        Return the stderr of a task as json string, or stream it raw (see
+        `_stream_output`).
+        '''
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
 
+            if self._want_raw(bottle.request):
+                return self._stream_output(session, tid, 'err')
+
             task_stderr  = session.tasks_stderr(tid)
 
             return {'success' : True,
@@ -552,23 +1937,34 @@ class PIServer:
 
     # --------------------------------------------------------------------------
     #
-    @methodroute('/sessions/<sid>/tasks/<task_id>/', method='POST')
-    @methodroute('/sessions/<sid>/tasks/',           method='POST')
+    @methodroute('/sessions/<sid>/tasks/<tid>/', method='POST')
+    @methodroute('/sessions/<sid>/tasks/',       method='POST')
     def tasks_wait(self, sid, tid=None):
+        '''
+        Wait for tasks to reach any of the given states.  If the json data
+        contain `'async': True`, the call returns a wait ticket ID immediately,
+        which can be checked via `/sessions/<sid>/waits/<wid>/`.  With
+        `'count': n`, the wait returns as soon as `n` of the tasks reached
+        those states.
+        '''
 
         try:
             account = self._check_cookie(bottle.request)
             session = self._get_session(account, sid)
 
-            if tid: tids = [tid]
-            else  : tids = None
+            data    = self._get_data(bottle.request)
 
-            data    = json.loads(bottle.request.body.read())
+            if tid: tids = [tid]
+            else  : tids = data.get('tids')
 
             states  = data.get('states')
             timeout = data.get('timeout')
+            count   = data.get('count')
 
-            task_states  = session.wait_tasks(tids, states, timeout)
+            if data.get('async'):
+                task_states = session.wait_tasks_ticket(tids, states, count)
+            else:
+                task_states = session.wait_tasks(tids, states, timeout, count)
 
             return {'success' : True,
                     'result'  : task_states}
@@ -578,5 +1974,238 @@ class PIServer:
             return {'success' : False,
                     'error'   : repr(e)}
 
-# ------------------------------------------------------------------------------
 
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/taskmanager/', method='PUT')
+    def task_manager_open(self, sid):
+        '''
+        Prepare the session for task execution ahead of the first submission
+        (e.g., start the `radical.pilot` task manager).  The task manager stays
+        open across submissions and waits until it is closed explicitly, or
+        the session is closed.
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+            session = self._get_session(account, sid)
+
+            session.open_task_manager()
+
+            return {'success' : True,
+                    'result'  : None}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/taskmanager/', method='DELETE')
+    def task_manager_close(self, sid):
+        '''
+        Release the task manager of the session - tasks which are not final
+        yet are canceled.  The next submission opens a new one.
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+            session = self._get_session(account, sid)
+
+            session.close_task_manager()
+
+            return {'success' : True,
+                    'result'  : None}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/tasks/<tid>/', method='DELETE')
+    @methodroute('/sessions/<sid>/tasks/',       method='DELETE')
+    def tasks_cancel(self, sid, tid=None):
+        '''
+        Cancel the given tasks (json data `{'tids': [...]}`, default: all
+        tasks), and return their states.
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+            session = self._get_session(account, sid)
+            data    = self._get_data(bottle.request) or {}
+
+            if tid: tids = [tid]
+            else  : tids = data.get('tids')
+
+            return {'success' : True,
+                    'result'  : session.cancel_tasks(tids)}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    # Wait tickets
+    #
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/waits/<wid>/', method='GET')
+    @methodroute('/sessions/<sid>/waits/',       method='GET')
+    def waits_check(self, sid, wid=None):
+        '''
+        Return the status of the given wait tickets (`wid` or the query
+        parameter `wids` as comma separated list).  If none of them is resolved,
+        this long-polls for up to `timeout` seconds (query parameter, default:
+        0, capped at `WAIT_POLL_MAX`) for any of them to resolve.  The result
+        is a list of dicts of the form:
+
+            {
+                'wid'   : 'wait.000001',
+                'done'  : True,
+                'result': ['DONE', 'FAILED']
+            }
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+            session = self._get_session(account, sid)
+
+            if wid: wids = [wid]
+            else  : wids = bottle.request.query.get('wids', '').split(',')
+
+            wids    = [w for w in wids if w]
+            timeout = float(bottle.request.query.get('timeout', 0))
+
+            if timeout < 0 or timeout > WAIT_POLL_MAX:
+                timeout = WAIT_POLL_MAX
+
+            tickets = session.check_tickets(wids, timeout)
+
+            return {'success' : True,
+                    'result'  : tickets}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/waits/<wid>/', method='DELETE')
+    def waits_release(self, sid, wid):
+        '''
+        Release a (resolved or pending) wait ticket.
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+            session = self._get_session(account, sid)
+
+            session.release_ticket(wid)
+
+            return {'success' : True,
+                    'result'  : None}
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    # Events
+    #
+    # --------------------------------------------------------------------------
+    #
+    @methodroute('/sessions/<sid>/events', method='GET')
+    def events(self, sid):
+        '''
+        Stream the pilot and task state transitions of a session.  Each record
+        is a batch of events of the form
+
+            {
+                'seq'  : 42,
+                'kind' : 'task',
+                'uid'  : 'task.000001',
+                'state': 'DONE',
+                'time' : 1655000000.0
+            }
+
+        The stream is sent as Server-Sent Events if the `Accept` header asks for
+        `text/event-stream`, and as newline delimited JSON otherwise (one
+        `{'events': [...], 'gap': False}` record per line).  Query parameters:
+
+            since    : resume after this sequence number (default: 0, for SSE
+                       the `Last-Event-ID` header is honored as well)
+            batch    : max number of events per record (default: 1000)
+            keepalive: seconds between heartbeat records (default: 15)
+
+        `gap` is set if events were dropped from the session's event log before
+        they could be delivered.  The stream ends when the session is closed.
+        '''
+
+        try:
+            account = self._check_cookie(bottle.request)
+            session = self._get_session(account, sid)
+            query   = bottle.request.query
+
+            sse     = 'text/event-stream' in bottle.request.headers.get(
+                                                                  'Accept', '')
+            since   = query.get('since') or \
+                      bottle.request.headers.get('Last-Event-ID') or 0
+            since   = int(since)
+            batch   = int(query.get('batch', 1000))
+            alive   = float(query.get('keepalive', 15))
+
+            if sse: ctype = 'text/event-stream'
+            else  : ctype = 'application/x-ndjson'
+
+            bottle.response.content_type = ctype
+            bottle.response.set_header('Cache-Control', 'no-cache')
+            bottle.response.set_header('X-Accel-Buffering', 'no')
+
+            return self._stream_events(session, since, batch, alive, sse)
+
+        except Exception as e:
+            self._log.exception('oops')
+            return {'success' : False,
+                    'error'   : repr(e)}
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _stream_events(self, session, since, batch, keepalive, sse):
+
+        while True:
+
+            events, gap = session.get_events(since, batch, keepalive)
+
+            if events:
+                since = events[-1]['seq']
+
+            elif session.closed:
+                break
+
+            data = JSON.encode({'events': events, 'gap': gap})
+
+            if not sse:
+                yield data + b'\n'
+
+            elif events:
+                yield b'id: %d\nevent: states\ndata: %s\n\n' % (since, data)
+
+            else:
+                yield b': keepalive\n\n'
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,105 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import os
+import time
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+# ------------------------------------------------------------------------------
+#
+def tail_offset(fname, lines):
+    '''
+    return the byte offset of the last `lines` lines in the given file, reading
+    the file backwards in chunks
+    '''
+
+    with open(fname, 'rb') as fd:
+
+        pos = fd.seek(0, os.SEEK_END)
+        if not pos or lines <= 0:
+            return pos
+
+        # a trailing newline does not start a new line
+        fd.seek(pos - 1)
+        if fd.read(1) == b'\n':
+            lines += 1
+
+        while pos > 0:
+
+            size = min(CHUNK_SIZE, pos)
+            pos -= size
+
+            fd.seek(pos)
+            chunk = fd.read(size)
+            idx   = len(chunk)
+
+            while True:
+                idx = chunk.rfind(b'\n', 0, idx)
+                if idx < 0:
+                    break
+                lines -= 1
+                if not lines:
+                    return pos + idx + 1
+
+    return 0
+
+
+# ------------------------------------------------------------------------------
+#
+def iter_file(fname, start=0, end=None, chunk_size=CHUNK_SIZE):
+    '''
+    iterate over the bytes of the given file from `start` to `end` (exclusive,
+    default: end of file) in chunks of up to `chunk_size` bytes
+    '''
+
+    with open(fname, 'rb') as fd:
+
+        fd.seek(start)
+        remaining = None if end is None else end - start
+
+        while remaining is None or remaining > 0:
+
+            size = chunk_size
+            if remaining is not None:
+                size = min(size, remaining)
+                remaining -= size
+
+            chunk = fd.read(size)
+            if not chunk:
+                break
+
+            yield chunk
+
+
+# ------------------------------------------------------------------------------
+#
+def follow_file(fname, start=0, done=None, poll=0.5, chunk_size=CHUNK_SIZE):
+    '''
+    iterate over the bytes of a file which is still being written to, from
+    offset `start` onwards.  If the file does not yet exist, wait for it to
+    appear.  Iteration ends once `done()` returns `True` and all data written
+    so far are consumed.
+    '''
+
+    pos = start
+    while True:
+
+        # evaluate `done` *before* reading, so that no data written before
+        # completion are missed
+        finished = done() if done else False
+
+        if os.path.isfile(fname):
+            for chunk in iter_file(fname, pos, chunk_size=chunk_size):
+                pos += len(chunk)
+                yield chunk
+
+        if finished:
+            break
+
+        time.sleep(poll)
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,210 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import time
+
+import threading as mt
+
+from concurrent.futures import Future
+
+from .codec import JSON
+
+
+# ------------------------------------------------------------------------------
+#
+class TaskSubmitter:
+    """Client side buffer which coalesces task submissions into bulk requests.
+
+    `submit()` adds task descriptions to the buffer and returns futures which
+    resolve to the task UIDs.  A background thread sends the buffered
+    descriptions with a single `tasks_submit` call once
+
+      - `max_count` descriptions are buffered, or
+      - their (json encoded) size exceeds `max_bytes`, or
+      - the oldest buffered description waited for `linger` seconds.
+
+    `flush()` sends the buffer immediately and waits for completion, `close()`
+    flushes and stops the background thread.  If a bulk request fails, the
+    futures of all descriptions in that request raise the error.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, pi, sid, max_count=1024, max_bytes=4 * 1024 * 1024,
+                       linger=0.05):
+
+        self._pi        = pi
+        self._sid       = sid
+        self._max_count = max_count
+        self._max_bytes = max_bytes
+        self._linger    = linger
+
+        self._cond      = mt.Condition()
+        self._buffer    = list()     # [(description, future, size), ...]
+        self._bytes     = 0
+        self._first     = None       # time the oldest description was added
+        self._queued    = 0          # number of descriptions ever buffered
+        self._sent      = 0          # number of descriptions ever sent
+        self._flush     = False
+        self._closed    = False
+
+        self._thread    = mt.Thread(target=self._work, name='pi.submitter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # --------------------------------------------------------------------------
+    #
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # --------------------------------------------------------------------------
+    #
+    def submit(self, descriptions):
+        """
+        buffer a task description (or a list of them) for submission, and
+        return a future (or list of futures) resolving to the task UID(s)
+        """
+
+        single = isinstance(descriptions, dict)
+        if single:
+            descriptions = [descriptions]
+
+        futures = list()
+        with self._cond:
+
+            if self._closed:
+                raise RuntimeError('submitter is closed')
+
+            for descr in descriptions:
+                future = Future()
+                size   = len(JSON.encode(descr)) if self._max_bytes else 0
+                futures.append(future)
+                self._buffer.append((descr, future, size))
+                self._bytes += size
+
+            if self._first is None:
+                self._first = time.time()
+
+            self._queued += len(futures)
+            self._cond.notify_all()
+
+        if single:
+            return futures[0]
+        return futures
+
+    # --------------------------------------------------------------------------
+    #
+    def flush(self, timeout=None):
+        """
+        send all buffered descriptions now, and wait until they are submitted
+        """
+
+        with self._cond:
+            target      = self._queued
+            self._flush = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._sent >= target, timeout)
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        """
+        flush the buffer and stop the background thread
+        """
+
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+
+        self._thread.join()
+
+    # --------------------------------------------------------------------------
+    #
+    def _ready(self):
+
+        if not self._buffer:
+            return False
+
+        return self._flush                               or \
+               self._closed                              or \
+               len(self._buffer) >= self._max_count      or \
+               (self._max_bytes and
+                self._bytes >= self._max_bytes)          or \
+               time.time() - self._first >= self._linger
+
+    # --------------------------------------------------------------------------
+    #
+    def _work(self):
+
+        while True:
+
+            with self._cond:
+
+                while not self._ready():
+
+                    if self._closed:
+                        return
+
+                    if self._buffer:
+                        timeout = self._first + self._linger - time.time()
+                    else:
+                        timeout = None
+
+                    self._cond.wait(timeout=timeout)
+
+                # cut a batch of at most `max_count` descriptions and (unless
+                # it's a single one) `max_bytes` bytes
+                count = 0
+                size  = 0
+                for _, _, dsize in self._buffer:
+                    if count >= self._max_count:
+                        break
+                    if count and self._max_bytes and \
+                            size + dsize > self._max_bytes:
+                        break
+                    count += 1
+                    size  += dsize
+
+                batch         = self._buffer[:count]
+                self._buffer  = self._buffer[count:]
+                self._bytes  -= size
+
+                if self._buffer:
+                    # keep the remainder sendable right away
+                    self._first = time.time() - self._linger
+                else:
+                    self._first = None
+                    self._flush = False
+
+            self._send(batch)
+
+            with self._cond:
+                self._sent += len(batch)
+                self._cond.notify_all()
+
+    # --------------------------------------------------------------------------
+    #
+    def _send(self, batch):
+
+        try:
+            uids = self._pi.tasks_submit(self._sid, [d for d, _, _ in batch])
+
+            if len(uids) != len(batch):
+                raise RuntimeError('got %d uids for %d tasks'
+                                   % (len(uids), len(batch)))
+
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), uid in zip(batch, uids):
+            future.set_result(uid)
+
+
+# ------------------------------------------------------------------------------
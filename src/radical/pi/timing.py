@@ -0,0 +1,130 @@
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import time
+
+from contextlib import contextmanager
+
+
+# phases reported in the `Server-Timing` header, in order
+PHASES = ['auth', 'parse', 'call', 'serialize', 'total']
+
+
+# ------------------------------------------------------------------------------
+#
+class Timing:
+    '''
+    Per-request record of the time spent in the phases of request handling.
+    Each phase is also recorded as `<phase>_start` / `<phase>_stop` profiler
+    events, with the request ID as `uid`.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, prof, rid, msg=None):
+
+        self._prof   = prof if prof and prof.enabled else None
+        self._rid    = rid
+        self._msg    = msg
+        self._start  = time.time()
+        self.phases  = dict()
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def rid(self):
+        return self._rid
+
+    # --------------------------------------------------------------------------
+    #
+    def event(self, name):
+        '''
+        record a single profiler event for this request
+        '''
+
+        if self._prof:
+            self._prof.prof(name, uid=self._rid, msg=self._msg)
+
+    # --------------------------------------------------------------------------
+    #
+    @contextmanager
+    def phase(self, name):
+        '''
+        context manager which accounts the enclosed code to the given phase
+        '''
+
+        self.event(name + '_start')
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + \
+                                time.time() - start
+            self.event(name + '_stop')
+
+    # --------------------------------------------------------------------------
+    #
+    def header(self):
+        '''
+        return the phases as `Server-Timing` header value (durations in ms).
+        Time which is not accounted to any other phase is reported as `call`.
+        '''
+
+        total  = time.time() - self._start
+        phases = dict(self.phases)
+        other  = sum(phases.values()) - phases.get('call', 0.0)
+
+        phases.setdefault('call', max(0.0, total - other))
+        phases['total'] = total
+
+        return ', '.join('%s;dur=%.3f' % (name, phases[name] * 1000)
+                         for name in PHASES if name in phases)
+
+
+# ------------------------------------------------------------------------------
+#
+@contextmanager
+def _nothing():
+    yield
+
+
+class NoTiming:
+    '''
+    stand-in for `Timing` outside of request handling
+    '''
+
+    phases = dict()
+
+    def event(self, name):
+        pass
+
+    def phase(self, name):
+        return _nothing()
+
+
+# ------------------------------------------------------------------------------
+#
+def parse_server_timing(header):
+    '''
+    parse a `Server-Timing` header into a dict `{name: seconds}`
+    '''
+
+    result = dict()
+    for metric in (header or '').split(','):
+
+        parts = [p.strip() for p in metric.split(';')]
+        if not parts[0]:
+            continue
+
+        result[parts[0]] = None
+        for param in parts[1:]:
+            if param.startswith('dur='):
+                try:
+                    result[parts[0]] = float(param[4:]) / 1000
+                except ValueError:
+                    pass
+
+    return result
+
+
+# ------------------------------------------------------------------------------
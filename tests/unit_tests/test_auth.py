@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+from unittest import TestCase, mock
+
+from radical.pi.auth import TokenCache
+
+
+# ------------------------------------------------------------------------------
+#
+class TokenCacheTestCase(TestCase):
+
+    # --------------------------------------------------------------------------
+    #
+    @mock.patch('radical.pi.auth.time')
+    def test_expiry(self, mocked_time):
+
+        mocked_time.time.return_value = 1000.0
+
+        cache = TokenCache(ttl=60)
+        token = cache.issue('alice')
+
+        self.assertNotEqual(token, cache.issue('alice'))
+        self.assertEqual(cache.check(token), 'alice')
+        self.assertIsNone(cache.check('nope'))
+        self.assertIsNone(cache.check(None))
+
+        mocked_time.time.return_value = 1060.0
+        self.assertEqual(cache.check(token), 'alice')
+
+        # expired tokens are dropped
+        mocked_time.time.return_value = 1060.1
+        self.assertIsNone(cache.check(token))
+        self.assertNotIn(token, cache._tokens)
+
+        # tokens issued later live longer
+        token = cache.issue('alice')
+        mocked_time.time.return_value = 1120.0
+        self.assertEqual(cache.check(token), 'alice')
+
+    # --------------------------------------------------------------------------
+    #
+    def test_size(self):
+
+        cache  = TokenCache(size=3)
+        tokens = [cache.issue('user.%d' % i) for i in range(5)]
+
+        # the oldest tokens are dropped
+        self.assertEqual([cache.check(t) for t in tokens],
+                         [None, None, 'user.2', 'user.3', 'user.4'])
+
+    # --------------------------------------------------------------------------
+    #
+    def test_revoke(self):
+
+        cache = TokenCache()
+        a1    = cache.issue('alice')
+        a2    = cache.issue('alice')
+        b1    = cache.issue('bob')
+
+        cache.revoke('alice')
+        cache.revoke('carol')
+
+        self.assertIsNone(cache.check(a1))
+        self.assertIsNone(cache.check(a2))
+        self.assertEqual(cache.check(b1), 'bob')
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    tc = TokenCacheTestCase()
+    tc.test_expiry()
+    tc.test_size()
+    tc.test_revoke()
+
+
+# ------------------------------------------------------------------------------
+
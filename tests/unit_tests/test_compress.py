@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import io
+import gzip
+
+from unittest import TestCase
+
+from radical.pi.compress import Compressor, encodings, _accepted
+
+
+# ------------------------------------------------------------------------------
+#
+def _app(environ, start_response):
+    '''
+    WSGI app which returns the request body (if any) or `QUERY_STRING` bytes
+    of the `PATH_INFO` content type, as buffered or streamed body
+    '''
+
+    size  = int(environ.get('QUERY_STRING') or 0)
+    path  = environ.get('PATH_INFO', '/json')
+    ctype = {'json'  : 'application/json',
+             'ndjson': 'application/x-ndjson',
+             'text'  : 'text/plain'}[path.split('/')[1]]
+
+    if environ.get('CONTENT_LENGTH'):
+        data = environ['wsgi.input'].read(int(environ['CONTENT_LENGTH']))
+    else:
+        data = b'x' * size
+
+    start_response('200 OK', [('Content-Type'  , ctype),
+                              ('Content-Length', str(len(data)))])
+
+    if path.endswith('/stream'):
+        return iter([data[:len(data) // 2], data[len(data) // 2:]])
+
+    return [data]
+
+
+# ------------------------------------------------------------------------------
+#
+class CompressTestCase(TestCase):
+
+    # --------------------------------------------------------------------------
+    #
+    def _call(self, path='/json', size=0, accept=None, body=None,
+                    encoding=None, threshold=1024):
+
+        environ = {'PATH_INFO'   : path,
+                   'QUERY_STRING': str(size),
+                   'wsgi.input'  : io.BytesIO(body or b'')}
+
+        if accept is not None:
+            environ['HTTP_ACCEPT_ENCODING'] = accept
+
+        if body is not None:
+            environ['CONTENT_LENGTH'] = str(len(body))
+
+        if encoding:
+            environ['HTTP_CONTENT_ENCODING'] = encoding
+
+        captured = dict()
+
+        def _start_response(status, headers, exc_info=None):
+            captured['status']  = status
+            captured['headers'] = dict(headers)
+
+        result = Compressor(_app, threshold=threshold)(environ,
+                                                       _start_response)
+        data   = b''.join(result)
+
+        return captured['status'], captured['headers'], data
+
+    # --------------------------------------------------------------------------
+    #
+    def test_accepted(self):
+
+        self.assertEqual(_accepted(''), set())
+        self.assertEqual(_accepted('gzip, deflate, br'),
+                         {'gzip', 'deflate', 'br'})
+        self.assertEqual(_accepted(' GZip ;q=0.5, zstd;q=0, identity'),
+                         {'gzip', 'identity'})
+        self.assertEqual(_accepted('gzip;q=x'), {'gzip'})
+
+    # --------------------------------------------------------------------------
+    #
+    def test_negotiation(self):
+
+        # no or unsupported encodings: body is passed through
+        for accept in [None, '', 'identity', 'br, deflate', 'gzip;q=0']:
+            _, headers, data = self._call(size=4096, accept=accept)
+            self.assertNotIn('Content-Encoding', headers)
+            self.assertEqual(data, b'x' * 4096)
+
+        # the preferred supported encoding is used
+        _, headers, _ = self._call(size=4096, accept='gzip, zstd')
+        self.assertEqual(headers['Content-Encoding'], encodings()[0])
+
+        _, headers, data = self._call(size=4096, accept='br, gzip')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(data), b'x' * 4096)
+
+        # compression can be disabled
+        _, headers, _ = self._call(size=4096, accept='gzip', threshold=-1)
+        self.assertNotIn('Content-Encoding', headers)
+
+    # --------------------------------------------------------------------------
+    #
+    def test_threshold(self):
+
+        # small and non-compressible responses are passed through
+        for path, size in [('/json', 1000), ('/json/stream', 1000),
+                           ('/text', 4096)]:
+            _, headers, data = self._call(path, size, accept='gzip')
+            self.assertNotIn('Content-Encoding', headers)
+            self.assertEqual(headers['Content-Length'], str(size))
+            self.assertEqual(data, b'x' * size)
+
+        # buffered bodies keep a (correct) `Content-Length`
+        _, headers, data = self._call('/json', 4096, accept='gzip')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Length'], str(len(data)))
+        self.assertLess(len(data), 4096)
+
+        # streamed bodies are compressed on the fly, without length
+        for path in ['/json/stream', '/ndjson/stream']:
+            _, headers, data = self._call(path, 4096, accept='gzip')
+            self.assertEqual(headers['Content-Encoding'], 'gzip')
+            self.assertNotIn('Content-Length', headers)
+            self.assertEqual(gzip.decompress(data), b'x' * 4096)
+
+    # --------------------------------------------------------------------------
+    #
+    def test_request_body(self):
+
+        body = b'{"a": 1}' * 1000
+
+        _, headers, data = self._call(body=gzip.compress(body),
+                                      encoding='gzip')
+        self.assertEqual(data, body)
+
+        _, headers, data = self._call(body=body, encoding='identity')
+        self.assertEqual(data, body)
+
+        status, _, _ = self._call(body=body, encoding='br')
+        self.assertEqual(status[:3], '415')
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    tc = CompressTestCase()
+    tc.test_accepted()
+    tc.test_negotiation()
+    tc.test_threshold()
+    tc.test_request_body()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from radical.pi.journal       import Journal
+from radical.pi.providers.sim import SimClient
+
+
+# ------------------------------------------------------------------------------
+#
+class JournalTestCase(TestCase):
+
+    # --------------------------------------------------------------------------
+    #
+    def setUp(self):
+
+        self._dir  = tempfile.mkdtemp(prefix='rpi.test.')
+        self._path = os.path.join(self._dir, 'journal.db')
+
+    def tearDown(self):
+
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    # --------------------------------------------------------------------------
+    #
+    def _write(self):
+
+        # the background commits must not be needed for correctness
+        journal = Journal(self._path, interval=100)
+
+        journal.session_opened('alice', 'a', 'sim.0000')
+        journal.session_opened('alice', 'b', 'sim.0001')
+        journal.session_opened('bob',   'a', 'sim.0002')
+
+        record = journal.recorder('alice', 'a')
+        record('pilot', 'pilot.0000', 'NEW')
+        record('pilot', 'pilot.0000', 'PMGR_ACTIVE')
+        record('task',  'task.000000', 'NEW')
+        record('task',  'task.000001', 'NEW')
+
+        self.assertTrue(journal.flush(timeout=10))
+
+        # coalesced with the previous transitions of the same task
+        record('task', 'task.000000', 'AGENT_EXECUTING')
+        record('task', 'task.000001', 'DONE')
+
+        record = journal.recorder('alice', 'b')
+        record('task', 'task.000000', 'DONE')
+        journal.session_closed('alice', 'b')
+
+        journal.recorder('bob', 'a')('task', 'task.000000', 'FAILED')
+
+        return journal
+
+    # --------------------------------------------------------------------------
+    #
+    def test_load(self):
+
+        journal = self._write()
+        journal.close()
+        journal.close()
+
+        journal  = Journal(self._path)
+        sessions = journal.load()
+        journal.close()
+
+        self.assertEqual(sessions, [
+            ('alice', 'a', 'sim.0000',
+             {'pilot': {'pilot.0000': 'PMGR_ACTIVE'},
+              'task' : {'task.000000': 'AGENT_EXECUTING',
+                        'task.000001': 'DONE'}}),
+            ('bob', 'a', 'sim.0002',
+             {'pilot': {},
+              'task' : {'task.000000': 'FAILED'}})])
+
+    # --------------------------------------------------------------------------
+    #
+    def test_stats(self):
+
+        journal = self._write()
+        self.assertTrue(journal.flush(timeout=10))
+
+        stats = journal.stats()
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['commits'], 2)
+
+        journal.close()
+
+    # --------------------------------------------------------------------------
+    #
+    def test_restore(self):
+
+        journal = self._write()
+        journal.close()
+
+        journal = Journal(self._path)
+        _, _, _, entities = journal.load()[0]
+        journal.close()
+
+        session = SimClient(startup=0.0, runtime=0.0)
+        try:
+            session.restore(entities['pilot'], entities['task'])
+
+            # execution ended with the previous instance
+            states = {t['uid']: t['state'] for t in session.inspect_tasks()}
+            self.assertEqual(states, {'task.000000': 'CANCELED',
+                                      'task.000001': 'DONE'})
+            self.assertEqual(session.inspect(fields=['uid', 'state']),
+                             [{'uid': 'pilot.0000', 'state': 'CANCELED'}])
+
+            # waits on restored tasks return at once
+            self.assertEqual(session.wait_tasks(timeout=0),
+                             ['CANCELED', 'DONE'])
+
+            # new pilots and tasks don't reuse restored IDs
+            pids = session.submit([{'resource': 'local.localhost'}])
+            self.assertEqual(pids, ['pilot.0001'])
+
+            tids = session.submit_tasks([{'executable': '/bin/date'}])
+            self.assertNotIn(tids[0], states)
+
+        finally:
+            session.close()
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    for name in ['test_load', 'test_stats', 'test_restore']:
+        tc = JournalTestCase()
+        tc.setUp()
+        try:
+            getattr(tc, name)()
+        finally:
+            tc.tearDown()
+
+
+# ------------------------------------------------------------------------------
+
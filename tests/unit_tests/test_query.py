@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+from unittest import TestCase
+
+from radical.pi.providers.base  import Entity
+from radical.pi.providers.query import Index, QueryError, select, project
+
+
+# ------------------------------------------------------------------------------
+#
+class QueryTestCase(TestCase):
+
+    # --------------------------------------------------------------------------
+    #
+    def setUp(self):
+
+        # 10 tasks, every third one is done
+        self._tasks = Index()
+        for i in range(10):
+            uid   = 'task.%04d' % i
+            state = 'DONE' if i % 3 == 0 else 'NEW'
+            self._tasks[uid] = Entity(uid, {'executable': '/bin/date'}, state)
+
+    # --------------------------------------------------------------------------
+    #
+    def _pages(self, limit, **kwargs):
+
+        uids, pages, cursor = list(), 0, None
+        while True:
+            items, cursor = select(self._tasks, limit=limit, cursor=cursor,
+                                   fields=['uid'], **kwargs)
+            uids  += [item['uid'] for item in items]
+            pages += 1
+            if cursor is None:
+                return uids, pages
+
+    # --------------------------------------------------------------------------
+    #
+    def test_index(self):
+
+        tasks = self._tasks
+        self.assertEqual(list(tasks.uids_from(8)), ['task.0008', 'task.0009'])
+        self.assertEqual(list(tasks.uids_from(10)), [])
+
+        # replacing an object keeps its position, `setdefault` only adds
+        entity = Entity('task.0001', None)
+        tasks['task.0001'] = entity
+        self.assertIs(tasks.setdefault('task.0001', None), entity)
+        self.assertEqual(list(tasks.uids_from(0))[:2],
+                         ['task.0000', 'task.0001'])
+
+        # iteration picks up objects which are added meanwhile
+        it = tasks.uids_from(9)
+        self.assertEqual(next(it), 'task.0009')
+        tasks.setdefault('task.0010', Entity('task.0010', None))
+        self.assertEqual(list(it), ['task.0010'])
+
+    # --------------------------------------------------------------------------
+    #
+    def test_project(self):
+
+        task = self._tasks['task.0000']
+
+        self.assertEqual(project(task), task.as_dict())
+        self.assertEqual(project(task, ['uid', 'state']),
+                         {'uid': 'task.0000', 'state': 'DONE'})
+
+        # only serialized fields can be requested
+        for fields in [['__class__'], ['as_dict'], ['uid', 'nope']]:
+            with self.assertRaises(QueryError):
+                project(task, fields)
+
+    # --------------------------------------------------------------------------
+    #
+    def test_select(self):
+
+        items, cursor = select(self._tasks, states=['DONE'], fields=['uid'])
+        self.assertEqual(items, [{'uid': 'task.0000'}, {'uid': 'task.0003'},
+                                 {'uid': 'task.0006'}, {'uid': 'task.0009'}])
+        self.assertIsNone(cursor)
+
+        items, _ = select(self._tasks, prefix='task.000', fields=['uid'])
+        self.assertEqual(len(items), 10)
+
+        items, _ = select(self._tasks, prefix='task.1')
+        self.assertEqual(items, [])
+
+        # explicit uids are returned in the given order
+        items, _ = select(self._tasks, uids=['task.0005', 'task.0002'],
+                          fields=['uid'])
+        self.assertEqual(items, [{'uid': 'task.0005'}, {'uid': 'task.0002'}])
+
+        with self.assertRaises(ValueError):
+            select(self._tasks, uids=['task.9999'])
+
+    # --------------------------------------------------------------------------
+    #
+    def test_paging(self):
+
+        all_uids = ['task.%04d' % i for i in range(10)]
+
+        self.assertEqual(self._pages(3), (all_uids, 4))
+        self.assertEqual(self._pages(10), (all_uids, 1))
+        self.assertEqual(self._pages(100), (all_uids, 1))
+
+        # filters apply before paging: pages are full, cursors skip filtered
+        # objects
+        items, cursor = select(self._tasks, states=['DONE'], limit=2,
+                               fields=['uid'])
+        self.assertEqual(items, [{'uid': 'task.0000'}, {'uid': 'task.0003'}])
+        self.assertEqual(cursor, 4)
+
+        self.assertEqual(self._pages(2, states=['DONE']),
+                         (['task.0000', 'task.0003',
+                           'task.0006', 'task.0009'], 2))
+
+        # paging over explicit uids
+        items, cursor = select(self._tasks, uids=all_uids[::-1], limit=4,
+                               cursor=4, fields=['uid'])
+        self.assertEqual([item['uid'] for item in items], all_uids[5:1:-1])
+        self.assertEqual(cursor, 8)
+
+        # objects added after the last page are returned from its end on
+        items, cursor = select(self._tasks, limit=5, cursor=5)
+        self.assertEqual(cursor, None)
+        self._tasks['task.0010'] = Entity('task.0010', None)
+        items, cursor = select(self._tasks, limit=5, cursor=10,
+                               fields=['uid'])
+        self.assertEqual(items, [{'uid': 'task.0010'}])
+
+    # --------------------------------------------------------------------------
+    #
+    def test_paging_errors(self):
+
+        for limit in [0, -1]:
+            with self.assertRaises(QueryError):
+                select(self._tasks, limit=limit)
+
+        for cursor in [-1, '-1', 'x']:
+            with self.assertRaises(QueryError):
+                select(self._tasks, limit=2, cursor=cursor)
+
+        # cursors past the end return an empty last page
+        self.assertEqual(select(self._tasks, limit=2, cursor=20), ([], None))
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    tc = QueryTestCase()
+    for name in ['test_index', 'test_project', 'test_select', 'test_paging',
+                 'test_paging_errors']:
+        tc.setUp()
+        getattr(tc, name)()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+__copyright__ = 'Copyright 2013-2022, The RADICAL-Cybertools Team'
+__license__   = 'MIT'
+
+from unittest import TestCase
+
+from radical.pi.providers.tracker import StateTracker
+
+
+FINAL = ['DONE', 'FAILED', 'CANCELED']
+
+
+# ------------------------------------------------------------------------------
+#
+class TrackerTestCase(TestCase):
+
+    # --------------------------------------------------------------------------
+    #
+    def setUp(self):
+
+        self._tracker = StateTracker(FINAL)
+
+        for uid in ['task.0000', 'task.0001', 'task.0002']:
+            self._tracker.advance('task', uid, 'NEW')
+
+    # --------------------------------------------------------------------------
+    #
+    def test_ticket(self):
+
+        tracker = self._tracker
+        wid     = tracker.create_ticket('task')
+
+        info = tracker.check_tickets([wid], timeout=0)[0]
+        self.assertEqual(info, {'wid': wid, 'done': False, 'result': None})
+        self.assertEqual(tracker.backlog, 1)
+
+        tracker.advance('task', 'task.0000', 'DONE')
+        tracker.advance('task', 'task.0001', 'FAILED')
+        self.assertFalse(tracker.check_tickets([wid], timeout=0)[0]['done'])
+
+        tracker.advance('task', 'task.0002', 'CANCELED')
+        info = tracker.check_tickets([wid], timeout=0)[0]
+        self.assertTrue(info['done'])
+        self.assertEqual(info['result'], ['DONE', 'FAILED', 'CANCELED'])
+        self.assertEqual(tracker.backlog, 0)
+
+        tracker.release_ticket(wid)
+        with self.assertRaises(ValueError):
+            tracker.check_tickets([wid], timeout=0)
+        with self.assertRaises(ValueError):
+            tracker.release_ticket(wid)
+
+    # --------------------------------------------------------------------------
+    #
+    def test_ticket_states(self):
+
+        tracker = self._tracker
+        wid     = tracker.create_ticket('task', ['task.0000', 'task.0001'],
+                                        states=['AGENT_EXECUTING'])
+
+        # final states terminate any wait
+        tracker.advance('task', 'task.0000', 'AGENT_EXECUTING')
+        tracker.advance('task', 'task.0001', 'TMGR_SCHEDULING')
+        self.assertFalse(tracker.check_tickets([wid], timeout=0)[0]['done'])
+
+        tracker.advance('task', 'task.0001', 'FAILED')
+        info = tracker.check_tickets([wid], timeout=0)[0]
+        self.assertEqual(info['result'], ['AGENT_EXECUTING', 'FAILED'])
+
+        # tickets for states which are reached already resolve immediately
+        wid  = tracker.create_ticket('task', ['task.0001'])
+        info = tracker.check_tickets([wid], timeout=0)[0]
+        self.assertTrue(info['done'])
+
+    # --------------------------------------------------------------------------
+    #
+    def test_ticket_count(self):
+
+        tracker = self._tracker
+        wid     = tracker.create_ticket('task', count=2)
+
+        tracker.advance('task', 'task.0001', 'DONE')
+        self.assertFalse(tracker.check_tickets([wid], timeout=0)[0]['done'])
+
+        tracker.advance('task', 'task.0002', 'DONE')
+        info = tracker.check_tickets([wid], timeout=0)[0]
+        self.assertTrue(info['done'])
+        self.assertEqual(info['result'], ['NEW', 'DONE', 'DONE'])
+
+        # the count is capped by the number of tasks, `0` resolves at once
+        wid = tracker.create_ticket('task', ['task.0000'], count=5)
+        self.assertFalse(tracker.check_tickets([wid], timeout=0)[0]['done'])
+
+        wid = tracker.create_ticket('task', ['task.0000'], count=0)
+        self.assertTrue(tracker.check_tickets([wid], timeout=0)[0]['done'])
+
+    # --------------------------------------------------------------------------
+    #
+    def test_ticket_errors(self):
+
+        tracker = self._tracker
+
+        with self.assertRaises(ValueError):
+            tracker.create_ticket('task', ['task.9999'])
+
+        with self.assertRaises(ValueError):
+            tracker.create_ticket('task', count=-1)
+
+        with self.assertRaises(ValueError):
+            tracker.check_tickets(['wait.9999'], timeout=0)
+
+    # --------------------------------------------------------------------------
+    #
+    def test_counts(self):
+
+        tracker = self._tracker
+        self.assertEqual(tracker.get_counts('task'), {'NEW': 3})
+        self.assertEqual(tracker.get_counts('pilot'), {})
+
+        tracker.advance('pilot', 'pilot.0000', 'PMGR_ACTIVE')
+        tracker.advance('task', 'task.0000', 'AGENT_EXECUTING',
+                        pilot='pilot.0000')
+        tracker.advance('task', 'task.0001', 'DONE', pilot='pilot.0000')
+
+        # repeated transitions are not counted twice
+        tracker.advance('task', 'task.0001', 'DONE')
+
+        self.assertEqual(tracker.get_counts('task'),
+                         {'NEW': 1, 'AGENT_EXECUTING': 1, 'DONE': 1})
+
+        summary = tracker.summary()
+        self.assertEqual(summary['seq'], tracker.seq)
+        self.assertEqual(summary['pilots'], {'total' : 1,
+                                             'states': {'PMGR_ACTIVE': 1}})
+        self.assertEqual(summary['tasks']['total'], 3)
+        self.assertEqual(summary['per_pilot'],
+                         {'pilot.0000': {'state': 'PMGR_ACTIVE',
+                                         'tasks': {'AGENT_EXECUTING': 1,
+                                                   'DONE'           : 1}}})
+
+        # moving a task to another pilot moves its count
+        tracker.advance('pilot', 'pilot.0001', 'PMGR_ACTIVE')
+        tracker.advance('task', 'task.0000', 'DONE', pilot='pilot.0001')
+
+        per_pilot = tracker.summary()['per_pilot']
+        self.assertEqual(per_pilot['pilot.0000']['tasks'], {'DONE': 1})
+        self.assertEqual(per_pilot['pilot.0001']['tasks'], {'DONE': 1})
+
+    # --------------------------------------------------------------------------
+    #
+    def test_changed(self):
+
+        tracker = self._tracker
+        seq     = tracker.seq
+
+        self.assertEqual(tracker.version('task'), seq)
+        self.assertEqual(tracker.version('pilot'), 0)
+
+        tracker.advance('task', 'task.0001', 'DONE')
+        tracker.advance('task', 'task.0000', 'DONE')
+
+        self.assertEqual(tracker.get_changed('task', seq),
+                         (['task.0001', 'task.0000'], seq + 2))
+        self.assertEqual(tracker.get_changed('task', seq + 2), ([], seq + 2))
+        self.assertEqual(tracker.version('task'), seq + 2)
+
+    # --------------------------------------------------------------------------
+    #
+    def test_events(self):
+
+        tracker = StateTracker(FINAL, backlog=2)
+
+        for state in ['NEW', 'AGENT_EXECUTING', 'DONE']:
+            tracker.advance('task', 'task.0000', state)
+
+        events, gap = tracker.get_events(since=0, timeout=0)
+        self.assertTrue(gap)
+        self.assertEqual([e['state'] for e in events],
+                         ['AGENT_EXECUTING', 'DONE'])
+
+        events, gap = tracker.get_events(since=2, limit=1, timeout=0)
+        self.assertFalse(gap)
+        self.assertEqual([e['seq'] for e in events], [3])
+
+        self.assertEqual(tracker.get_events(since=3, timeout=0), ([], False))
+
+        tracker.close()
+        self.assertEqual(tracker.get_events(since=3), ([], False))
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    tc = TrackerTestCase()
+    for name in ['test_ticket', 'test_ticket_states', 'test_ticket_count',
+                 'test_ticket_errors', 'test_counts', 'test_changed',
+                 'test_events']:
+        tc.setUp()
+        getattr(tc, name)()
+
+
+# ------------------------------------------------------------------------------
+